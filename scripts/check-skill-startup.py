@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Startup budget check for the Python skill CLIs that agents invoke repeatedly.
+
+Runs each entry point's cheap path under `python -X importtime` and fails when a
+module that should stay lazy shows up. It also sums the import time of modules the
+bare interpreter does not already load and compares it with a reference run that
+only imports argparse, measured alongside it. Budgets are ratios to that
+reference, so a slow or loaded machine slows both sides alike.
+
+    python scripts/check-skill-startup.py
+    python scripts/check-skill-startup.py --runs 10 --scale 2
+"""
+
+from __future__ import annotations
+
+import argparse
+import re
+import subprocess
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+# What any of these CLIs pays at minimum: a bare argparse import.
+REFERENCE = ("-c", "import argparse")
+
+
+@dataclass(frozen=True)
+class StartupCase:
+    script: str
+    args: tuple[str, ...]
+    # Import cost allowed, as a multiple of the argparse-only reference.
+    budget_ratio: float
+    # Top-level modules that must not be imported on this path.
+    forbidden: tuple[str, ...]
+
+
+CASES = [
+    StartupCase(
+        script="skills/model-usage/scripts/model_usage.py",
+        args=("--help",),
+        budget_ratio=3.5,
+        forbidden=("subprocess", "tempfile", "concurrent", "dataclasses"),
+    ),
+    StartupCase(
+        script="skills/openai-image-gen/scripts/gen.py",
+        args=("--help",),
+        budget_ratio=3.5,
+        forbidden=("urllib", "http", "ssl", "base64", "random", "html"),
+    ),
+    StartupCase(
+        script="skills/skill-creator/scripts/quick_validate.py",
+        args=(),
+        budget_ratio=2.5,
+        forbidden=("yaml",),
+    ),
+]
+
+
+def import_times(argv: list[str], cwd: Path) -> dict[str, int]:
+    """Cumulative microseconds per top-level import for one `-X importtime` run."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", *argv],
+        cwd=cwd,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    times: dict[str, int] = {}
+    for line in proc.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match and len(match.group(3)) == 1:
+            times[match.group(4)] = int(match.group(2))
+    return times
+
+
+def extra_ms(times: dict[str, int], baseline: set[str]) -> float:
+    return sum(us for name, us in times.items() if name not in baseline) / 1000
+
+
+def measure(case: StartupCase, runs: int, baseline: set[str]) -> tuple[float, float, set[str]]:
+    """Best-of-N import cost in ms beyond interpreter startup, for the case and the
+    reference (interleaved, so both see the same machine load), and the modules seen."""
+    script = ROOT / case.script
+    best = reference = float("inf")
+    modules: set[str] = set()
+    for _ in range(runs):
+        times = import_times([script.name, *case.args], script.parent)
+        modules |= set(times) - baseline
+        best = min(best, extra_ms(times, baseline))
+        reference = min(reference, extra_ms(import_times(list(REFERENCE), ROOT), baseline))
+    return best, reference, modules
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Check skill CLI startup import budgets.")
+    parser.add_argument("--runs", type=int, default=5, help="Runs per script; the best is kept.")
+    parser.add_argument(
+        "--scale",
+        type=float,
+        default=1.0,
+        help="Multiply every budget ratio.",
+    )
+    args = parser.parse_args()
+
+    baseline = set(import_times(["-c", "pass"], ROOT))
+    failures = []
+    for case in CASES:
+        cost, reference, modules = measure(case, max(1, args.runs), baseline)
+        ratio = cost / max(reference, 0.001)
+        budget = case.budget_ratio * args.scale
+        leaked = sorted(name for name in modules if name.split(".")[0] in case.forbidden)
+        status = "ok" if ratio <= budget and not leaked else "FAIL"
+        print(
+            f"{status:<4} {case.script} {' '.join(case.args)}: {cost:.1f} ms, "
+            f"{ratio:.2f}x argparse ({reference:.1f} ms; budget {budget:.2f}x)"
+        )
+        if ratio > budget:
+            failures.append(f"{case.script}: {ratio:.2f}x the argparse import exceeds {budget:.2f}x")
+        if leaked:
+            failures.append(f"{case.script}: imports {', '.join(leaked)} on its fast path")
+
+    for failure in failures:
+        print(f"- {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Benchmark model_usage against synthetic codexbar cost payloads.
+
+Times each stage at several row counts, reports throughput and peak traced
+memory, and can save or compare against a JSON baseline to catch regressions.
+
+    python bench_model_usage.py --rows 1000,10000,100000
+    python bench_model_usage.py --rows 100000 --save-baseline /tmp/mu-baseline.json
+    python bench_model_usage.py --rows 100000 --baseline /tmp/mu-baseline.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+from functools import lru_cache, partial
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import model_usage
+
+MODEL_NAMES = [
+    "gpt-5",
+    "gpt-5-codex",
+    "o3",
+    "o4-mini",
+    "claude-opus-4",
+    "claude-sonnet-4",
+    "claude-haiku-4",
+    "gpt-4.1",
+]
+
+
+def generate_payload(
+    rows: int,
+    providers: Sequence[str] = ("codex", "claude"),
+    models_per_day: int = 3,
+    malformed_ratio: float = 0.0,
+    seed: int = 0,
+) -> List[Dict[str, Any]]:
+    """Build a codexbar-shaped cost payload with `rows` daily rows per provider.
+
+    Rows are one per day, ending today. With `malformed_ratio`, that share of rows
+    get a bad date, a non-list breakdown or non-numeric costs.
+    """
+    rng = random.Random(seed)
+    start = date.today() - timedelta(days=rows - 1)
+    payload = []
+    for provider in providers:
+        daily = []
+        for offset in range(rows):
+            models = rng.sample(MODEL_NAMES, min(models_per_day, len(MODEL_NAMES)))
+            breakdowns: Any = [
+                {"modelName": model, "cost": round(rng.uniform(0.01, 25.0), 4)} for model in models
+            ]
+            entry: Dict[str, Any] = {
+                "date": (start + timedelta(days=offset)).isoformat(),
+                "totalTokens": rng.randint(1_000, 5_000_000),
+                "modelsUsed": models,
+                "modelBreakdowns": breakdowns,
+            }
+            if malformed_ratio and rng.random() < malformed_ratio:
+                kind = rng.randrange(3)
+                if kind == 0:
+                    entry["date"] = "not-a-date"
+                elif kind == 1:
+                    entry["modelBreakdowns"] = {"oops": True}
+                else:
+                    for item in breakdowns:
+                        item["cost"] = "n/a"
+            daily.append(entry)
+        payload.append({"provider": provider, "source": "synthetic", "daily": daily})
+    return payload
+
+
+def run_main(argv: List[str]) -> int:
+    saved = sys.argv
+    sys.argv = ["model_usage.py", *argv]
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            return model_usage.main()
+    finally:
+        sys.argv = saved
+
+
+def count_streamed_rows(path: str, provider: str) -> int:
+    return sum(1 for _ in model_usage.stream_daily_entries(path, provider))
+
+
+def build_cases(path: str, provider: str, days: int) -> Dict[str, Callable[[], Callable[[], Any]]]:
+    """Setup function per case name; calling one builds that case's fixtures and returns the timed call.
+
+    Fixtures are built on first use and shared, so `--case` only pays for what
+    the selected cases need.
+    """
+
+    @lru_cache(maxsize=None)
+    def entries() -> List[Dict[str, Any]]:
+        return model_usage.parse_daily_entries(model_usage.load_payload(path, provider))
+
+    @lru_cache(maxsize=None)
+    def recent() -> List[Dict[str, Any]]:
+        return model_usage.filter_by_days(entries(), days)
+
+    @lru_cache(maxsize=None)
+    def columns() -> model_usage.DailyColumns:
+        return model_usage.DailyColumns.from_entries(entries())
+
+    common = ["--input", path, "--provider", provider, "--no-cache"]
+    return {
+        "load_payload": lambda: partial(model_usage.load_payload, path, provider),
+        "filter_by_days": lambda: partial(model_usage.filter_by_days, entries(), days),
+        "aggregate_costs": lambda: partial(model_usage.aggregate_costs, recent()),
+        "pick_current_model": lambda: partial(model_usage.pick_current_model, recent()),
+        "summarize_entries": lambda: partial(model_usage.summarize_entries, recent()),
+        "columns_build": lambda: partial(model_usage.DailyColumns.from_entries, entries()),
+        "columns_window": lambda: partial(columns().filter_by_days, days),
+        "stream_rows": lambda: partial(count_streamed_rows, path, provider),
+        "main_current": lambda: partial(run_main, [*common, "--mode", "current"]),
+        "main_all": lambda: partial(run_main, [*common, "--mode", "all", "--days", str(days)]),
+        "main_stream": lambda: partial(run_main, [*common, "--mode", "current", "--stream"]),
+    }
+
+
+CASE_NAMES = tuple(build_cases("", "codex", 1))
+
+
+def measure(func: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"seconds": best, "peakBytes": float(peak)}
+
+
+def run_benchmarks(
+    sizes: Sequence[int],
+    repeat: int = 3,
+    models_per_day: int = 3,
+    malformed_ratio: float = 0.0,
+    only: Optional[Sequence[str]] = None,
+) -> Dict[str, Dict[str, Dict[str, float]]]:
+    """Results keyed by row count, then case name."""
+    results: Dict[str, Dict[str, Dict[str, float]]] = {}
+    for rows in sizes:
+        payload = generate_payload(rows, models_per_day=models_per_day, malformed_ratio=malformed_ratio)
+        with tempfile.TemporaryDirectory(prefix="bench-model-usage-") as tmp:
+            path = os.path.join(tmp, "cost.json")
+            with open(path, "w", encoding="utf-8") as handle:
+                json.dump(payload, handle)
+            del payload
+            days = max(1, rows // 2)
+            cases = build_cases(path, "codex", days)
+            results[str(rows)] = {}
+            for name, setup in cases.items():
+                if only and name not in only:
+                    continue
+                stats = measure(setup(), repeat)
+                stats["rowsPerSecond"] = rows / stats["seconds"] if stats["seconds"] else float("inf")
+                results[str(rows)][name] = stats
+                print(
+                    f"{rows:>9} rows  {name:<20} {stats['seconds'] * 1000:>10.2f} ms"
+                    f"  {stats['rowsPerSecond']:>12,.0f} rows/s"
+                    f"  {stats['peakBytes'] / 1_048_576:>9.1f} MiB peak",
+                    flush=True,
+                )
+    return results
+
+
+def compare(
+    results: Dict[str, Dict[str, Dict[str, float]]],
+    baseline: Dict[str, Dict[str, Dict[str, float]]],
+    tolerance: float,
+) -> List[str]:
+    """Describe every case that got slower (or hungrier) than baseline by more than tolerance."""
+    regressions = []
+    for rows, cases in results.items():
+        for name, stats in cases.items():
+            base = baseline.get(rows, {}).get(name)
+            if not base:
+                continue
+            for metric in ("seconds", "peakBytes"):
+                if base.get(metric) and stats[metric] > base[metric] * (1 + tolerance):
+                    ratio = stats[metric] / base[metric]
+                    regressions.append(f"{rows} rows {name}: {metric} {ratio:.2f}x baseline")
+    return regressions
+
+
+def parse_sizes(value: str) -> List[int]:
+    try:
+        sizes = [int(float(part)) for part in value.split(",") if part.strip()]
+    except ValueError as exc:
+        raise argparse.ArgumentTypeError("must be a comma-separated list of row counts") from exc
+    if not sizes or any(size < 1 for size in sizes):
+        raise argparse.ArgumentTypeError("row counts must be >= 1")
+    return sizes
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark model_usage on synthetic payloads.")
+    parser.add_argument(
+        "--rows",
+        type=parse_sizes,
+        default=[1_000, 10_000, 100_000],
+        help="Comma-separated daily row counts per provider (e.g. 1e3,1e4,1e6).",
+    )
+    parser.add_argument("--repeat", type=model_usage.positive_int, default=3, help="Timing runs per case (best is kept).")
+    parser.add_argument("--models-per-day", type=model_usage.positive_int, default=3)
+    parser.add_argument("--malformed-ratio", type=float, default=0.0, help="Share of rows to corrupt (0-1).")
+    parser.add_argument("--case", action="append", help="Only run the named case(s).")
+    parser.add_argument("--save-baseline", help="Write results as a JSON baseline to this path.")
+    parser.add_argument("--baseline", help="Compare against a JSON baseline; exit 1 on regressions.")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="Allowed slowdown/memory growth vs baseline before failing (default: 0.25 = 25%%).",
+    )
+    args = parser.parse_args()
+    if not 0 <= args.malformed_ratio <= 1:
+        parser.error("--malformed-ratio must be in [0, 1]")
+    unknown = sorted(set(args.case or ()) - set(CASE_NAMES))
+    if unknown:
+        parser.error(f"unknown --case {', '.join(unknown)}; choose from {', '.join(CASE_NAMES)}")
+
+    results = run_benchmarks(
+        args.rows,
+        repeat=args.repeat,
+        models_per_day=args.models_per_day,
+        malformed_ratio=args.malformed_ratio,
+        only=args.case,
+    )
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as handle:
+            json.dump(results, handle, indent=2, sort_keys=True)
+        print(f"Saved baseline: {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as handle:
+            baseline = json.load(handle)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            model_usage.eprint("Regressions vs baseline:")
+            for line in regressions:
+                model_usage.eprint(f"- {line}")
+            return 1
+        print("No regressions vs baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
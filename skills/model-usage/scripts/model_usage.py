@@ -9,12 +9,63 @@ from __future__ import annotations
 
 import argparse
 import json
+import math
 import os
-import subprocess
+import re
 import sys
-from dataclasses import dataclass
+import time
+from array import array
+from bisect import bisect_left, bisect_right
 from datetime import date, datetime, timedelta
-from typing import Any, Dict, Iterable, List, Optional, Tuple
+from typing import (
+    Any,
+    Dict,
+    Generator,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    TextIO,
+    Tuple,
+)
+
+# subprocess, tempfile and concurrent.futures are imported where they are used:
+# agents run this script often, and `--help`, `--input` and cache hits never need
+# them. Records are NamedTuples rather than dataclasses for the same reason.
+
+try:
+    import fcntl
+except ModuleNotFoundError:  # Windows: fall back to unlocked cache refreshes.
+    fcntl = None
+
+PROVIDERS = ("codex", "claude")
+STREAM_CHUNK_SIZE = 1 << 16
+DEFAULT_CACHE_TTL = 300.0
+BURN_RATE_DAYS = 7
+
+_NON_WHITESPACE = re.compile(r"[^ \t\r\n]")
+_STRUCTURAL = re.compile(r'[\[\]{}"]')
+_STRING_SPECIAL = re.compile(r'["\\]')
+_SCALAR_END = re.compile(r"[,\]}\s]")
+
+
+def iso_date(value: str) -> date:
+    parsed = parse_date(value)
+    if parsed is None:
+        raise argparse.ArgumentTypeError("must be a date in YYYY-MM-DD format")
+    return parsed
+
+
+def resolve_providers(values: Optional[List[str]]) -> List[str]:
+    """Expand repeated/`all` --provider values into an ordered, de-duplicated list."""
+    providers: List[str] = []
+    for value in values or ["codex"]:
+        for provider in PROVIDERS if value == "all" else (value,):
+            if provider not in providers:
+                providers.append(provider)
+    return providers
 
 
 def positive_int(value: str) -> int:
@@ -27,11 +78,23 @@ def positive_int(value: str) -> int:
     return parsed
 
 
+def positive_float(value: str) -> float:
+    try:
+        parsed = float(value)
+    except ValueError as exc:
+        raise argparse.ArgumentTypeError("must be a number") from exc
+    if not parsed > 0:
+        raise argparse.ArgumentTypeError("must be > 0")
+    return parsed
+
+
 def eprint(msg: str) -> None:
     print(msg, file=sys.stderr)
 
 
 def run_codexbar_cost(provider: str) -> List[Dict[str, Any]]:
+    import subprocess
+
     cmd = ["codexbar", "cost", "--format", "json", "--provider", provider]
     try:
         output = subprocess.check_output(cmd, text=True)
@@ -48,17 +111,21 @@ def run_codexbar_cost(provider: str) -> List[Dict[str, Any]]:
     return payload
 
 
-def load_payload(input_path: Optional[str], provider: str) -> Dict[str, Any]:
-    if input_path:
-        if input_path == "-":
-            raw = sys.stdin.read()
-        else:
-            with open(input_path, "r", encoding="utf-8") as handle:
-                raw = handle.read()
-        data = json.loads(raw)
+def read_json_input(input_path: str) -> Any:
+    if input_path == "-":
+        raw = sys.stdin.read()
     else:
-        data = run_codexbar_cost(provider)
+        with open(input_path, "r", encoding="utf-8") as handle:
+            raw = handle.read()
+    return json.loads(raw)
+
+
+def load_payload(input_path: Optional[str], provider: str) -> Dict[str, Any]:
+    data = read_json_input(input_path) if input_path else run_codexbar_cost(provider)
+    return select_provider(data, provider)
+
 
+def select_provider(data: Any, provider: str) -> Dict[str, Any]:
     if isinstance(data, dict):
         return data
 
@@ -71,8 +138,362 @@ def load_payload(input_path: Optional[str], provider: str) -> Dict[str, Any]:
     raise RuntimeError("Unsupported JSON input format.")
 
 
-@dataclass
-class ModelCost:
+class JsonStreamReader:
+    """Minimal pull parser that walks a JSON text stream without materialising it.
+
+    Containers are navigated with `iter_array()` / `iter_object()`; each element
+    must then be consumed with `read_value()` or `skip_value()`. Skipped values are
+    scanned for their closing bracket and discarded, so only the pieces a caller
+    asks for are ever decoded.
+    """
+
+    def __init__(self, handle: TextIO, chunk_size: int = STREAM_CHUNK_SIZE) -> None:
+        self._handle = handle
+        self._chunk_size = chunk_size
+        self._buf = ""
+        self._pos = 0
+
+    def _fill(self) -> bool:
+        chunk = self._handle.read(self._chunk_size)
+        if not chunk:
+            return False
+        self._buf = self._buf[self._pos :] + chunk
+        self._pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Return the next non-whitespace character without consuming it ('' at EOF)."""
+        while True:
+            match = _NON_WHITESPACE.search(self._buf, self._pos)
+            if match:
+                self._pos = match.start()
+                return self._buf[self._pos]
+            self._pos = len(self._buf)
+            if not self._fill():
+                return ""
+
+    def _expect(self, char: str) -> None:
+        found = self.peek()
+        if found != char:
+            raise RuntimeError(
+                f"Failed to parse codexbar JSON output: expected '{char}', got '{found or 'EOF'}'."
+            )
+        self._pos += 1
+
+    def iter_array(self) -> Iterator[int]:
+        """Yield element indexes; the caller consumes each element before resuming."""
+        self._expect("[")
+        if self.peek() == "]":
+            self._pos += 1
+            return
+        index = 0
+        while True:
+            yield index
+            index += 1
+            if self.peek() == ",":
+                self._pos += 1
+                continue
+            self._expect("]")
+            return
+
+    def iter_object(self) -> Iterator[str]:
+        """Yield object keys; the caller consumes each value before resuming."""
+        self._expect("{")
+        if self.peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            key = self.read_value()
+            if not isinstance(key, str):
+                raise RuntimeError("Failed to parse codexbar JSON output: object key must be a string.")
+            self._expect(":")
+            yield key
+            if self.peek() == ",":
+                self._pos += 1
+                continue
+            self._expect("}")
+            return
+
+    def read_value(self) -> Any:
+        """Decode the next JSON value."""
+        raw = self._scan_value(capture=True)
+        try:
+            return json.loads(raw)
+        except json.JSONDecodeError as exc:
+            raise RuntimeError(f"Failed to parse codexbar JSON output: {exc}") from exc
+
+    def skip_value(self) -> None:
+        """Consume the next JSON value without decoding it."""
+        self._scan_value(capture=False)
+
+    def _scan_value(self, capture: bool) -> str:
+        first = self.peek()
+        if not first:
+            raise RuntimeError("Failed to parse codexbar JSON output: unexpected end of input.")
+        if first in "]},:":
+            raise RuntimeError(f"Failed to parse codexbar JSON output: unexpected '{first}'.")
+        parts: List[str] = []
+        start = self._pos
+        if first not in '[{"':
+            while True:
+                match = _SCALAR_END.search(self._buf, self._pos)
+                if match:
+                    self._pos = match.start()
+                    break
+                if capture:
+                    parts.append(self._buf[start:])
+                self._pos = len(self._buf)
+                start = 0
+                if not self._fill():
+                    break
+            if capture:
+                parts.append(self._buf[start : self._pos])
+            return "".join(parts)
+
+        depth = 0
+        in_string = False
+        escaped = False
+        while True:
+            if self._pos >= len(self._buf):
+                if capture:
+                    parts.append(self._buf[start:])
+                start = 0
+                if not self._fill():
+                    raise RuntimeError("Failed to parse codexbar JSON output: unexpected end of input.")
+                continue
+            if escaped:
+                self._pos += 1
+                escaped = False
+                continue
+            pattern = _STRING_SPECIAL if in_string else _STRUCTURAL
+            match = pattern.search(self._buf, self._pos)
+            if match is None:
+                self._pos = len(self._buf)
+                continue
+            char = match.group()
+            self._pos = match.end()
+            if in_string:
+                if char == "\\":
+                    escaped = True
+                else:
+                    in_string = False
+                    if depth == 0:
+                        break
+            elif char == '"':
+                in_string = True
+            elif char in "[{":
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    break
+        if capture:
+            parts.append(self._buf[start : self._pos])
+        return "".join(parts)
+
+
+def _stream_provider_daily(
+    reader: JsonStreamReader, provider: Optional[str]
+) -> Generator[Dict[str, Any], None, bool]:
+    """Yield daily rows of the provider object under the reader, if it matches.
+
+    Returns whether the object matched. `provider=None` accepts any object. Rows
+    seen before the `provider` key are held back until the match is decided.
+    """
+    matched: Optional[bool] = True if provider is None else None
+    pending: List[Dict[str, Any]] = []
+    for key in reader.iter_object():
+        if key == "provider" and provider is not None:
+            value = reader.read_value()
+            matched = value == provider
+            if matched:
+                yield from pending
+            pending = []
+        elif key == "daily" and matched is not False and reader.peek() == "[":
+            for _ in reader.iter_array():
+                if reader.peek() != "{":
+                    reader.skip_value()
+                    continue
+                entry = reader.read_value()
+                if matched:
+                    yield entry
+                else:
+                    pending.append(entry)
+        else:
+            reader.skip_value()
+    return bool(matched)
+
+
+def iter_daily_stream(
+    handle: TextIO, provider: str, chunk_size: int = STREAM_CHUNK_SIZE
+) -> Iterator[Dict[str, Any]]:
+    """Stream the provider's daily rows out of a codexbar cost JSON document.
+
+    Mirrors `load_payload()` + `parse_daily_entries()`: a top-level object is used
+    as-is, a top-level array is searched for the first matching provider while all
+    other providers are skipped without being decoded.
+    """
+    reader = JsonStreamReader(handle, chunk_size)
+    first = reader.peek()
+    if first == "{":
+        yield from _stream_provider_daily(reader, None)
+        return
+    if first != "[":
+        raise RuntimeError("Unsupported JSON input format.")
+    for _ in reader.iter_array():
+        if reader.peek() != "{":
+            reader.skip_value()
+            continue
+        matched = yield from _stream_provider_daily(reader, provider)
+        if matched:
+            return
+    raise RuntimeError(f"Provider '{provider}' not found in codexbar payload.")
+
+
+def stream_codexbar_cost(provider: str) -> Iterator[Dict[str, Any]]:
+    import subprocess
+
+    cmd = ["codexbar", "cost", "--format", "json", "--provider", provider]
+    try:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+    except FileNotFoundError:
+        raise RuntimeError("codexbar not found on PATH. Install CodexBar CLI first.")
+    assert proc.stdout is not None
+    try:
+        with proc.stdout:
+            rows = iter_daily_stream(proc.stdout, provider)
+            while True:
+                try:
+                    row = next(rows)
+                except StopIteration:
+                    break
+                except RuntimeError:
+                    # A failed run can leave truncated output; report the exit code instead.
+                    while proc.stdout.read(STREAM_CHUNK_SIZE):
+                        pass
+                    if proc.wait() != 0:
+                        break
+                    raise
+                yield row
+            # Drain whatever follows the matched provider so codexbar can exit.
+            while proc.stdout.read(STREAM_CHUNK_SIZE):
+                pass
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+        returncode = proc.wait()
+    if returncode != 0:
+        raise RuntimeError(f"codexbar cost failed (exit {returncode}).")
+
+
+def stream_daily_entries(input_path: Optional[str], provider: str) -> Iterator[Dict[str, Any]]:
+    """Streaming counterpart of `parse_daily_entries(load_payload(...))`."""
+    if not input_path:
+        yield from stream_codexbar_cost(provider)
+    elif input_path == "-":
+        yield from iter_daily_stream(sys.stdin, provider)
+    else:
+        with open(input_path, "r", encoding="utf-8") as handle:
+            yield from iter_daily_stream(handle, provider)
+
+
+def default_cache_dir() -> str:
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "openclaw", "model-usage")
+
+
+def _lock_file(handle: TextIO) -> None:
+    if fcntl is not None:
+        fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+
+
+def _is_fresh(path: str, ttl: float) -> bool:
+    try:
+        age = time.time() - os.stat(path).st_mtime
+    except FileNotFoundError:
+        return False
+    return 0 <= age < ttl
+
+
+def _check_json_document(path: str) -> None:
+    """Raise unless `path` holds one complete JSON array or object and nothing after it.
+
+    The document is scanned with JsonStreamReader rather than decoded, so checking
+    a large codexbar dump costs a pass over the file but no more memory than --stream.
+    """
+    with open(path, "r", encoding="utf-8") as handle:
+        reader = JsonStreamReader(handle)
+        try:
+            first = reader.peek()
+            if first not in ("[", "{"):
+                raise RuntimeError(f"expected an array or object, got '{first or 'EOF'}'")
+            reader.skip_value()
+            trailing = reader.peek()
+            if trailing:
+                raise RuntimeError(f"unexpected '{trailing}' after the document")
+        except (RuntimeError, UnicodeDecodeError) as exc:
+            raise RuntimeError(f"codexbar cost returned invalid JSON: {exc}") from exc
+
+
+def _fetch_codexbar_cost_to(path: str, provider: str) -> None:
+    import subprocess
+    import tempfile
+
+    cmd = ["codexbar", "cost", "--format", "json", "--provider", provider]
+    fd, tmp_path = tempfile.mkstemp(prefix=".codexbar-cost-", suffix=".tmp", dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "wb") as handle:
+            try:
+                returncode = subprocess.call(cmd, stdout=handle)
+            except FileNotFoundError:
+                raise RuntimeError("codexbar not found on PATH. Install CodexBar CLI first.")
+        if returncode != 0:
+            raise RuntimeError(f"codexbar cost failed (exit {returncode}).")
+        # A zero exit with garbage or truncated output must not be served for a whole TTL.
+        _check_json_document(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def cached_codexbar_cost(
+    provider: str,
+    ttl: float = DEFAULT_CACHE_TTL,
+    refresh: bool = False,
+    cache_dir: Optional[str] = None,
+) -> str:
+    """Return the path of a cached `codexbar cost` dump for provider, refreshing it if stale.
+
+    Refreshes run under a per-provider file lock and re-check freshness once the
+    lock is held, so concurrent invocations wait for a single codexbar run instead
+    of each starting their own. The new dump is written to a temp file, checked to
+    parse as JSON and only then renamed into place, so readers never see a partial
+    or invalid file.
+    """
+    cache_dir = cache_dir or default_cache_dir()
+    path = os.path.join(cache_dir, f"codexbar-cost-{provider}.json")
+    if not refresh and _is_fresh(path, ttl):
+        return path
+
+    os.makedirs(cache_dir, exist_ok=True)
+    requested_at = time.time()
+    with open(os.path.join(cache_dir, f"codexbar-cost-{provider}.lock"), "a") as lock:
+        _lock_file(lock)
+        try:
+            refreshed_meanwhile = os.stat(path).st_mtime >= requested_at
+        except FileNotFoundError:
+            refreshed_meanwhile = False
+        if refreshed_meanwhile or (not refresh and _is_fresh(path, ttl)):
+            return path
+        _fetch_codexbar_cost_to(path, provider)
+    return path
+
+
+class ModelCost(NamedTuple):
     model: str
     cost: float
 
@@ -87,25 +508,39 @@ def parse_daily_entries(payload: Dict[str, Any]) -> List[Dict[str, Any]]:
 
 
 def parse_date(value: str) -> Optional[date]:
+    # Fast path for the zero-padded ISO dates codexbar emits; strptime also accepts
+    # unpadded forms like 2025-1-5, so anything else still goes through it.
+    if len(value) == 10 and value[4] == "-" and value[7] == "-":
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            pass
     try:
         return datetime.strptime(value, "%Y-%m-%d").date()
     except Exception:
         return None
 
 
-def filter_by_days(entries: List[Dict[str, Any]], days: Optional[int]) -> List[Dict[str, Any]]:
+def iter_filter_by_days(
+    entries: Iterable[Dict[str, Any]], days: Optional[int]
+) -> Iterator[Dict[str, Any]]:
     if not days:
-        return entries
+        yield from entries
+        return
     cutoff = date.today() - timedelta(days=days - 1)
-    filtered: List[Dict[str, Any]] = []
     for entry in entries:
         day = entry.get("date")
         if not isinstance(day, str):
             continue
         parsed = parse_date(day)
         if parsed and parsed >= cutoff:
-            filtered.append(entry)
-    return filtered
+            yield entry
+
+
+def filter_by_days(entries: List[Dict[str, Any]], days: Optional[int]) -> List[Dict[str, Any]]:
+    if not days:
+        return entries
+    return list(iter_filter_by_days(entries, days))
 
 
 def aggregate_costs(entries: Iterable[Dict[str, Any]]) -> Dict[str, float]:
@@ -185,6 +620,404 @@ def latest_day_cost(entries: List[Dict[str, Any]], model: str) -> Tuple[Optional
     return None, None
 
 
+class UsageSummary(NamedTuple):
+    totals: Dict[str, float]
+    current_model: Optional[str]
+    current_date: Optional[str]
+    latest_costs: Dict[str, Tuple[Optional[str], Optional[float]]]
+    row_count: int
+
+    def latest_day_cost(self, model: str) -> Tuple[Optional[str], Optional[float]]:
+        return self.latest_costs.get(model, (None, None))
+
+
+def summarize_entries(entries: Iterable[Dict[str, Any]]) -> UsageSummary:
+    """Fused single pass over daily rows for current mode.
+
+    Equivalent to `aggregate_costs()`, `pick_current_model()` and `latest_day_cost()`
+    for every model, without sorting: "latest" is tracked as a running maximum by
+    date, with later rows winning ties just like the sorted scans they replace.
+    """
+    totals: Dict[str, float] = {}
+    latest: Dict[str, Tuple[str, Optional[str], Optional[float]]] = {}
+    current_key: Optional[str] = None
+    current: Tuple[Optional[str], Optional[str]] = (None, None)
+    row_count = 0
+
+    for entry in entries:
+        row_count += 1
+        raw_day = entry.get("date")
+        day = raw_day if isinstance(raw_day, str) else None
+        key = raw_day or ""
+        candidate: Optional[str] = None
+        best_cost = 0.0
+
+        breakdowns = entry.get("modelBreakdowns")
+        if isinstance(breakdowns, list):
+            seen = set()
+            for item in breakdowns:
+                if not isinstance(item, dict):
+                    continue
+                model = item.get("modelName")
+                cost = item.get("cost")
+                if isinstance(model, str) and model not in seen:
+                    seen.add(model)
+                    previous = latest.get(model)
+                    if previous is None or key >= previous[0]:
+                        latest[model] = (
+                            key,
+                            day,
+                            float(cost) if isinstance(cost, (int, float)) else None,
+                        )
+                if not isinstance(model, str) or not isinstance(cost, (int, float)):
+                    continue
+                cost = float(cost)
+                totals[model] = totals.get(model, 0.0) + cost
+                if candidate is None or cost > best_cost:
+                    candidate, best_cost = model, cost
+
+        if candidate is None:
+            models_used = entry.get("modelsUsed")
+            if isinstance(models_used, list) and models_used and isinstance(models_used[-1], str):
+                candidate = models_used[-1]
+        if candidate is not None and (current_key is None or key >= current_key):
+            current_key = key
+            current = (candidate, day)
+
+    return UsageSummary(
+        totals=totals,
+        current_model=current[0],
+        current_date=current[1],
+        latest_costs={model: (day, cost) for model, (_, day, cost) in latest.items()},
+        row_count=row_count,
+    )
+
+
+def bucket_label(ordinal: int, group_by: str) -> str:
+    day = date.fromordinal(ordinal)
+    if group_by == "week":
+        year, week, _ = day.isocalendar()
+        return f"{year}-W{week:02d}"
+    if group_by == "month":
+        return f"{day.year}-{day.month:02d}"
+    return day.isoformat()
+
+
+def percentile(ordered: Iterable[float], pct: float) -> float:
+    """Linearly interpolated percentile of already-sorted values (0.0 when empty)."""
+    values = list(ordered)
+    if not values:
+        return 0.0
+    rank = (len(values) - 1) * pct / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (rank - lower)
+
+
+class CostRollup(NamedTuple):
+    group_by: str
+    buckets: List[str]
+    costs: Dict[str, List[float]]
+    daily_stats: Dict[str, Dict[str, float]]
+    burn_days: int
+    burn_rate: Optional[float]
+
+    def ranked_models(self) -> List[str]:
+        return sorted(self.costs, key=lambda model: math.fsum(self.costs[model]), reverse=True)
+
+
+class DailyColumns:
+    """Compact columnar form of daily rows.
+
+    Rows keep only their day ordinal (0 when the date is missing or malformed) and
+    an optional `modelsUsed` fallback; breakdown items are flattened into parallel
+    arrays keyed by row. Model names are interned once into `models` and referenced
+    by index. Non-numeric costs are stored as NaN so they count for latest-day
+    lookups but not for totals, matching the dict-based helpers.
+    """
+
+    __slots__ = (
+        "models",
+        "_model_index",
+        "row_day",
+        "row_fallback",
+        "item_row",
+        "item_model",
+        "item_cost",
+    )
+
+    def __init__(self, models: Optional[List[str]] = None) -> None:
+        self.models: List[str] = list(models or [])
+        self._model_index: Dict[str, int] = {model: idx for idx, model in enumerate(self.models)}
+        self.row_day = array("i")
+        self.row_fallback = array("i")
+        self.item_row = array("I")
+        self.item_model = array("I")
+        self.item_cost = array("d")
+
+    def __len__(self) -> int:
+        return len(self.row_day)
+
+    def _intern(self, model: str) -> int:
+        idx = self._model_index.get(model)
+        if idx is None:
+            idx = len(self.models)
+            model = sys.intern(model)
+            self.models.append(model)
+            self._model_index[model] = idx
+        return idx
+
+    @classmethod
+    def from_entries(
+        cls,
+        entries: Iterable[Dict[str, Any]],
+        since: Optional[date] = None,
+        until: Optional[date] = None,
+    ) -> "DailyColumns":
+        """Build the table, keeping only rows dated within [since, until] when a bound is given.
+
+        Out-of-window rows are skipped as they arrive, so a streamed payload only
+        ever holds the window in memory. As in window(), undated rows are dropped
+        whenever a bound is given.
+        """
+        columns = cls()
+        ordinals: Dict[str, int] = {}
+        bounded = since is not None or until is not None
+        lo = since.toordinal() if since is not None else 1
+        hi = until.toordinal() if until is not None else date.max.toordinal()
+        for entry in entries:
+            row = len(columns.row_day)
+            day = entry.get("date")
+            ordinal = 0
+            if isinstance(day, str):
+                ordinal = ordinals.get(day, -1)
+                if ordinal < 0:
+                    parsed = parse_date(day)
+                    ordinal = ordinals[day] = parsed.toordinal() if parsed else 0
+            if bounded and not lo <= ordinal <= hi:
+                continue
+            columns.row_day.append(ordinal)
+
+            fallback = -1
+            models_used = entry.get("modelsUsed")
+            if isinstance(models_used, list) and models_used and isinstance(models_used[-1], str):
+                fallback = columns._intern(models_used[-1])
+            columns.row_fallback.append(fallback)
+
+            breakdowns = entry.get("modelBreakdowns")
+            if not isinstance(breakdowns, list):
+                continue
+            for item in breakdowns:
+                if not isinstance(item, dict):
+                    continue
+                model = item.get("modelName")
+                if not isinstance(model, str):
+                    continue
+                cost = item.get("cost")
+                columns.item_row.append(row)
+                columns.item_model.append(columns._intern(model))
+                columns.item_cost.append(float(cost) if isinstance(cost, (int, float)) else math.nan)
+        return columns
+
+    def select_rows(self, keep: Iterable[bool]) -> "DailyColumns":
+        """Return a new table holding only the rows flagged in keep."""
+        selected = DailyColumns(self.models)
+        new_index = array("i")
+        for row, flag in enumerate(keep):
+            if flag:
+                new_index.append(len(selected.row_day))
+                selected.row_day.append(self.row_day[row])
+                selected.row_fallback.append(self.row_fallback[row])
+            else:
+                new_index.append(-1)
+        for row, model, cost in zip(self.item_row, self.item_model, self.item_cost):
+            mapped = new_index[row]
+            if mapped >= 0:
+                selected.item_row.append(mapped)
+                selected.item_model.append(model)
+                selected.item_cost.append(cost)
+        return selected
+
+    def sort_by_day(self) -> "DailyColumns":
+        """Return the table with rows in ascending day order (stable; self if already sorted)."""
+        row_day = self.row_day
+        if all(row_day[idx] <= row_day[idx + 1] for idx in range(len(row_day) - 1)):
+            return self
+        nrows = len(row_day)
+        # Items are stored grouped by row; find each row's slice before reordering.
+        starts = array("I", [0]) * (nrows + 1)
+        for row in self.item_row:
+            starts[row + 1] += 1
+        for row in range(nrows):
+            starts[row + 1] += starts[row]
+
+        ordered = DailyColumns(self.models)
+        for new_row, row in enumerate(sorted(range(nrows), key=row_day.__getitem__)):
+            ordered.row_day.append(row_day[row])
+            ordered.row_fallback.append(self.row_fallback[row])
+            lo, hi = starts[row], starts[row + 1]
+            ordered.item_row.extend([new_row] * (hi - lo))
+            ordered.item_model.extend(self.item_model[lo:hi])
+            ordered.item_cost.extend(self.item_cost[lo:hi])
+        return ordered
+
+    def window(self, since: Optional[date] = None, until: Optional[date] = None) -> "DailyColumns":
+        """Rows dated within [since, until], located by bisecting the sorted day ordinals.
+
+        Rows without a usable date are dropped whenever a bound is given.
+        """
+        if since is None and until is None:
+            return self
+        table = self.sort_by_day()
+        row_day = table.row_day
+        lo = bisect_right(row_day, 0)
+        if since is not None:
+            lo = max(lo, bisect_left(row_day, since.toordinal()))
+        hi = bisect_right(row_day, until.toordinal()) if until is not None else len(row_day)
+        if lo == 0 and hi == len(row_day):
+            return table
+        hi = max(lo, hi)
+        item_lo = bisect_left(table.item_row, lo)
+        item_hi = bisect_left(table.item_row, hi)
+
+        selected = DailyColumns(table.models)
+        selected.row_day = row_day[lo:hi]
+        selected.row_fallback = table.row_fallback[lo:hi]
+        selected.item_row = array("I", [row - lo for row in table.item_row[item_lo:item_hi]])
+        selected.item_model = table.item_model[item_lo:item_hi]
+        selected.item_cost = table.item_cost[item_lo:item_hi]
+        return selected
+
+    def filter_by_days(self, days: Optional[int]) -> "DailyColumns":
+        if not days:
+            return self
+        return self.window(since=date.today() - timedelta(days=days - 1))
+
+    def aggregate_costs(self) -> Dict[str, float]:
+        sums = [0.0] * len(self.models)
+        seen = [False] * len(self.models)
+        for model, cost in zip(self.item_model, self.item_cost):
+            if cost == cost:
+                sums[model] += cost
+                seen[model] = True
+        return {self.models[idx]: sums[idx] for idx in range(len(self.models)) if seen[idx]}
+
+    def day_string(self, row: int) -> Optional[str]:
+        ordinal = self.row_day[row]
+        return date.fromordinal(ordinal).isoformat() if ordinal > 0 else None
+
+    def rollup(self, group_by: str, burn_days: int = BURN_RATE_DAYS) -> "CostRollup":
+        """Model x time-bucket cost matrix plus per-model daily cost statistics.
+
+        Costs are accumulated into flat `array('d')` buffers indexed by
+        (model, day) and (model, bucket); rows without a usable date are skipped.
+        Daily statistics and the burn rate both run over calendar days: every
+        day from the first to the last dated row, counting days without usage
+        (for that model, or at all) as zero. The burn rate averages the last
+        `burn_days` of them, or the whole range when it is shorter; the
+        returned `burn_days` is the window actually used.
+        """
+        table = self.sort_by_day()
+        first = bisect_right(table.row_day, 0)
+        days = array("i")
+        day_of_row = array("i", [-1]) * len(table.row_day)
+        buckets: List[str] = []
+        bucket_of_day = array("i")
+        for row in range(first, len(table.row_day)):
+            ordinal = table.row_day[row]
+            if not days or days[-1] != ordinal:
+                days.append(ordinal)
+                label = bucket_label(ordinal, group_by)
+                if not buckets or buckets[-1] != label:
+                    buckets.append(label)
+                bucket_of_day.append(len(buckets) - 1)
+            day_of_row[row] = len(days) - 1
+
+        nmodels, ndays, nbuckets = len(table.models), len(days), len(buckets)
+        daily = array("d", [0.0]) * (nmodels * ndays)
+        matrix = array("d", [0.0]) * (nmodels * nbuckets)
+        seen = [False] * nmodels
+        for row, model, cost in zip(table.item_row, table.item_model, table.item_cost):
+            day = day_of_row[row]
+            if day < 0 or cost != cost:
+                continue
+            daily[model * ndays + day] += cost
+            matrix[model * nbuckets + bucket_of_day[day]] += cost
+            seen[model] = True
+
+        models = [idx for idx in range(nmodels) if seen[idx]]
+        costs = {table.models[idx]: list(matrix[idx * nbuckets : (idx + 1) * nbuckets]) for idx in models}
+        stats: Dict[str, Dict[str, float]] = {}
+        day_totals = array("d", [0.0]) * ndays
+        # Calendar days in the span that have no rows at all
+        idle_days = [0.0] * (days[-1] - days[0] + 1 - ndays) if ndays else []
+        for idx in models:
+            series = daily[idx * ndays : (idx + 1) * ndays]
+            for day, cost in enumerate(series):
+                day_totals[day] += cost
+            ordered = sorted([*series, *idle_days])
+            stats[table.models[idx]] = {
+                "mean": math.fsum(ordered) / len(ordered),
+                "p50": percentile(ordered, 50),
+                "p95": percentile(ordered, 95),
+            }
+
+        burn_rate = None
+        if ndays:
+            # A range shorter than the burn window is averaged over the days it covers
+            burn_days = min(burn_days, days[-1] - days[0] + 1)
+            start = bisect_left(days, days[-1] - burn_days + 1)
+            burn_rate = math.fsum(day_totals[start:]) / burn_days
+        return CostRollup(
+            group_by=group_by,
+            buckets=buckets,
+            costs=costs,
+            daily_stats=stats,
+            burn_days=burn_days,
+            burn_rate=burn_rate,
+        )
+
+    def summarize(self) -> UsageSummary:
+        """Columnar equivalent of `summarize_entries()`."""
+        nrows = len(self.row_day)
+        best_model = array("i", [-1]) * nrows
+        best_cost = array("d", [0.0]) * nrows
+        latest_row = array("i", [-1]) * len(self.models)
+        latest_cost = array("d", [math.nan]) * len(self.models)
+        row_day = self.row_day
+
+        for row, model, cost in zip(self.item_row, self.item_model, self.item_cost):
+            previous = latest_row[model]
+            if previous < 0 or (previous != row and row_day[row] >= row_day[previous]):
+                latest_row[model] = row
+                latest_cost[model] = cost
+            if cost == cost and (best_model[row] < 0 or cost > best_cost[row]):
+                best_model[row] = model
+                best_cost[row] = cost
+
+        current_row = -1
+        current_model = -1
+        for row in range(nrows):
+            candidate = best_model[row]
+            if candidate < 0:
+                candidate = self.row_fallback[row]
+            if candidate >= 0 and (current_row < 0 or row_day[row] >= row_day[current_row]):
+                current_row, current_model = row, candidate
+
+        latest_costs: Dict[str, Tuple[Optional[str], Optional[float]]] = {}
+        for idx, row in enumerate(latest_row):
+            if row >= 0:
+                cost = latest_cost[idx]
+                latest_costs[self.models[idx]] = (self.day_string(row), cost if cost == cost else None)
+        return UsageSummary(
+            totals=self.aggregate_costs(),
+            current_model=self.models[current_model] if current_model >= 0 else None,
+            current_date=self.day_string(current_row) if current_row >= 0 else None,
+            latest_costs=latest_costs,
+            row_count=nrows,
+        )
+
+
 def render_text_current(
     provider: str,
     model: str,
@@ -243,76 +1076,462 @@ def build_json_all(provider: str, totals: Dict[str, float]) -> Dict[str, Any]:
     }
 
 
+def render_text_rollup(provider: str, rollup: CostRollup) -> str:
+    lines = [f"Provider: {provider}", f"Cost by {rollup.group_by}:"]
+    models = rollup.ranked_models()
+    for idx, bucket in enumerate(rollup.buckets):
+        bucket_costs = [(model, rollup.costs[model][idx]) for model in models]
+        lines.append(f"{bucket}: {usd(math.fsum(cost for _, cost in bucket_costs))}")
+        for model, cost in sorted(bucket_costs, key=lambda item: item[1], reverse=True):
+            if cost:
+                lines.append(f"  - {model}: {usd(cost)}")
+    lines.append("Daily cost (mean / p50 / p95):")
+    for model in models:
+        stats = rollup.daily_stats[model]
+        lines.append(
+            f"- {model}: {usd(stats['mean'])} / {usd(stats['p50'])} / {usd(stats['p95'])}"
+        )
+    if rollup.burn_rate is not None:
+        lines.append(
+            f"Burn rate (last {rollup.burn_days} days): {usd(rollup.burn_rate)}/day, "
+            f"~{usd(rollup.burn_rate * 30)} per 30 days"
+        )
+    return "\n".join(lines)
+
+
+def build_json_rollup(provider: str, rollup: CostRollup) -> Dict[str, Any]:
+    return {
+        "provider": provider,
+        "mode": "rollup",
+        "groupBy": rollup.group_by,
+        "buckets": rollup.buckets,
+        "models": [
+            {
+                "model": model,
+                "totalCostUSD": math.fsum(rollup.costs[model]),
+                "bucketCostsUSD": rollup.costs[model],
+                "dailyMeanUSD": rollup.daily_stats[model]["mean"],
+                "dailyP50USD": rollup.daily_stats[model]["p50"],
+                "dailyP95USD": rollup.daily_stats[model]["p95"],
+            }
+            for model in rollup.ranked_models()
+        ],
+        "burnRate": {
+            "days": rollup.burn_days,
+            "dailyCostUSD": rollup.burn_rate,
+            "projected30DayCostUSD": rollup.burn_rate * 30 if rollup.burn_rate is not None else None,
+        },
+    }
+
+
+def merge_totals(per_provider: Iterable[Dict[str, float]]) -> Dict[str, float]:
+    merged: Dict[str, float] = {}
+    for totals in per_provider:
+        for model, cost in totals.items():
+            merged[model] = merged.get(model, 0.0) + cost
+    return merged
+
+
+def render_text_combined(providers: List[str], totals: Dict[str, float]) -> str:
+    lines = [f"Combined ({', '.join(providers)}): {usd(math.fsum(totals.values()))}", "Models:"]
+    for model, cost in sorted(totals.items(), key=lambda item: item[1], reverse=True):
+        lines.append(f"- {model}: {usd(cost)}")
+    return "\n".join(lines)
+
+
+def build_json_combined(
+    mode: str, reports: List[Dict[str, Any]], totals: Dict[str, float]
+) -> Dict[str, Any]:
+    combined = build_json_all(provider="all", totals=totals)
+    combined["totalCostUSD"] = math.fsum(totals.values())
+    return {"mode": mode, "providers": reports, "combined": combined}
+
+
+def current_fields(
+    provider: str, summary: UsageSummary, model: Optional[str]
+) -> Optional[Dict[str, Any]]:
+    """Keyword arguments for `build_json_current()` / `render_text_current()`, or None."""
+    latest_date = None
+    if not model:
+        model, latest_date = summary.current_model, summary.current_date
+    if not model:
+        return None
+    latest_cost_date, latest_cost = summary.latest_day_cost(model)
+    return {
+        "provider": provider,
+        "model": model,
+        "latest_date": latest_date,
+        "total_cost": summary.totals.get(model),
+        "latest_cost": latest_cost,
+        "latest_cost_date": latest_cost_date,
+        "entry_count": summary.row_count,
+    }
+
+
+def provider_entries(
+    args: argparse.Namespace,
+    provider: str,
+    data: Any = None,
+    ttl: Optional[float] = None,
+) -> Iterable[Dict[str, Any]]:
+    """One provider's daily rows from `data`, --input, the cache or codexbar itself."""
+    if data is not None:
+        return parse_daily_entries(select_provider(data, provider))
+    input_path = args.input
+    if not input_path and not args.no_cache:
+        input_path = cached_codexbar_cost(
+            provider,
+            ttl=args.cache_ttl if ttl is None else ttl,
+            refresh=args.refresh,
+            cache_dir=args.cache_dir,
+        )
+    if args.stream:
+        return stream_daily_entries(input_path, provider)
+    return parse_daily_entries(load_payload(input_path, provider))
+
+
+def collect_columns(
+    args: argparse.Namespace,
+    provider: str,
+    since: Optional[date],
+    data: Any = None,
+) -> DailyColumns:
+    entries = provider_entries(args, provider, data)
+    # Filter while building so --stream stays bounded by the window, not the file.
+    return DailyColumns.from_entries(entries, since, args.until).window(since, args.until)
+
+
+def collect_provider_columns(
+    args: argparse.Namespace, providers: List[str], since: Optional[date]
+) -> Dict[str, DailyColumns]:
+    """Collect every provider's rows, running the per-provider codexbar calls concurrently."""
+    if len(providers) == 1:
+        return {providers[0]: collect_columns(args, providers[0], since)}
+
+    data = None
+    if args.input and not args.stream:
+        # One document holds every provider: parse it once and share it.
+        data = read_json_input(args.input)
+    elif args.input == "-":
+        raise RuntimeError("--stream reads stdin once; pass a file path to stream several providers.")
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=len(providers)) as pool:
+        futures = {
+            provider: pool.submit(collect_columns, args, provider, since, data)
+            for provider in providers
+        }
+        collected: Dict[str, DailyColumns] = {}
+        for provider, future in futures.items():
+            try:
+                collected[provider] = future.result()
+            except Exception as exc:
+                raise RuntimeError(f"{provider}: {exc}") from exc
+    return collected
+
+
+class UsageTracker:
+    """Running aggregates over daily rows, for --watch.
+
+    Rows are keyed by (date, position among that date's rows) so repeated dates
+    each keep their own costs, and `update()` diffs a fresh poll against the
+    previous one, re-applying only rows that were added, changed or dropped.
+    Totals are kept as per-row contributions, so a changed model is re-summed
+    exactly instead of drifting through repeated float subtraction. Undated rows
+    count (under an empty date) unless a window is given, as in one-shot mode.
+    """
+
+    def __init__(self) -> None:
+        self.rows: Dict[Tuple[str, int], Dict[str, Any]] = {}
+        self.totals: Dict[str, float] = {}
+        self._ordinals: Dict[Tuple[str, int], int] = {}
+        self._fingerprints: Dict[Tuple[str, int], str] = {}
+        self._costs: Dict[str, Dict[Tuple[str, int], float]] = {}
+
+    def _drop(self, key: Tuple[str, int], touched: Set[str]) -> None:
+        entry = self.rows.pop(key)
+        del self._ordinals[key], self._fingerprints[key]
+        for model in aggregate_costs([entry]):
+            self._costs[model].pop(key, None)
+            touched.add(model)
+
+    def update(
+        self,
+        entries: Iterable[Dict[str, Any]],
+        since: Optional[date] = None,
+        until: Optional[date] = None,
+    ) -> bool:
+        """Apply a fresh set of rows; returns whether anything changed."""
+        bounded = since is not None or until is not None
+        positions: Dict[str, int] = {}
+        seen: Set[Tuple[str, int]] = set()
+        touched: Set[str] = set()
+        changed = False
+        for entry in entries:
+            day = entry.get("date")
+            parsed = parse_date(day) if isinstance(day, str) else None
+            if parsed is None:
+                if bounded:
+                    continue
+                day = ""
+            elif (since and parsed < since) or (until and parsed > until):
+                continue
+            position = positions.get(day, 0)
+            positions[day] = position + 1
+            key = (day, position)
+            seen.add(key)
+            fingerprint = json.dumps(entry, sort_keys=True)
+            if self._fingerprints.get(key) == fingerprint:
+                continue
+            if key in self.rows:
+                self._drop(key, touched)
+            self.rows[key] = entry
+            self._ordinals[key] = parsed.toordinal() if parsed else 0
+            self._fingerprints[key] = fingerprint
+            for model, cost in aggregate_costs([entry]).items():
+                self._costs.setdefault(model, {})[key] = cost
+                touched.add(model)
+            changed = True
+        for key in [key for key in self.rows if key not in seen]:
+            self._drop(key, touched)
+            changed = True
+        for model in touched:
+            costs = self._costs.get(model)
+            if costs:
+                self.totals[model] = math.fsum(costs.values())
+            else:
+                self._costs.pop(model, None)
+                self.totals.pop(model, None)
+        return changed
+
+    def summarize(self, model: Optional[str] = None) -> UsageSummary:
+        """Summary for current mode, scanning back from the newest row only as far as needed.
+
+        Within a date, later rows win, as in summarize_entries().
+        """
+        current: Optional[Tuple[Optional[str], Optional[str]]] = None
+        latest_costs: Dict[str, Tuple[Optional[str], Optional[float]]] = {}
+        newest_first = sorted(self.rows, key=lambda key: (self._ordinals[key], key[1]), reverse=True)
+        for key in newest_first:
+            row = summarize_entries([self.rows[key]])
+            if current is None and row.current_model:
+                current = (row.current_model, row.current_date)
+                model = model or row.current_model
+            if model and model not in latest_costs and model in row.latest_costs:
+                latest_costs[model] = row.latest_costs[model]
+            if current is not None and (not model or model in latest_costs):
+                break
+        return UsageSummary(
+            totals=dict(self.totals),
+            current_model=current[0] if current else None,
+            current_date=current[1] if current else None,
+            latest_costs=latest_costs,
+            row_count=len(self.rows),
+        )
+
+
+def build_watch_payload(
+    args: argparse.Namespace, providers: List[str], trackers: Dict[str, UsageTracker]
+) -> Optional[Dict[str, Any]]:
+    """The same JSON payload main() prints for these providers, or None without data."""
+    if args.mode == "all":
+        reports = [
+            build_json_all(provider=provider, totals=trackers[provider].totals)
+            for provider in providers
+        ]
+    else:
+        reports = []
+        for provider in providers:
+            fields = current_fields(provider, trackers[provider].summarize(args.model), args.model)
+            if fields is not None:
+                reports.append(build_json_current(**fields))
+    combined = merge_totals(trackers[provider].totals for provider in providers)
+    if not reports or (args.mode == "all" and not combined):
+        return None
+    if len(providers) == 1:
+        return reports[0]
+    return build_json_combined(mode=args.mode, reports=reports, totals=combined)
+
+
+def watch(
+    args: argparse.Namespace,
+    providers: List[str],
+    interval: float,
+    max_polls: Optional[int] = None,
+) -> int:
+    """Poll every `interval` seconds and print a JSON line whenever the payload changes."""
+    if args.input == "-":
+        eprint("--watch cannot re-read stdin; pass a file path or use codexbar directly.")
+        return 1
+    trackers = {provider: UsageTracker() for provider in providers}
+    # Let a fetch from the previous poll count as stale by the next one.
+    ttl = min(args.cache_ttl, interval / 2)
+    last_line: Optional[str] = None
+    polls = 0
+
+    def poll(provider: str) -> bool:
+        entries = provider_entries(args, provider, ttl=ttl)
+        return trackers[provider].update(entries, window_start(args), args.until)
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=len(providers)) as pool:
+        try:
+            while True:
+                changed = False
+                futures = {provider: pool.submit(poll, provider) for provider in providers}
+                for provider, future in futures.items():
+                    try:
+                        changed = future.result() or changed
+                    except Exception as exc:
+                        eprint(f"{provider}: {exc}")
+                if changed or last_line is None:
+                    payload = build_watch_payload(args, providers, trackers)
+                    line = json.dumps(payload) if payload is not None else None
+                    if line is not None and line != last_line:
+                        print(line, flush=True)
+                        last_line = line
+                polls += 1
+                if max_polls is not None and polls >= max_polls:
+                    return 0
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            return 0
+
+
+def window_start(args: argparse.Namespace) -> Optional[date]:
+    since = args.since
+    if args.days:
+        cutoff = date.today() - timedelta(days=args.days - 1)
+        since = max(since, cutoff) if since else cutoff
+    return since
+
+
 def main() -> int:
     parser = argparse.ArgumentParser(description="Summarize CodexBar model usage from local cost logs.")
-    parser.add_argument("--provider", choices=["codex", "claude"], default="codex")
+    parser.add_argument(
+        "--provider",
+        action="append",
+        choices=[*PROVIDERS, "all"],
+        help="Provider to summarize (default: codex). Repeat or pass 'all' to combine providers.",
+    )
     parser.add_argument("--mode", choices=["current", "all"], default="current")
     parser.add_argument("--model", help="Explicit model name to report instead of auto-current.")
     parser.add_argument("--input", help="Path to codexbar cost JSON (or '-' for stdin).")
     parser.add_argument("--days", type=positive_int, help="Limit to last N days (based on daily rows).")
-    parser.add_argument("--format", choices=["text", "json"], default="text")
+    parser.add_argument("--since", type=iso_date, help="Only include rows on or after YYYY-MM-DD.")
+    parser.add_argument("--until", type=iso_date, help="Only include rows on or before YYYY-MM-DD.")
+    parser.add_argument(
+        "--group-by",
+        choices=["day", "week", "month"],
+        help="Report a model x bucket cost matrix with daily cost stats and burn rate instead.",
+    )
+    parser.add_argument("--format", choices=["text", "json"], help="Output format (default: text).")
     parser.add_argument("--pretty", action="store_true", help="Pretty-print JSON output.")
+    parser.add_argument(
+        "--watch",
+        type=positive_float,
+        metavar="INTERVAL",
+        help="Keep running, re-polling every INTERVAL seconds and printing a JSON line on change.",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Parse input incrementally, skipping other providers (bounded memory for large exports).",
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        type=float,
+        default=DEFAULT_CACHE_TTL,
+        help=f"Reuse cached codexbar output younger than this many seconds (default: {DEFAULT_CACHE_TTL:g}).",
+    )
+    parser.add_argument("--cache-dir", help="Cache directory (default: $XDG_CACHE_HOME/openclaw/model-usage).")
+    cache_group = parser.add_mutually_exclusive_group()
+    cache_group.add_argument("--no-cache", action="store_true", help="Always run codexbar; skip the cache.")
+    cache_group.add_argument("--refresh", action="store_true", help="Re-run codexbar and update the cache.")
 
     args = parser.parse_args()
+    providers = resolve_providers(args.provider)
+
+    if args.watch:
+        if args.format == "text" or args.pretty:
+            parser.error("--watch always prints one compact JSON line per change; drop --format text/--pretty")
+        if args.group_by:
+            parser.error("--watch reports per-model totals only; drop --group-by")
+        return watch(args, providers, args.watch)
 
     try:
-        payload = load_payload(args.input, args.provider)
+        columns = collect_provider_columns(args, providers, window_start(args))
     except Exception as exc:
         eprint(str(exc))
         return 1
 
-    entries = parse_daily_entries(payload)
-    entries = filter_by_days(entries, args.days)
+    indent = 2 if args.pretty else None
+    if args.group_by:
+        rollups = {provider: table.rollup(args.group_by) for provider, table in columns.items()}
+        if not any(rollup.costs for rollup in rollups.values()):
+            eprint("No model breakdowns found in codexbar cost payload.")
+            return 2
+        if args.format == "json":
+            reports = [build_json_rollup(provider, rollups[provider]) for provider in providers]
+            payload_out = reports[0] if len(reports) == 1 else {"mode": "rollup", "providers": reports}
+            print(json.dumps(payload_out, indent=indent, sort_keys=args.pretty))
+        else:
+            print("\n\n".join(render_text_rollup(p, rollups[p]) for p in providers))
+        return 0
 
-    if args.mode == "current":
-        model = args.model
-        latest_date = None
-        if not model:
-            model, latest_date = pick_current_model(entries)
-        if not model:
+    totals = {provider: table.aggregate_costs() for provider, table in columns.items()}
+
+    if len(providers) == 1:
+        provider = providers[0]
+        if args.mode == "all":
+            if not totals[provider]:
+                eprint("No model breakdowns found in codexbar cost payload.")
+                return 2
+            if args.format == "json":
+                payload_out = build_json_all(provider=provider, totals=totals[provider])
+                print(json.dumps(payload_out, indent=indent, sort_keys=args.pretty))
+            else:
+                print(render_text_all(provider=provider, totals=totals[provider]))
+            return 0
+
+        fields = current_fields(provider, columns[provider].summarize(), args.model)
+        if fields is None:
             eprint("No model data found in codexbar cost payload.")
             return 2
-        totals = aggregate_costs(entries)
-        total_cost = totals.get(model)
-        latest_cost_date, latest_cost = latest_day_cost(entries, model)
-
         if args.format == "json":
-            payload_out = build_json_current(
-                provider=args.provider,
-                model=model,
-                latest_date=latest_date,
-                total_cost=total_cost,
-                latest_cost=latest_cost,
-                latest_cost_date=latest_cost_date,
-                entry_count=len(entries),
-            )
-            indent = 2 if args.pretty else None
-            print(json.dumps(payload_out, indent=indent, sort_keys=args.pretty))
+            print(json.dumps(build_json_current(**fields), indent=indent, sort_keys=args.pretty))
         else:
-            print(
-                render_text_current(
-                    provider=args.provider,
-                    model=model,
-                    latest_date=latest_date,
-                    total_cost=total_cost,
-                    latest_cost=latest_cost,
-                    latest_cost_date=latest_cost_date,
-                    entry_count=len(entries),
-                )
-            )
+            print(render_text_current(**fields))
         return 0
 
-    totals = aggregate_costs(entries)
-    if not totals:
-        eprint("No model breakdowns found in codexbar cost payload.")
-        return 2
+    combined = merge_totals(totals.values())
+    if args.mode == "all":
+        if not combined:
+            eprint("No model breakdowns found in codexbar cost payload.")
+            return 2
+        reports = [build_json_all(provider=p, totals=totals[p]) for p in providers]
+        sections = [render_text_all(provider=p, totals=totals[p]) for p in providers]
+    else:
+        found = []
+        for provider in providers:
+            fields = current_fields(provider, columns[provider].summarize(), args.model)
+            if fields is None:
+                eprint(f"No model data found for provider '{provider}'.")
+            else:
+                found.append(fields)
+        if not found:
+            eprint("No model data found in codexbar cost payload.")
+            return 2
+        reports = [build_json_current(**fields) for fields in found]
+        sections = [render_text_current(**fields) for fields in found]
 
     if args.format == "json":
-        payload_out = build_json_all(provider=args.provider, totals=totals)
-        indent = 2 if args.pretty else None
+        payload_out = build_json_combined(mode=args.mode, reports=reports, totals=combined)
         print(json.dumps(payload_out, indent=indent, sort_keys=args.pretty))
     else:
-        print(render_text_all(provider=args.provider, totals=totals))
+        print("\n\n".join([*sections, render_text_combined(providers, combined)]))
     return 0
 
 
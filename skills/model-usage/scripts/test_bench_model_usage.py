@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Tests for the model_usage benchmark harness.
+"""
+
+import contextlib
+import io
+import sys
+from unittest import TestCase, main, mock
+
+import bench_model_usage
+from bench_model_usage import CASE_NAMES, build_cases, compare, generate_payload, run_benchmarks
+from model_usage import DailyColumns, select_provider
+
+
+class TestBenchModelUsage(TestCase):
+    def test_generate_payload_shape(self):
+        payload = generate_payload(30, providers=("codex", "claude"), models_per_day=2, seed=1)
+        self.assertEqual([entry["provider"] for entry in payload], ["codex", "claude"])
+        daily = select_provider(payload, "codex")["daily"]
+        self.assertEqual(len(daily), 30)
+        self.assertTrue(all(len(entry["modelBreakdowns"]) == 2 for entry in daily))
+        self.assertEqual(generate_payload(30, seed=1), generate_payload(30, seed=1))
+
+    def test_generate_payload_malformed_rows_are_tolerated(self):
+        payload = generate_payload(200, providers=("codex",), malformed_ratio=0.5, seed=2)
+        daily = payload[0]["daily"]
+        bad_dates = sum(1 for entry in daily if entry["date"] == "not-a-date")
+        self.assertGreater(bad_dates, 0)
+        columns = DailyColumns.from_entries(daily)
+        self.assertEqual(len(columns), 200)
+        self.assertEqual(len(columns.filter_by_days(365)), 200 - bad_dates)
+
+    def test_compare_flags_regressions(self):
+        baseline = {"1000": {"aggregate_costs": {"seconds": 1.0, "peakBytes": 100.0}}}
+        results = {"1000": {"aggregate_costs": {"seconds": 1.5, "peakBytes": 100.0}}}
+        self.assertEqual(len(compare(results, baseline, 0.25)), 1)
+        self.assertEqual(compare(results, baseline, 0.6), [])
+
+    def test_run_benchmarks_smoke(self):
+        results = run_benchmarks([20], repeat=1, only=["aggregate_costs", "main_current"])
+        self.assertEqual(sorted(results["20"]), ["aggregate_costs", "main_current"])
+        self.assertGreater(results["20"]["main_current"]["rowsPerSecond"], 0)
+
+    def test_build_cases_defers_fixtures_until_a_case_is_set_up(self):
+        cases = build_cases("/nonexistent/cost.json", "codex", 7)
+        self.assertEqual(tuple(cases), CASE_NAMES)
+        cases["main_current"]()  # Needs no parsed fixtures, so the missing file is never read
+        with self.assertRaises(Exception):
+            cases["aggregate_costs"]()
+
+    def test_main_rejects_bad_ratio_and_unknown_case(self):
+        for flags in (["--malformed-ratio", "1.5"], ["--malformed-ratio", "-0.1"], ["--case", "nope"]):
+            argv = ["bench_model_usage.py", "--rows", "10", *flags]
+            with mock.patch.object(sys, "argv", argv), contextlib.redirect_stderr(io.StringIO()) as err:
+                with self.assertRaises(SystemExit):
+                    bench_model_usage.main()
+            self.assertIn(flags[0], err.getvalue())
+
+
+if __name__ == "__main__":
+    main()
@@ -4,10 +4,60 @@ Tests for model_usage helpers.
 """
 
 import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
 from datetime import date, timedelta
-from unittest import TestCase, main
+from unittest import TestCase, main, mock
 
-from model_usage import filter_by_days, positive_int
+import model_usage
+from model_usage import (
+    DailyColumns,
+    JsonStreamReader,
+    UsageTracker,
+    aggregate_costs,
+    build_json_combined,
+    cached_codexbar_cost,
+    collect_provider_columns,
+    filter_by_days,
+    iso_date,
+    iter_daily_stream,
+    latest_day_cost,
+    merge_totals,
+    parse_daily_entries,
+    parse_date,
+    percentile,
+    pick_current_model,
+    positive_int,
+    render_text_rollup,
+    resolve_providers,
+    summarize_entries,
+    watch,
+)
+
+SAMPLE_PAYLOAD = [
+    {
+        "provider": "claude",
+        "daily": [
+            {"date": "2025-01-01", "modelBreakdowns": [{"modelName": "opus", "cost": 9.0}]},
+        ],
+    },
+    {
+        "daily": [
+            {"date": "2025-01-01", "modelBreakdowns": [{"modelName": "gpt-5", "cost": 1.5}]},
+            "not-a-row",
+            {"date": "2025-01-02", "modelBreakdowns": [{"modelName": "gpt-5", "cost": 2.25}]},
+        ],
+        "totals": {"note": "escaped \\\" ] } quote"},
+        "provider": "codex",
+    },
+]
 
 
 class TestModelUsage(TestCase):
@@ -36,5 +86,388 @@ class TestModelUsage(TestCase):
         self.assertEqual(filtered[1]["date"], today.strftime("%Y-%m-%d"))
 
 
+class TestStreamingIngest(TestCase):
+    def stream(self, payload, provider, chunk_size=7):
+        handle = io.StringIO(json.dumps(payload, indent=1))
+        return list(iter_daily_stream(handle, provider, chunk_size))
+
+    def test_stream_matches_eager_parse(self):
+        eager = parse_daily_entries(SAMPLE_PAYLOAD[1])
+        self.assertEqual(self.stream(SAMPLE_PAYLOAD, "codex"), eager)
+        self.assertEqual(len(self.stream(SAMPLE_PAYLOAD, "claude")), 1)
+
+    def test_stream_accepts_single_provider_object(self):
+        rows = self.stream(SAMPLE_PAYLOAD[1], "claude")
+        self.assertEqual([row["date"] for row in rows], ["2025-01-01", "2025-01-02"])
+
+    def test_stream_missing_provider_raises(self):
+        with self.assertRaises(RuntimeError) as ctx:
+            self.stream(SAMPLE_PAYLOAD, "gemini")
+        self.assertIn("Provider 'gemini' not found", str(ctx.exception))
+
+    def test_reader_skips_nested_values(self):
+        reader = JsonStreamReader(io.StringIO('{"a": [1, {"b": "]}"}], "c": -1.5e3}'), 3)
+        seen = {}
+        for key in reader.iter_object():
+            if key == "c":
+                seen[key] = reader.read_value()
+            else:
+                reader.skip_value()
+        self.assertEqual(seen, {"c": -1500.0})
+        self.assertEqual(reader.peek(), "")
+
+    def test_truncated_input_raises(self):
+        with self.assertRaises(RuntimeError):
+            list(iter_daily_stream(io.StringIO('[{"provider": "codex", "daily": [{"date"'), "codex"))
+
+
+def random_entries(rng, count):
+    models = ["gpt-5", "o3", "opus", "sonnet"]
+    entries = []
+    for _ in range(count):
+        entry = {"date": f"2025-01-{rng.randint(1, 9):02d}"}
+        if rng.random() < 0.8:
+            entry["modelBreakdowns"] = [
+                {"modelName": rng.choice(models), "cost": rng.choice([rng.random(), 1.0, "x"])}
+                for _ in range(rng.randint(0, 3))
+            ]
+        if rng.random() < 0.3:
+            entry["modelsUsed"] = [rng.choice(models)]
+        if rng.random() < 0.05:
+            del entry["date"]
+        entries.append(entry)
+    return entries
+
+
+class TestSummarizeEntries(TestCase):
+    def test_matches_separate_passes(self):
+        rng = random.Random(7)
+        for _ in range(200):
+            entries = random_entries(rng, rng.randint(0, 12))
+            summary = summarize_entries(iter(entries))
+            self.assertEqual(summary.row_count, len(entries))
+            self.assertEqual(summary.totals, aggregate_costs(entries))
+            self.assertEqual(
+                (summary.current_model, summary.current_date), pick_current_model(entries)
+            )
+            for model in ["gpt-5", "o3", "opus", "sonnet", "missing"]:
+                self.assertEqual(summary.latest_day_cost(model), latest_day_cost(entries, model))
+
+    def test_empty_input(self):
+        summary = summarize_entries([])
+        self.assertIsNone(summary.current_model)
+        self.assertEqual(summary.totals, {})
+        self.assertEqual(summary.row_count, 0)
+
+
+# Same cases as PERCENTILE_CASES in openai-image-gen/scripts/test_gen.py: the two
+# skills define percentile identically, and these pin both copies to the same results.
+PERCENTILE_CASES = [
+    ([], 50, 0.0),
+    ([7.0], 95, 7.0),
+    ([1.0, 2.0, 3.0], 50, 2.0),
+    ([1.0, 2.0, 3.0, 4.0], 50, 2.5),
+    ([100.0, 300.0], 95, 290.0),
+    ([0.0, 1.0, 10.0, 100.0], 0, 0.0),
+    ([0.0, 1.0, 10.0, 100.0], 100, 100.0),
+    ([0.0, 1.0, 10.0, 100.0], 95, 86.5),
+    ([float(i) for i in range(101)], 95, 95.0),
+]
+
+
+class TestDailyColumns(TestCase):
+    def test_matches_dict_helpers(self):
+        rng = random.Random(11)
+        for _ in range(200):
+            entries = random_entries(rng, rng.randint(0, 12))
+            summary = DailyColumns.from_entries(entries).summarize()
+            self.assertEqual(summary, summarize_entries(entries))
+
+    def test_filter_by_days_matches_dict_filter(self):
+        rng = random.Random(3)
+        today = date.today()
+        entries = random_entries(rng, 40)
+        for entry in entries:
+            if "date" in entry:
+                entry["date"] = (today - timedelta(days=rng.randint(0, 10))).isoformat()
+        columns = DailyColumns.from_entries(entries)
+        for days in (None, 1, 3, 11):
+            expected = filter_by_days(entries, days)
+            filtered = columns.filter_by_days(days)
+            self.assertEqual(len(filtered), len(expected))
+            totals = filtered.aggregate_costs()
+            expected_totals = aggregate_costs(expected)
+            self.assertEqual(totals.keys(), expected_totals.keys())
+            for model, cost in expected_totals.items():
+                self.assertAlmostEqual(totals[model], cost)
+
+    def test_window_bisects_sorted_days(self):
+        entries = [
+            {"date": day, "modelBreakdowns": [{"modelName": day, "cost": 1}]}
+            for day in ["2025-03-05", "2025-03-01", "bogus", "2025-03-03", "2025-03-03"]
+        ]
+        columns = DailyColumns.from_entries(entries)
+        window = columns.window(since=date(2025, 3, 2), until=date(2025, 3, 4))
+        self.assertEqual(window.aggregate_costs(), {"2025-03-03": 2.0})
+        self.assertEqual(list(window.item_row), [0, 1])
+        self.assertEqual(len(columns.window(until=date(2025, 3, 4))), 3)
+        self.assertEqual(len(columns.window(since=date(2025, 4, 1))), 0)
+        self.assertIs(columns.window(), columns)
+
+    def test_from_entries_applies_window_while_building(self):
+        entries = [
+            {"date": day, "modelBreakdowns": [{"modelName": day, "cost": 1}]}
+            for day in ["2025-03-05", "2025-03-01", "bogus", "2025-03-03", "2025-03-03"]
+        ]
+        since, until = date(2025, 3, 2), date(2025, 3, 4)
+        built = DailyColumns.from_entries(iter(entries), since, until)
+        self.assertEqual(len(built), 2)
+        self.assertEqual(built.models, ["2025-03-03"])
+        self.assertEqual(built.aggregate_costs(), DailyColumns.from_entries(entries).window(since, until).aggregate_costs())
+        self.assertEqual(len(DailyColumns.from_entries(entries, until=until)), 3)
+        self.assertEqual(len(DailyColumns.from_entries(entries)), 5)
+
+    def test_parse_date_fast_path_and_fallback(self):
+        self.assertEqual(parse_date("2025-02-03"), date(2025, 2, 3))
+        self.assertEqual(parse_date("2025-2-3"), date(2025, 2, 3))
+        self.assertIsNone(parse_date("2025-02-30"))
+        self.assertIsNone(parse_date("20250203"))
+        with self.assertRaises(argparse.ArgumentTypeError):
+            iso_date("yesterday")
+
+    def test_rollup_by_week(self):
+        entries = [
+            {"date": "2025-01-05", "modelBreakdowns": [{"modelName": "a", "cost": 1.0}]},
+            {"date": "2025-01-06", "modelBreakdowns": [{"modelName": "a", "cost": 2.0}]},
+            {"date": "2025-01-07", "modelBreakdowns": [{"modelName": "b", "cost": 4.0}]},
+            {"date": "2025-01-20", "modelBreakdowns": [{"modelName": "a", "cost": 8.0}]},
+            {"modelBreakdowns": [{"modelName": "a", "cost": 100.0}]},
+        ]
+        rollup = DailyColumns.from_entries(entries).rollup("week")
+        self.assertEqual(rollup.buckets, ["2025-W01", "2025-W02", "2025-W04"])
+        self.assertEqual(rollup.costs, {"a": [1.0, 2.0, 8.0], "b": [0.0, 4.0, 0.0]})
+        self.assertEqual(rollup.ranked_models(), ["a", "b"])
+        # 2025-01-05 through 2025-01-20 is 16 calendar days, 12 of them without rows
+        self.assertEqual(rollup.daily_stats["b"]["mean"], 0.25)
+        self.assertEqual(rollup.daily_stats["b"]["p50"], 0.0)
+        self.assertAlmostEqual(rollup.daily_stats["b"]["p95"], 1.0)
+        self.assertEqual(rollup.daily_stats["a"]["mean"], 11.0 / 16)
+        self.assertEqual(rollup.burn_days, 7)
+        self.assertEqual(rollup.burn_rate, 8.0 / 7)
+
+    def test_rollup_by_month_and_percentile(self):
+        entries = [
+            {"date": "2025-01-31", "modelBreakdowns": [{"modelName": "a", "cost": 1.0}]},
+            {"date": "2025-02-01", "modelBreakdowns": [{"modelName": "a", "cost": 2.0}]},
+        ]
+        rollup = DailyColumns.from_entries(entries).rollup("month")
+        self.assertEqual(rollup.buckets, ["2025-01", "2025-02"])
+        # Two days of data average over two days, not the full 7-day window
+        self.assertEqual(rollup.burn_days, 2)
+        self.assertEqual(rollup.burn_rate, 1.5)
+        self.assertIn("Burn rate (last 2 days): $1.50/day", render_text_rollup("codex", rollup))
+
+    def test_percentile(self):
+        for values, pct, expected in PERCENTILE_CASES:
+            with self.subTest(values=values, pct=pct):
+                self.assertAlmostEqual(percentile(values, pct), expected)
+
+    def test_interns_model_names(self):
+        entries = [
+            {"date": "2025-01-01", "modelBreakdowns": [{"modelName": "gpt-5", "cost": 1}]},
+            {"date": "2025-01-02", "modelBreakdowns": [{"modelName": "gpt-5", "cost": 2}]},
+        ]
+        columns = DailyColumns.from_entries(entries)
+        self.assertEqual(columns.models, ["gpt-5"])
+        self.assertEqual(list(columns.item_cost), [1.0, 2.0])
+
+
+class TestMultiProvider(TestCase):
+    def test_resolve_providers(self):
+        self.assertEqual(resolve_providers(None), ["codex"])
+        self.assertEqual(resolve_providers(["all"]), ["codex", "claude"])
+        self.assertEqual(resolve_providers(["claude", "all", "claude"]), ["claude", "codex"])
+
+    def test_collects_each_provider_from_one_input(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as handle:
+            json.dump(SAMPLE_PAYLOAD, handle)
+        self.addCleanup(os.unlink, handle.name)
+        for stream in (False, True):
+            args = argparse.Namespace(input=handle.name, stream=stream, until=None)
+            columns = collect_provider_columns(args, ["codex", "claude"], None)
+            totals = {provider: table.aggregate_costs() for provider, table in columns.items()}
+            self.assertEqual(totals, {"codex": {"gpt-5": 3.75}, "claude": {"opus": 9.0}})
+
+    def test_combined_totals(self):
+        combined = merge_totals([{"gpt-5": 1.5, "opus": 1.0}, {"opus": 2.0}])
+        self.assertEqual(combined, {"gpt-5": 1.5, "opus": 3.0})
+        payload = build_json_combined("all", [], combined)
+        self.assertEqual(payload["combined"]["totalCostUSD"], 4.5)
+        self.assertEqual(payload["combined"]["models"][0], {"model": "opus", "totalCostUSD": 3.0})
+
+
+class TestWatch(TestCase):
+    def rows(self, *costs):
+        return [
+            {"date": f"2025-01-0{idx + 1}", "modelBreakdowns": [{"modelName": model, "cost": cost}]}
+            for idx, (model, cost) in enumerate(costs)
+        ]
+
+    def test_tracker_applies_deltas(self):
+        tracker = UsageTracker()
+        self.assertTrue(tracker.update(self.rows(("gpt-5", 1.0), ("o3", 2.0))))
+        self.assertEqual(tracker.totals, {"gpt-5": 1.0, "o3": 2.0})
+        self.assertFalse(tracker.update(self.rows(("gpt-5", 1.0), ("o3", 2.0))))
+
+        rows = self.rows(("gpt-5", 1.0), ("o3", 2.0), ("gpt-5", 4.0))
+        rows[1]["modelBreakdowns"][0]["cost"] = 3.0
+        self.assertTrue(tracker.update(rows))
+        self.assertEqual(tracker.totals, {"gpt-5": 5.0, "o3": 3.0})
+        summary, expected = tracker.summarize(), summarize_entries(rows)
+        self.assertEqual(summary.current_model, expected.current_model)
+        self.assertEqual(summary.current_date, expected.current_date)
+        self.assertEqual(summary.latest_day_cost("gpt-5"), expected.latest_day_cost("gpt-5"))
+        self.assertEqual(summary.row_count, 3)
+
+        self.assertTrue(tracker.update(rows[2:]))
+        self.assertEqual(tracker.totals, {"gpt-5": 4.0})
+        self.assertEqual(tracker.summarize("o3").latest_day_cost("o3"), (None, None))
+
+    def test_tracker_respects_window(self):
+        tracker = UsageTracker()
+        tracker.update(self.rows(("a", 1), ("b", 2), ("c", 3)), since=date(2025, 1, 2))
+        self.assertEqual(tracker.totals, {"b": 2.0, "c": 3.0})
+
+    def test_tracker_keeps_same_date_and_undated_rows_like_one_shot(self):
+        rows = [
+            {"date": "2025-01-02", "modelBreakdowns": [{"modelName": "a", "cost": 1.0}]},
+            {"date": "2025-01-02", "modelBreakdowns": [{"modelName": "b", "cost": 2.0}]},
+            {"modelBreakdowns": [{"modelName": "a", "cost": 4.0}]},
+            {"date": "2025-01-01", "modelBreakdowns": [{"modelName": "a", "cost": 8.0}]},
+        ]
+        tracker = UsageTracker()
+        self.assertTrue(tracker.update(rows))
+        self.assertFalse(tracker.update(rows))
+        summary, expected = tracker.summarize(), DailyColumns.from_entries(rows).summarize()
+        self.assertEqual(tracker.totals, expected.totals)
+        self.assertEqual(summary.row_count, expected.row_count)
+        self.assertEqual((summary.current_model, summary.current_date), (expected.current_model, expected.current_date))
+
+        windowed = UsageTracker()
+        windowed.update(rows, until=date(2025, 1, 2))
+        self.assertEqual(windowed.totals, {"a": 9.0, "b": 2.0})
+        self.assertEqual(windowed.summarize().row_count, 3)
+
+    def test_watch_rejects_text_pretty_and_group_by(self):
+        for flag in (["--format", "text"], ["--pretty"], ["--group-by", "week"]):
+            argv = ["model_usage.py", "--input", "x.json", "--watch", "5", *flag]
+            with mock.patch.object(sys, "argv", argv), contextlib.redirect_stderr(io.StringIO()) as err:
+                with self.assertRaises(SystemExit):
+                    model_usage.main()
+            self.assertIn("--watch", err.getvalue())
+
+    def test_watch_prints_once_per_change(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as handle:
+            json.dump(SAMPLE_PAYLOAD, handle)
+        self.addCleanup(os.unlink, handle.name)
+        args = argparse.Namespace(
+            input=handle.name,
+            stream=False,
+            mode="current",
+            model=None,
+            days=None,
+            since=None,
+            until=None,
+            cache_ttl=300.0,
+        )
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            self.assertEqual(watch(args, ["codex"], 0.001, max_polls=3), 0)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(json.loads(lines[0])["totalCostUSD"], 3.75)
+
+
+class TestCodexbarCache(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        root = self.temp_dir.name
+        self.cache_dir = os.path.join(root, "cache")
+        self.calls = os.path.join(root, "calls")
+        script = os.path.join(root, "codexbar")
+        with open(script, "w", encoding="utf-8") as handle:
+            handle.write(f"#!/bin/sh\necho run >> '{self.calls}'\necho '[]'\n")
+        os.chmod(script, 0o755)
+        patcher = mock.patch.dict(os.environ, {"PATH": root + os.pathsep + os.environ["PATH"]})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.temp_dir.cleanup)
+
+    def call_count(self):
+        if not os.path.exists(self.calls):
+            return 0
+        with open(self.calls, encoding="utf-8") as handle:
+            return len(handle.readlines())
+
+    def test_reuses_fresh_cache(self):
+        path = cached_codexbar_cost("codex", ttl=60, cache_dir=self.cache_dir)
+        again = cached_codexbar_cost("codex", ttl=60, cache_dir=self.cache_dir)
+        self.assertEqual(path, again)
+        self.assertEqual(self.call_count(), 1)
+        with open(path, encoding="utf-8") as handle:
+            self.assertEqual(json.load(handle), [])
+
+    def test_refresh_and_expiry_rerun_codexbar(self):
+        path = cached_codexbar_cost("codex", ttl=60, cache_dir=self.cache_dir)
+        cached_codexbar_cost("codex", ttl=60, refresh=True, cache_dir=self.cache_dir)
+        self.assertEqual(self.call_count(), 2)
+        stale = time.time() - 120
+        os.utime(path, (stale, stale))
+        cached_codexbar_cost("codex", ttl=60, cache_dir=self.cache_dir)
+        self.assertEqual(self.call_count(), 3)
+
+    def test_invalid_json_is_not_cached(self):
+        script = os.path.join(self.temp_dir.name, "codexbar")
+        for output in ('[{\"provider\": \"codex\", \"daily\": [', "Error: not signed in", "[] trailing"):
+            with open(script, "w", encoding="utf-8") as handle:
+                handle.write(f"#!/bin/sh\necho '{output}'\n")
+            with self.assertRaisesRegex(RuntimeError, "invalid JSON"):
+                cached_codexbar_cost("codex", ttl=60, cache_dir=self.cache_dir)
+            self.assertEqual(os.listdir(self.cache_dir), ["codexbar-cost-codex.lock"])
+
+    def test_streamed_refresh_never_decodes_the_whole_payload(self):
+        payload = [{"provider": "codex", "daily": [{"date": "2025-01-01", "modelBreakdowns": [{"modelName": "a", "cost": 1.5}]}]}]
+        script = os.path.join(self.temp_dir.name, "codexbar")
+        with open(script, "w", encoding="utf-8") as handle:
+            handle.write(f"#!/bin/sh\necho '{json.dumps(payload)}'\n")
+        argv = ["model_usage.py", "--provider", "codex", "--mode", "all", "--stream", "--refresh"]
+        argv += ["--cache-dir", self.cache_dir, "--format", "json"]
+        out = io.StringIO()
+        with mock.patch.object(sys, "argv", argv), mock.patch("json.load", side_effect=AssertionError("json.load")):
+            with contextlib.redirect_stdout(out):
+                self.assertEqual(model_usage.main(), 0)
+        self.assertEqual(json.loads(out.getvalue())["models"], [{"model": "a", "totalCostUSD": 1.5}])
+
+    def test_failed_run_leaves_no_partial_file(self):
+        with mock.patch.dict(os.environ, {"PATH": self.temp_dir.name + "-missing"}):
+            with self.assertRaises(RuntimeError):
+                cached_codexbar_cost("claude", ttl=60, cache_dir=self.cache_dir)
+        self.assertEqual(os.listdir(self.cache_dir), ["codexbar-cost-claude.lock"])
+
+
+class TestStartup(TestCase):
+    def test_import_skips_heavy_modules(self):
+        heavy = ("subprocess", "tempfile", "concurrent.futures", "dataclasses")
+        probe = f"import sys, model_usage; print([m for m in {heavy!r} if m in sys.modules])"
+        result = subprocess.run(
+            [sys.executable, "-c", probe],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        self.assertEqual(result.stdout.strip(), "[]")
+
+
 if __name__ == "__main__":
     main()
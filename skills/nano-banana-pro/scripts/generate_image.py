@@ -14,12 +14,25 @@ Usage:
 
 Multi-image editing (up to 14 images):
     uv run generate_image.py --prompt "combine these images" --filename "output.png" -i img1.png -i img2.png -i img3.png
+
+Batch mode (one client, many jobs, one JSON object per line):
+    uv run generate_image.py --batch jobs.jsonl [--concurrency 4]
+
+Warm worker (later single-image runs hand their job to it over a Unix socket):
+    uv run generate_image.py --serve &
 """
 
 import argparse
+import json
 import os
 import sys
+import threading
 from pathlib import Path
+from typing import NamedTuple
+
+MODEL = "gemini-3-pro-image-preview"
+RESOLUTIONS = ("1K", "2K", "4K")
+MAX_INPUT_IMAGES = 14
 
 
 def get_api_key(provided_key: str | None) -> str | None:
@@ -29,18 +42,924 @@ def get_api_key(provided_key: str | None) -> str | None:
     return os.environ.get("GEMINI_API_KEY")
 
 
+def auto_resolution(requested: str, max_input_dim: int) -> str:
+    """Pick the output resolution from the largest input when the default was left in place."""
+    if requested != "1K" or max_input_dim <= 0:  # Explicit choice, or nothing to go by
+        return requested
+    if max_input_dim >= 3000:
+        return "4K"
+    if max_input_dim >= 1500:
+        return "2K"
+    return "1K"
+
+
+# Longest edge an input needs for each output resolution; larger inputs are downscaled before upload.
+MAX_INPUT_EDGE = {"1K": 1024, "2K": 2048, "4K": 4096}
+# Sources already in one of these formats are uploaded as-is when they need no downscaling.
+PASSTHROUGH_FORMATS = {"PNG": "image/png", "JPEG": "image/jpeg", "WEBP": "image/webp"}
+ENCODED_SUFFIXES = {".png": "image/png", ".jpg": "image/jpeg", ".webp": "image/webp"}
+INPUT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+
+class PreparedImage(NamedTuple):
+    """An input image ready to upload: encoded bytes plus the size they decode to."""
+
+    data: bytes
+    mime_type: str
+    width: int
+    height: int
+
+
+def default_input_cache_dir() -> str:
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "openclaw", "nano-banana-pro", "inputs")
+
+
+class PreparedImageCache:
+    """LRU of prepared input images keyed by path, mtime, size and target edge (used by the worker).
+
+    Bounded by the total size of the encoded bytes it holds, not by entry count.
+    """
+
+    def __init__(self, max_bytes: int = 128 * 1024 * 1024):
+        from collections import OrderedDict
+
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(path: str, max_edge: int) -> tuple:
+        stat = os.stat(path)
+        return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size, max_edge)
+
+    def get(self, key: tuple):
+        with self._lock:
+            image = self._entries.get(key)
+            if image is not None:
+                self._entries.move_to_end(key)
+            return image
+
+    def put(self, key: tuple, image: PreparedImage) -> None:
+        if len(image.data) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous.data)
+            self._entries[key] = image
+            self.size += len(image.data)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted.data)
+
+
+# Bump whenever prepare_input_image would encode the same file differently
+ENCODED_CACHE_VERSION = 2
+
+
+def encoded_cache_key(data: bytes, mtime_ns: int, max_edge: int) -> str:
+    """Disk cache key for one source file (content hash + mtime) at one target edge."""
+    import hashlib
+
+    return f"v{ENCODED_CACHE_VERSION}-{hashlib.sha256(data).hexdigest()[:32]}-{mtime_ns}-{max_edge}"
+
+
+def read_encoded_cache(cache_dir: str, key: str) -> PreparedImage | None:
+    """Look up `<key>.<width>x<height>.<ext>`; the name carries the size so a hit needs no decoding."""
+    for path in Path(cache_dir).glob(f"{key}.*"):
+        _, size, suffix = path.name.rsplit(".", 2)
+        mime_type = ENCODED_SUFFIXES.get(f".{suffix}")
+        width, _, height = size.partition("x")
+        if mime_type is None or not (width.isdigit() and height.isdigit()):
+            continue
+        try:
+            data = path.read_bytes()
+            os.utime(path)  # Pruning drops the least recently used files first
+        except OSError:
+            continue
+        return PreparedImage(data, mime_type, int(width), int(height))
+    return None
+
+
+def write_encoded_cache(cache_dir: str, key: str, image: PreparedImage, max_bytes: int = INPUT_CACHE_MAX_BYTES) -> None:
+    """Store prepared bytes atomically, then trim the directory to `max_bytes`; failures are ignored."""
+    import tempfile
+
+    suffix = next(suffix for suffix, mime_type in ENCODED_SUFFIXES.items() if mime_type == image.mime_type)
+    target = Path(cache_dir) / f"{key}.{image.width}x{image.height}{suffix}"
+    try:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=target.parent, prefix=".tmp-")
+        with os.fdopen(fd, "wb") as handle:
+            handle.write(image.data)
+        os.replace(tmp, target)
+        prune_encoded_cache(cache_dir, max_bytes)
+    except OSError:
+        pass
+
+
+def prune_encoded_cache(cache_dir: str, max_bytes: int) -> None:
+    """Delete the least recently used cache files until the directory fits in `max_bytes`."""
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.is_file() and not entry.name.startswith(".tmp-"):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.unlink(path)
+        except OSError:
+            continue
+        total -= size
+
+
+# JPEG start-of-frame markers (baseline, progressive, lossless...); C4, C8 and CC are not frames.
+JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+class ImageHeader(NamedTuple):
+    """What an image's header says, read without decoding any pixels."""
+
+    format: str
+    width: int
+    height: int
+    bit_depth: int = 8
+    # PNG colour type (0 gray, 2 RGB, 3 palette, 4 gray+alpha, 6 RGBA); JPEG component count; -1 otherwise
+    color_type: int = -1
+    animated: bool = False
+
+    @property
+    def uploadable(self) -> bool:
+        """Whether the file can be sent as-is: a still, 8-bit PNG/JPEG/WebP in a common mode."""
+        if self.format not in PASSTHROUGH_FORMATS or self.bit_depth != 8 or self.animated:
+            return False
+        if self.format == "PNG":
+            return self.color_type in (0, 2, 3, 4, 6)
+        if self.format == "JPEG":
+            return self.color_type in (1, 3)  # Not CMYK/YCCK
+        return True
+
+
+def read_image_header(stream) -> ImageHeader | None:
+    """Format, size, bit depth, colour type and animation from a PNG, JPEG, WebP or GIF header.
+
+    Only headers are read (for PNG, the chunks before the first IDAT). Returns
+    None for anything else; callers fall back to Pillow.
+    """
+    import struct
+
+    head = stream.read(30)
+    if head[:8] == b"\x89PNG\r\n\x1a\n" and head[12:16] == b"IHDR" and len(head) >= 26:
+        width, height, bit_depth, color_type = struct.unpack(">IIBB", head[16:26])
+        # APNG announces itself with an acTL chunk ahead of the image data.
+        animated = False
+        stream.seek(33)
+        while True:
+            chunk = stream.read(8)
+            if len(chunk) < 8 or chunk[4:] in (b"IDAT", b"IEND"):
+                break
+            if chunk[4:] == b"acTL":
+                animated = True
+                break
+            stream.seek(struct.unpack(">I", chunk[:4])[0] + 4, 1)  # Data plus CRC
+        return ImageHeader("PNG", width, height, bit_depth, color_type, animated)
+    if head[:6] in (b"GIF87a", b"GIF89a") and len(head) >= 10:
+        width, height = struct.unpack("<HH", head[6:10])
+        return ImageHeader("GIF", width, height)
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP" and len(head) >= 30:
+        chunk = head[12:16]
+        if chunk == b"VP8 " and head[23:26] == b"\x9d\x01\x2a":
+            width, height = struct.unpack("<HH", head[26:30])
+            return ImageHeader("WEBP", width & 0x3FFF, height & 0x3FFF)
+        if chunk == b"VP8L" and head[20] == 0x2F:
+            bits = int.from_bytes(head[21:25], "little")
+            return ImageHeader("WEBP", (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1)
+        if chunk == b"VP8X":
+            width = int.from_bytes(head[24:27], "little") + 1
+            height = int.from_bytes(head[27:30], "little") + 1
+            return ImageHeader("WEBP", width, height, animated=bool(head[20] & 0x02))
+        return None
+    if head[:2] != b"\xff\xd8":
+        return None
+
+    # JPEG: walk the marker segments (skipping EXIF, ICC and friends) to the frame header.
+    stream.seek(2)
+    while True:
+        byte = stream.read(1)
+        if byte != b"\xff":
+            return None
+        marker = stream.read(1)
+        while marker == b"\xff":  # Fill bytes
+            marker = stream.read(1)
+        if not marker:
+            return None
+        code = marker[0]
+        if code == 0x01 or 0xD0 <= code <= 0xD7:  # Standalone markers carry no length
+            continue
+        if code in (0xD9, 0xDA):  # End of image / start of scan before any frame
+            return None
+        segment = stream.read(2)
+        if len(segment) < 2:
+            return None
+        length = struct.unpack(">H", segment)[0]
+        if code in JPEG_SOF_MARKERS:
+            frame = stream.read(6)
+            if len(frame) < 6:
+                return None
+            precision, height, width, components = struct.unpack(">BHHB", frame)
+            return ImageHeader("JPEG", width, height, precision, components)
+        stream.seek(length - 2, 1)
+
+
+# APP0 (JFIF), APP2 (ICC profile) and APP14 (Adobe colour transform) affect how pixels decode
+JPEG_KEPT_APP_MARKERS = frozenset({0xE0, 0xE2, 0xEE})
+
+
+def exif_orientation(exif: bytes) -> int:
+    """The Orientation tag from an APP1 "Exif" payload; 1 (upright) when absent or unreadable."""
+    import struct
+
+    tiff = exif[6:]
+    order = {b"II": "<", b"MM": ">"}.get(tiff[:2])
+    if order is None or len(tiff) < 8:
+        return 1
+    offset = struct.unpack(order + "I", tiff[4:8])[0]
+    if offset + 2 > len(tiff):
+        return 1
+    (count,) = struct.unpack(order + "H", tiff[offset : offset + 2])
+    for entry in range(offset + 2, min(offset + 2 + 12 * count, len(tiff) - 11), 12):
+        tag, _, _, value = struct.unpack(order + "HHIH", tiff[entry : entry + 10])
+        if tag == 0x0112:
+            return value
+    return 1
+
+
+def strip_jpeg_metadata(data: bytes) -> bytes | None:
+    """The JPEG without EXIF, XMP, IPTC and comment segments, so camera and GPS details stay local.
+
+    Returns None when the file needs re-encoding instead: it is not a JPEG we can
+    walk, or its EXIF orientation would be lost along with the metadata.
+    """
+    import struct
+
+    if data[:2] != b"\xff\xd8":
+        return None
+    kept = [data[:2]]
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            return None
+        code = data[pos + 1]
+        if code == 0xFF:  # Fill byte
+            pos += 1
+            continue
+        if code == 0xDA:  # Start of scan: everything from here on is image data
+            kept.append(data[pos:])
+            return b"".join(kept)
+        if code == 0x01 or 0xD0 <= code <= 0xD7:
+            kept.append(data[pos : pos + 2])
+            pos += 2
+            continue
+        end = pos + 2 + struct.unpack(">H", data[pos + 2 : pos + 4])[0]
+        segment = data[pos:end]
+        if code == 0xE1 and segment[4:10] == b"Exif\x00\x00" and exif_orientation(segment[4:]) != 1:
+            return None
+        if not ((0xE0 <= code <= 0xEF and code not in JPEG_KEPT_APP_MARKERS) or code == 0xFE):
+            kept.append(segment)
+        pos = end
+    return None
+
+
+def input_dimensions(paths: list[str]) -> list[tuple[int, int]]:
+    """(width, height) of each input from its header; Pillow is only needed for unusual formats."""
+    sizes = []
+    for img_path in paths:
+        try:
+            with open(img_path, "rb") as stream:
+                header = read_image_header(stream)
+            if header is None:
+                from PIL import Image as PILImage
+
+                with PILImage.open(img_path) as img:  # Lazy: reads the header, not the pixels
+                    header = ImageHeader(img.format or "", *img.size)
+        except Exception as e:
+            raise RuntimeError(f"Error loading input image '{img_path}': {e}") from e
+        sizes.append((header.width, header.height))
+    return sizes
+
+
+def max_input_dimension(paths: list[str]) -> int:
+    """Largest width or height across the inputs (0 for none); raises RuntimeError on unreadable files."""
+    return max((max(size) for size in input_dimensions(paths)), default=0)
+
+
+def prepare_input_image(path: str, max_edge: int, cache_dir: str | None = None) -> tuple[PreparedImage, str]:
+    """Encode one input for upload, no larger than `max_edge` on its longest side.
+
+    Returns the image and how it was obtained: "cached", "original" (uploaded
+    as-is) or "downscaled"/"converted" (decoded and re-encoded once).
+    """
+    from io import BytesIO
+
+    data = Path(path).read_bytes()
+    header = read_image_header(BytesIO(data))
+    if header is not None and header.uploadable and max(header.width, header.height) <= max_edge:
+        upload = strip_jpeg_metadata(data) if header.format == "JPEG" else data
+        if upload is not None:
+            # Nothing to gain from re-encoding, and nothing worth caching either.
+            return PreparedImage(upload, PASSTHROUGH_FORMATS[header.format], header.width, header.height), "original"
+
+    key = None
+    if cache_dir:
+        key = encoded_cache_key(data, os.stat(path).st_mtime_ns, max_edge)
+        cached = read_encoded_cache(cache_dir, key)
+        if cached is not None:
+            return cached, "cached"
+
+    # Only now, with work to do, pay for Pillow and a full decode.
+    from PIL import Image as PILImage
+    from PIL import ImageOps
+
+    with PILImage.open(BytesIO(data)) as img:
+        # Pass-through was decided from the header above; Pillow reports 16-bit RGB(A) PNGs
+        # as plain RGB/RGBA, so its mode cannot be trusted for that.
+        fits = max(img.size) <= max_edge
+        if img.format == "JPEG":
+            img.draft("RGB", (max_edge, max_edge))  # Let libjpeg do most of the downscale while decoding
+        has_alpha = img.mode in ("RGBA", "LA", "PA") or (img.mode == "P" and "transparency" in img.info)
+        # Re-encoding drops EXIF, so bake the camera orientation into the pixels first
+        frame = ImageOps.exif_transpose(img).convert("RGBA" if has_alpha else "RGB")
+        frame.thumbnail((max_edge, max_edge), PILImage.Resampling.LANCZOS)
+
+    buffer = BytesIO()
+    if has_alpha:
+        frame.save(buffer, "PNG")
+        mime_type = "image/png"
+    else:
+        frame.save(buffer, "JPEG", quality=95)
+        mime_type = "image/jpeg"
+    prepared = PreparedImage(buffer.getvalue(), mime_type, *frame.size)
+    if key:
+        write_encoded_cache(cache_dir, key, prepared)
+    return prepared, "converted" if fits else "downscaled"
+
+
+def prepare_input_images(
+    paths: list[str],
+    resolution: str,
+    log=print,
+    cache: PreparedImageCache | None = None,
+    cache_dir: str | None = None,
+) -> list[PreparedImage]:
+    """Prepare every input for `resolution` in parallel, in the order given."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    max_edge = MAX_INPUT_EDGE[resolution]
+
+    def prepare(img_path: str) -> tuple[PreparedImage, str]:
+        try:
+            key = cache.key(img_path, max_edge) if cache else None
+            prepared = cache.get(key) if cache else None
+            if prepared is not None:
+                return prepared, "cached"
+            prepared, how = prepare_input_image(img_path, max_edge, cache_dir)
+        except Exception as e:
+            raise RuntimeError(f"Error loading input image '{img_path}': {e}") from e
+        if cache:
+            cache.put(key, prepared)
+        return prepared, how
+
+    # Pillow releases the GIL while decoding, resizing and encoding.
+    with ThreadPoolExecutor(max_workers=max(1, min(len(paths), os.cpu_count() or 1))) as pool:
+        results = list(pool.map(prepare, paths))
+
+    for img_path, (prepared, how) in zip(paths, results):
+        detail = f" ({how} to {prepared.width}x{prepared.height})" if how in ("downscaled", "converted") else ""
+        log(f"Loaded input image: {img_path}{detail}")
+    return [prepared for prepared, _ in results]
+
+
+OUTPUT_FORMATS = {"png": "PNG", "jpeg": "JPEG", "webp": "WEBP"}
+OUTPUT_SUFFIXES = {".png": "PNG", ".jpg": "JPEG", ".jpeg": "JPEG", ".webp": "WEBP"}
+
+
+def output_format_for(output_path: Path, requested: str | None = None) -> str:
+    """Pillow format name for the output: `--format` if given, else the filename suffix, else PNG.
+
+    Raises ValueError when `--format` contradicts a known image extension, rather
+    than writing, say, JPEG bytes into a .png file.
+    """
+    from_suffix = OUTPUT_SUFFIXES.get(output_path.suffix.lower())
+    if requested:
+        if from_suffix not in (None, OUTPUT_FORMATS[requested]):
+            raise ValueError(f"--format {requested} does not match the extension of '{output_path.name}'")
+        return OUTPUT_FORMATS[requested]
+    return from_suffix or "PNG"
+
+
+def check_output_options(output_path: Path, requested: str | None, keep_alpha: bool, warn=print) -> str:
+    """Validate the output format up front (before any API call); warns when --keep-alpha cannot apply."""
+    image_format = output_format_for(output_path, requested)
+    if keep_alpha and image_format == "JPEG":
+        warn(f"Warning: JPEG cannot hold transparency; '{output_path.name}' will be flattened onto white despite --keep-alpha.")
+    return image_format
+
+
+def header_has_alpha(data: bytes, image_format: str) -> bool | None:
+    """Whether encoded PNG/JPEG/WebP bytes carry an alpha channel, from headers alone (None if unsure)."""
+    if image_format == "JPEG":
+        return False
+    if image_format == "PNG" and len(data) > 25:
+        color_type = data[25]
+        if color_type in (4, 6):  # Gray + alpha, RGBA
+            return True
+        if color_type in (0, 2, 3):  # Gray, RGB, palette (transparent if a tRNS chunk precedes the pixels)
+            return data.find(b"tRNS", 33, max(data.find(b"IDAT"), 33)) != -1
+        return None
+    if image_format == "WEBP" and len(data) > 24:
+        chunk = data[12:16]
+        if chunk == b"VP8 ":
+            return False
+        if chunk == b"VP8L":
+            return bool(int.from_bytes(data[21:25], "little") >> 28 & 1)
+        if chunk == b"VP8X":
+            return bool(data[20] & 0x10)
+    return None
+
+
+def save_output_image(data: bytes, output_path: Path, image_format: str, keep_alpha: bool = False) -> bool:
+    """Write the returned image in `image_format`; returns True when the bytes went to disk untouched.
+
+    Alpha is composited onto white unless `keep_alpha` is set and the format
+    can hold it. Pillow is only used when the bytes need converting.
+    """
+    from io import BytesIO
+
+    keep_alpha = keep_alpha and image_format != "JPEG"
+    header = read_image_header(BytesIO(data))
+    if header is not None and header.format == image_format:
+        if keep_alpha or header_has_alpha(data, image_format) is False:
+            output_path.write_bytes(data)
+            return True
+
+    from PIL import Image as PILImage
+
+    with PILImage.open(BytesIO(data)) as image:
+        has_alpha = image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info)
+        if has_alpha and keep_alpha:
+            converted = image.convert("RGBA")
+        elif has_alpha:
+            # Flatten onto white rather than letting transparent pixels turn black
+            rgba = image.convert("RGBA")
+            converted = PILImage.new("RGB", rgba.size, (255, 255, 255))
+            converted.paste(rgba, mask=rgba.getchannel("A"))
+        else:
+            converted = image.convert("RGB")
+    options = {"quality": 95} if image_format in ("JPEG", "WEBP") else {}
+    converted.save(str(output_path), image_format, **options)
+    return False
+
+
+def generate_image(
+    client,
+    prompt: str,
+    input_images: list[PreparedImage],
+    resolution: str,
+    output_path: Path,
+    log=print,
+    output_format: str | None = None,
+    keep_alpha: bool = False,
+) -> Path:
+    """Run one generate_content call and save the returned image; returns its full path.
+
+    The image is saved as `output_format` (png, jpeg or webp; by default
+    from the filename suffix, else PNG).
+    """
+    from google.genai import types
+
+    image_format = output_format_for(output_path, output_format)
+
+    # Build contents (images first if editing, prompt only if generating)
+    if input_images:
+        parts = [types.Part.from_bytes(data=image.data, mime_type=image.mime_type) for image in input_images]
+        contents = [*parts, prompt]
+        img_count = len(input_images)
+        log(f"Processing {img_count} image{'s' if img_count > 1 else ''} with resolution {resolution}...")
+    else:
+        contents = prompt
+        log(f"Generating image with resolution {resolution}...")
+
+    response = client.models.generate_content(
+        model=MODEL,
+        contents=contents,
+        config=types.GenerateContentConfig(
+            response_modalities=["TEXT", "IMAGE"],
+            image_config=types.ImageConfig(
+                image_size=resolution
+            )
+        )
+    )
+
+    image_saved = False
+    for part in response.parts:
+        if part.text is not None:
+            log(f"Model response: {part.text}")
+        elif part.inline_data is not None:
+            # inline_data.data is already bytes, not base64
+            image_data = part.inline_data.data
+            if isinstance(image_data, str):
+                # If it's a string, it might be base64
+                import base64
+                image_data = base64.b64decode(image_data)
+
+            if not save_output_image(image_data, output_path, image_format, keep_alpha):
+                log(f"Converted the returned image to {image_format}")
+            image_saved = True
+
+    if not image_saved:
+        raise RuntimeError("No image was generated in the response.")
+    return output_path.resolve()
+
+
+def run_single(
+    client,
+    prompt: str,
+    filename: str,
+    input_paths: list[str],
+    requested_resolution: str,
+    log=print,
+    cache: PreparedImageCache | None = None,
+    cache_dir: str | None = None,
+    output_format: str | None = None,
+    keep_alpha: bool = False,
+) -> Path:
+    """The single-image flow shared by the CLI and the worker; errors are RuntimeErrors ready to print."""
+    if len(input_paths) > MAX_INPUT_IMAGES:
+        raise RuntimeError(f"Error: Too many input images ({len(input_paths)}). Maximum is {MAX_INPUT_IMAGES}.")
+
+    # Set up output path
+    output_path = Path(filename)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    # Load input images if provided (up to 14 supported by Nano Banana Pro)
+    input_images = []
+    output_resolution = requested_resolution
+    if input_paths:
+        max_input_dim = max_input_dimension(input_paths)
+
+        # Auto-detect resolution from largest input if not explicitly set
+        output_resolution = auto_resolution(requested_resolution, max_input_dim)
+        if requested_resolution == "1K" and max_input_dim > 0:  # Default value
+            log(f"Auto-detected resolution: {output_resolution} (from max input dimension {max_input_dim})")
+
+        # Downscale to what the output needs and encode once, reusing earlier work
+        input_images = prepare_input_images(input_paths, output_resolution, log, cache, cache_dir)
+
+    try:
+        return generate_image(
+            client, prompt, input_images, output_resolution, output_path, log, output_format, keep_alpha
+        )
+    except Exception as e:
+        raise RuntimeError(f"Error generating image: {e}") from e
+
+
+# A single generate call can take minutes at 4K; past this the worker is presumed stuck.
+WORKER_READ_TIMEOUT = 600.0
+
+
+class WorkerUnavailable(Exception):
+    """No worker is listening on the socket; the caller should run in-process."""
+
+
+def default_socket_path() -> str:
+    base = os.environ.get("XDG_RUNTIME_DIR") or os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "openclaw", "nano-banana-pro.sock")
+
+
+def call_worker(
+    socket_path: str,
+    method: str,
+    params: dict,
+    on_log=print,
+    connect_timeout: float = 1.0,
+    read_timeout: float = WORKER_READ_TIMEOUT,
+):
+    """Send one request to a running worker, relaying its log lines; returns the result.
+
+    Raises WorkerUnavailable when nothing is listening, RuntimeError when the
+    worker reports an error or sends nothing for `read_timeout` seconds.
+    """
+    import socket
+
+    if not hasattr(socket, "AF_UNIX"):
+        raise WorkerUnavailable("Unix sockets are not supported on this platform")
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(connect_timeout)
+    try:
+        sock.connect(socket_path)
+    except (FileNotFoundError, ConnectionRefusedError, socket.timeout) as e:
+        sock.close()
+        raise WorkerUnavailable(str(e)) from e
+    sock.settimeout(read_timeout)
+    with sock, sock.makefile("rwb") as stream:
+        stream.write(json.dumps({"method": method, "params": params}).encode("utf-8") + b"\n")
+        stream.flush()
+        try:
+            for line in stream:
+                message = json.loads(line)
+                if "log" in message:
+                    on_log(message["log"])
+                elif "error" in message:
+                    raise RuntimeError(message["error"])
+                elif "result" in message:
+                    return message["result"]
+        except TimeoutError as e:
+            raise RuntimeError(f"Error: The worker on {socket_path} sent nothing for {read_timeout:g}s; giving up.") from e
+    raise RuntimeError("Worker closed the connection without a result")
+
+
+def serve_worker(socket_path: str, handler, idle_timeout: float = 1800.0, ready=None) -> None:
+    """Serve newline-delimited JSON requests on a Unix socket until shut down or idle.
+
+    `handler(method, params, log)` returns a JSON-able result; `log` streams a
+    progress line back to the client. Built-in methods: `ping`, `shutdown`.
+    """
+    import socketserver
+    import time
+
+    path = Path(socket_path)
+    path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    if path.exists():
+        try:
+            call_worker(str(path), "ping", {}, read_timeout=5.0)
+        except (WorkerUnavailable, RuntimeError, OSError, ValueError):
+            path.unlink()
+        else:
+            raise RuntimeError(f"A worker is already listening on {path}")
+
+    lock = threading.Lock()
+    state = {"active": 0, "last": time.monotonic()}
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            with lock:
+                state["active"] += 1
+            try:
+                self.serve_one()
+            finally:
+                with lock:
+                    state["active"] -= 1
+                    state["last"] = time.monotonic()
+
+        def reply(self, message: dict) -> None:
+            self.wfile.write(json.dumps(message).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+        def serve_one(self):
+            try:
+                request = json.loads(self.rfile.readline())
+                method = request["method"]
+                params = request.get("params") or {}
+            except (ValueError, KeyError, TypeError) as e:
+                self.reply({"error": f"Bad request: {e}"})
+                return
+            if method == "ping":
+                self.reply({"result": {"pid": os.getpid()}})
+                return
+            if method == "shutdown":
+                self.reply({"result": "stopping"})
+                threading.Thread(target=server.shutdown, daemon=True).start()
+                return
+            try:
+                result = handler(method, params, lambda message: self.reply({"log": str(message)}))
+            except Exception as e:
+                self.reply({"error": str(e)})
+            else:
+                self.reply({"result": result})
+
+    class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+    # Owner-only socket: requests can carry API keys and arbitrary file paths.
+    old_umask = os.umask(0o177)
+    try:
+        server = Server(str(path), Handler)
+    finally:
+        os.umask(old_umask)
+
+    stopped = threading.Event()
+
+    def watch_idle():
+        while not stopped.wait(min(idle_timeout, 5.0)):
+            with lock:
+                idle = state["active"] == 0 and time.monotonic() - state["last"] >= idle_timeout
+            if idle:
+                server.shutdown()
+                return
+
+    if idle_timeout > 0:
+        threading.Thread(target=watch_idle, daemon=True).start()
+    if ready is not None:
+        ready()
+    try:
+        server.serve_forever(poll_interval=0.2)
+    finally:
+        stopped.set()
+        server.server_close()
+        path.unlink(missing_ok=True)
+
+
+def make_worker_handler(cache_dir: str | None = None):
+    """Build the worker's request handler, importing the SDK and Pillow once up front.
+
+    Every request must carry the caller's API key; the worker has none of its own.
+    """
+    import importlib
+
+    from google import genai
+
+    # Warm the module cache only: generate_image and prepare_input_image import
+    # these themselves, so this moves their cost to startup, off the first request.
+    for module in ("google.genai.types", "PIL.Image", "PIL.ImageOps"):
+        importlib.import_module(module)
+
+    clients = {}
+    lock = threading.Lock()
+    cache = PreparedImageCache()
+
+    def handler(method: str, params: dict, log):
+        if method != "generate":
+            raise RuntimeError(f"Unknown method: {method}")
+        api_key = params.get("api_key")
+        if not api_key:
+            raise RuntimeError("Error: No API key provided.")
+        with lock:
+            client = clients.get(api_key)
+            if client is None:
+                client = clients[api_key] = genai.Client(api_key=api_key)
+        full_path = run_single(
+            client,
+            params["prompt"],
+            params["filename"],
+            params.get("input_images") or [],
+            params.get("resolution") or "1K",
+            log,
+            cache,
+            None if params.get("no_input_cache") else cache_dir,
+            params.get("format"),
+            bool(params.get("keep_alpha")),
+        )
+        return str(full_path)
+
+    return handler
+
+
+def load_batch(path: str) -> list[dict]:
+    """Parse and validate a JSONL batch manifest before any API call is made.
+
+    Each line is an object with `prompt` and `filename`, plus optional
+    `input_images` (list of paths) and `resolution`. Relative paths are
+    resolved against the manifest's directory. Blank lines and lines starting
+    with `#` are skipped. Two jobs may not write the same file, and no job may
+    read another job's output, since jobs run concurrently.
+    """
+    manifest = Path(path)
+    base = manifest.parent
+    try:
+        lines = manifest.read_text(encoding="utf-8").splitlines()
+    except OSError as e:
+        raise ValueError(f"Cannot read batch manifest '{path}': {e}") from e
+
+    jobs = []
+    outputs: dict[str, int] = {}
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        where = f"{path}:{number}"
+        try:
+            entry = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"{where}: invalid JSON ({e.msg})") from e
+        if not isinstance(entry, dict):
+            raise ValueError(f"{where}: expected a JSON object")
+        prompt = entry.get("prompt")
+        filename = entry.get("filename")
+        if not isinstance(prompt, str) or not prompt.strip():
+            raise ValueError(f"{where}: missing \"prompt\"")
+        if not isinstance(filename, str) or not filename.strip():
+            raise ValueError(f"{where}: missing \"filename\"")
+        inputs = entry.get("input_images") or []
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        if not isinstance(inputs, list) or not all(isinstance(item, str) for item in inputs):
+            raise ValueError(f"{where}: \"input_images\" must be a list of paths")
+        if len(inputs) > MAX_INPUT_IMAGES:
+            raise ValueError(f"{where}: too many input images ({len(inputs)}). Maximum is {MAX_INPUT_IMAGES}.")
+        resolution = entry.get("resolution")
+        if resolution is not None and resolution not in RESOLUTIONS:
+            raise ValueError(f"{where}: resolution must be one of {', '.join(RESOLUTIONS)}")
+        output = str(base / filename)
+        resolved = os.path.realpath(output)
+        if resolved in outputs:
+            raise ValueError(f"{where}: \"filename\" is already written by line {outputs[resolved]}")
+        outputs[resolved] = number
+        jobs.append(
+            {
+                "line": number,
+                "prompt": prompt,
+                "filename": output,
+                "input_images": [str(base / item) for item in inputs],
+                "resolution": resolution,
+            }
+        )
+    if not jobs:
+        raise ValueError(f"{path}: no jobs found")
+    for job in jobs:
+        for item in job["input_images"]:
+            producer = outputs.get(os.path.realpath(item))
+            if producer is not None:
+                raise ValueError(
+                    f"{path}:{job['line']}: input image '{item}' is the output of line {producer}; "
+                    "batch jobs run concurrently, so chain them in separate batches"
+                )
+    return jobs
+
+
+def run_batch(
+    client,
+    jobs: list[dict],
+    default_resolution: str,
+    concurrency: int,
+    cache_dir: str | None = None,
+    output_format: str | None = None,
+    keep_alpha: bool = False,
+) -> int:
+    """Run batch jobs on a shared client; prints a MEDIA line per image as it lands.
+
+    Returns the number of failed jobs.
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    lock = threading.Lock()
+    total = len(jobs)
+    cache = PreparedImageCache()
+
+    def run_job(position: int, job: dict) -> Path:
+        def log(message: str) -> None:
+            with lock:
+                print(f"[{position}/{total}] {message}", flush=True)
+
+        output_path = Path(job["filename"])
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        resolution = job["resolution"]
+        images = []
+        if job["input_images"]:
+            if not resolution:
+                max_input_dim = job.get("max_input_dim")
+                if max_input_dim is None:
+                    max_input_dim = max_input_dimension(job["input_images"])
+                resolution = auto_resolution(default_resolution, max_input_dim)
+            # Jobs often share sources; the cache lets each be prepared once per resolution.
+            images = prepare_input_images(job["input_images"], resolution, log, cache, cache_dir)
+        return generate_image(
+            client, job["prompt"], images, resolution or default_resolution, output_path, log, output_format, keep_alpha
+        )
+
+    failures = 0
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, total))) as pool:
+        futures = {pool.submit(run_job, position, job): (position, job) for position, job in enumerate(jobs, start=1)}
+        for future in as_completed(futures):
+            position, job = futures[future]
+            try:
+                full_path = future.result()
+            except Exception as e:
+                failures += 1
+                with lock:
+                    print(f"[{position}/{total}] Error (line {job['line']}): {e}", file=sys.stderr, flush=True)
+                continue
+            with lock:
+                print(f"[{position}/{total}] Image saved: {full_path}")
+                # OpenClaw parses MEDIA tokens and will attach the file on supported providers.
+                print(f"MEDIA: {full_path}", flush=True)
+    return failures
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Generate images using Nano Banana Pro (Gemini 3 Pro Image)"
     )
     parser.add_argument(
         "--prompt", "-p",
-        required=True,
         help="Image description/prompt"
     )
     parser.add_argument(
         "--filename", "-f",
-        required=True,
         help="Output filename (e.g., sunset-mountains.png)"
     )
     parser.add_argument(
@@ -52,18 +971,133 @@ def main():
     )
     parser.add_argument(
         "--resolution", "-r",
-        choices=["1K", "2K", "4K"],
+        choices=list(RESOLUTIONS),
         default="1K",
         help="Output resolution: 1K (default), 2K, or 4K"
     )
+    parser.add_argument(
+        "--format",
+        choices=list(OUTPUT_FORMATS),
+        help="Output format: png, jpeg or webp (default: from the filename extension, else png)"
+    )
+    parser.add_argument(
+        "--keep-alpha",
+        action="store_true",
+        help="Keep transparency in png/webp output instead of flattening it onto white"
+    )
     parser.add_argument(
         "--api-key", "-k",
         help="Gemini API key (overrides GEMINI_API_KEY env var)"
     )
+    parser.add_argument(
+        "--batch", "-b",
+        metavar="MANIFEST",
+        help="JSONL file of jobs ({\"prompt\", \"filename\", \"input_images\", \"resolution\"} per line) run on one client"
+    )
+    parser.add_argument(
+        "--concurrency", "-c",
+        type=int,
+        default=4,
+        help="Batch jobs in flight at once (default: 4)"
+    )
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="Run a long-lived worker that keeps the client, SDK and prepared inputs warm"
+    )
+    parser.add_argument(
+        "--stop-worker",
+        action="store_true",
+        help="Ask a running worker to exit"
+    )
+    parser.add_argument(
+        "--socket",
+        default=default_socket_path(),
+        help="Worker socket path (default: $XDG_RUNTIME_DIR/openclaw/nano-banana-pro.sock)"
+    )
+    parser.add_argument(
+        "--idle-timeout",
+        type=float,
+        default=1800,
+        help="Seconds a worker waits without requests before exiting; 0 keeps it forever (default: 1800)"
+    )
+    parser.add_argument(
+        "--no-worker",
+        action="store_true",
+        help="Always run in this process, even if a worker is listening"
+    )
+    parser.add_argument(
+        "--no-input-cache",
+        action="store_true",
+        help="Do not reuse or store downscaled input images (default cache: $XDG_CACHE_HOME/openclaw/nano-banana-pro/inputs)"
+    )
 
     args = parser.parse_args()
+    cache_dir = None if args.no_input_cache else default_input_cache_dir()
+
+    def warn(message: str) -> None:
+        print(message, file=sys.stderr)
 
-    # Get API key
+    if args.serve:
+        handler = make_worker_handler(cache_dir)
+        try:
+            serve_worker(
+                args.socket,
+                handler,
+                args.idle_timeout,
+                ready=lambda: print(f"Worker listening on {args.socket}", flush=True),
+            )
+        except RuntimeError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+        return
+
+    if args.stop_worker:
+        try:
+            call_worker(args.socket, "shutdown", {}, read_timeout=10.0)
+        except WorkerUnavailable:
+            print(f"No worker listening on {args.socket}")
+            return
+        print(f"Stopped worker on {args.socket}")
+        return
+
+    jobs = None
+    if args.batch:
+        if args.prompt or args.filename or args.input_images:
+            parser.error("--batch takes prompts, filenames and input images from the manifest")
+        if args.concurrency < 1:
+            parser.error("--concurrency must be >= 1")
+        try:
+            jobs = load_batch(args.batch)
+            # Header reads only: a missing or unreadable input fails the batch before any API call
+            for job in jobs:
+                try:
+                    check_output_options(Path(job["filename"]), args.format, args.keep_alpha, warn)
+                    job["max_input_dim"] = max_input_dimension(job["input_images"])
+                except (RuntimeError, ValueError) as e:
+                    raise ValueError(f"{args.batch}:{job['line']}: {e}") from e
+        except ValueError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+    elif not args.prompt or not args.filename:
+        parser.error("--prompt and --filename are required (or use --batch)")
+    else:
+        input_paths = args.input_images or []
+        if len(input_paths) > MAX_INPUT_IMAGES:
+            print(f"Error: Too many input images ({len(input_paths)}). Maximum is {MAX_INPUT_IMAGES}.", file=sys.stderr)
+            sys.exit(1)
+        try:
+            # Fail fast on bad inputs, before a worker round trip or the SDK import
+            check_output_options(Path(args.filename), args.format, args.keep_alpha, warn)
+            max_input_dimension(input_paths)
+        except ValueError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+        except RuntimeError as e:
+            print(e, file=sys.stderr)
+            sys.exit(1)
+
+    # Get API key (before any worker hand-off: the worker uses the caller's key)
     api_key = get_api_key(args.api_key)
     if not api_key:
         print("Error: No API key provided.", file=sys.stderr)
@@ -72,114 +1106,66 @@ def main():
         print("  2. Set GEMINI_API_KEY environment variable", file=sys.stderr)
         sys.exit(1)
 
+    if jobs is None and not args.no_worker:
+        # A running worker already has the SDK imported and a client set up;
+        # hand it the job (with absolute paths, since its cwd differs).
+        params = {
+            "prompt": args.prompt,
+            "filename": os.path.abspath(args.filename),
+            "input_images": [os.path.abspath(path) for path in args.input_images or []],
+            "resolution": args.resolution,
+            "api_key": api_key,
+            "no_input_cache": args.no_input_cache,
+            "format": args.format,
+            "keep_alpha": args.keep_alpha,
+        }
+        try:
+            full_path = call_worker(args.socket, "generate", params)
+        except WorkerUnavailable:
+            pass
+        except (RuntimeError, OSError, ValueError) as e:
+            print(e, file=sys.stderr)
+            sys.exit(1)
+        else:
+            print(f"\nImage saved: {full_path}")
+            # OpenClaw parses MEDIA tokens and will attach the file on supported providers.
+            print(f"MEDIA: {full_path}")
+            return
+
     # Import here after checking API key to avoid slow import on error
     from google import genai
-    from google.genai import types
-    from PIL import Image as PILImage
 
     # Initialise client
     client = genai.Client(api_key=api_key)
 
-    # Set up output path
-    output_path = Path(args.filename)
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-
-    # Load input images if provided (up to 14 supported by Nano Banana Pro)
-    input_images = []
-    output_resolution = args.resolution
-    if args.input_images:
-        if len(args.input_images) > 14:
-            print(f"Error: Too many input images ({len(args.input_images)}). Maximum is 14.", file=sys.stderr)
+    if jobs is not None:
+        failures = run_batch(
+            client, jobs, args.resolution, args.concurrency, cache_dir, args.format, args.keep_alpha
+        )
+        if failures:
+            print(f"\n{failures} of {len(jobs)} job(s) failed.", file=sys.stderr)
             sys.exit(1)
-
-        max_input_dim = 0
-        for img_path in args.input_images:
-            try:
-                with PILImage.open(img_path) as img:
-                    copied = img.copy()
-                    width, height = copied.size
-                input_images.append(copied)
-                print(f"Loaded input image: {img_path}")
-
-                # Track largest dimension for auto-resolution
-                max_input_dim = max(max_input_dim, width, height)
-            except Exception as e:
-                print(f"Error loading input image '{img_path}': {e}", file=sys.stderr)
-                sys.exit(1)
-
-        # Auto-detect resolution from largest input if not explicitly set
-        if args.resolution == "1K" and max_input_dim > 0:  # Default value
-            if max_input_dim >= 3000:
-                output_resolution = "4K"
-            elif max_input_dim >= 1500:
-                output_resolution = "2K"
-            else:
-                output_resolution = "1K"
-            print(f"Auto-detected resolution: {output_resolution} (from max input dimension {max_input_dim})")
-
-    # Build contents (images first if editing, prompt only if generating)
-    if input_images:
-        contents = [*input_images, args.prompt]
-        img_count = len(input_images)
-        print(f"Processing {img_count} image{'s' if img_count > 1 else ''} with resolution {output_resolution}...")
-    else:
-        contents = args.prompt
-        print(f"Generating image with resolution {output_resolution}...")
+        return
 
     try:
-        response = client.models.generate_content(
-            model="gemini-3-pro-image-preview",
-            contents=contents,
-            config=types.GenerateContentConfig(
-                response_modalities=["TEXT", "IMAGE"],
-                image_config=types.ImageConfig(
-                    image_size=output_resolution
-                )
-            )
+        full_path = run_single(
+            client,
+            args.prompt,
+            args.filename,
+            args.input_images or [],
+            args.resolution,
+            cache_dir=cache_dir,
+            output_format=args.format,
+            keep_alpha=args.keep_alpha,
         )
-
-        # Process response and convert to PNG
-        image_saved = False
-        for part in response.parts:
-            if part.text is not None:
-                print(f"Model response: {part.text}")
-            elif part.inline_data is not None:
-                # Convert inline data to PIL Image and save as PNG
-                from io import BytesIO
-
-                # inline_data.data is already bytes, not base64
-                image_data = part.inline_data.data
-                if isinstance(image_data, str):
-                    # If it's a string, it might be base64
-                    import base64
-                    image_data = base64.b64decode(image_data)
-
-                image = PILImage.open(BytesIO(image_data))
-
-                # Ensure RGB mode for PNG (convert RGBA to RGB with white background if needed)
-                if image.mode == 'RGBA':
-                    rgb_image = PILImage.new('RGB', image.size, (255, 255, 255))
-                    rgb_image.paste(image, mask=image.split()[3])
-                    rgb_image.save(str(output_path), 'PNG')
-                elif image.mode == 'RGB':
-                    image.save(str(output_path), 'PNG')
-                else:
-                    image.convert('RGB').save(str(output_path), 'PNG')
-                image_saved = True
-
-        if image_saved:
-            full_path = output_path.resolve()
-            print(f"\nImage saved: {full_path}")
-            # OpenClaw parses MEDIA tokens and will attach the file on supported providers.
-            print(f"MEDIA: {full_path}")
-        else:
-            print("Error: No image was generated in the response.", file=sys.stderr)
-            sys.exit(1)
-
-    except Exception as e:
-        print(f"Error generating image: {e}", file=sys.stderr)
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
         sys.exit(1)
 
+    print(f"\nImage saved: {full_path}")
+    # OpenClaw parses MEDIA tokens and will attach the file on supported providers.
+    print(f"MEDIA: {full_path}")
+
 
 if __name__ == "__main__":
     main()
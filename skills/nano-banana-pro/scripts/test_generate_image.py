@@ -0,0 +1,476 @@
+"""Tests for generate_image.py helpers that run without google-genai or Pillow."""
+
+import io
+import json
+import os
+import struct
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+import generate_image
+import pytest
+from generate_image import (
+    ImageHeader,
+    PreparedImage,
+    PreparedImageCache,
+    WorkerUnavailable,
+    auto_resolution,
+    call_worker,
+    check_output_options,
+    encoded_cache_key,
+    header_has_alpha,
+    load_batch,
+    max_input_dimension,
+    output_format_for,
+    prepare_input_image,
+    read_encoded_cache,
+    read_image_header,
+    save_output_image,
+    serve_worker,
+    strip_jpeg_metadata,
+    write_encoded_cache,
+)
+
+
+def write_manifest(tmpdir: str, lines: list) -> str:
+    path = Path(tmpdir) / "jobs.jsonl"
+    path.write_text("\n".join(line if isinstance(line, str) else json.dumps(line) for line in lines))
+    return str(path)
+
+
+def test_auto_resolution_only_overrides_default():
+    assert auto_resolution("1K", 0) == "1K"
+    assert auto_resolution("1K", 1499) == "1K"
+    assert auto_resolution("1K", 1500) == "2K"
+    assert auto_resolution("1K", 4096) == "4K"
+    assert auto_resolution("2K", 4096) == "2K"
+
+
+def test_load_batch_resolves_paths_against_manifest():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = write_manifest(
+            tmpdir,
+            [
+                "# comment",
+                {"prompt": "a fox", "filename": "out/fox.png"},
+                "",
+                {"prompt": "edit", "filename": "/abs/edit.png", "input_images": "in.png", "resolution": "2K"},
+            ],
+        )
+        jobs = load_batch(path)
+    assert [job["line"] for job in jobs] == [2, 4]
+    assert jobs[0]["filename"] == str(Path(tmpdir) / "out/fox.png")
+    assert jobs[0]["input_images"] == [] and jobs[0]["resolution"] is None
+    assert jobs[1]["filename"] == "/abs/edit.png"
+    assert jobs[1]["input_images"] == [str(Path(tmpdir) / "in.png")]
+    assert jobs[1]["resolution"] == "2K"
+
+
+@pytest.mark.parametrize(
+    "line, message",
+    [
+        ("{not json", "invalid JSON"),
+        ('["a"]', "expected a JSON object"),
+        ({"filename": "x.png"}, 'missing "prompt"'),
+        ({"prompt": "x"}, 'missing "filename"'),
+        ({"prompt": "x", "filename": "x.png", "input_images": [1]}, "list of paths"),
+        ({"prompt": "x", "filename": "x.png", "input_images": ["i.png"] * 15}, "too many input images"),
+        ({"prompt": "x", "filename": "x.png", "resolution": "8K"}, "resolution must be one of"),
+    ],
+)
+def test_load_batch_reports_bad_lines(line, message):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = write_manifest(tmpdir, [{"prompt": "ok", "filename": "ok.png"}, line])
+        with pytest.raises(ValueError, match=message) as excinfo:
+            load_batch(path)
+    assert f"{path}:2" in str(excinfo.value)
+
+
+def test_load_batch_rejects_clashing_outputs():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = write_manifest(
+            tmpdir,
+            [{"prompt": "a", "filename": "out/a.png"}, {"prompt": "b", "filename": "out/../out/a.png"}],
+        )
+        with pytest.raises(ValueError, match=r"jobs.jsonl:2: .*already written by line 1"):
+            load_batch(path)
+
+        path = write_manifest(
+            tmpdir,
+            [{"prompt": "edit", "filename": "b.png", "input_images": ["a.png"]}, {"prompt": "a", "filename": "a.png"}],
+        )
+        with pytest.raises(ValueError, match=r"jobs.jsonl:1: input image .*a.png' is the output of line 2"):
+            load_batch(path)
+
+
+def test_load_batch_rejects_empty_manifest():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with pytest.raises(ValueError, match="no jobs"):
+            load_batch(write_manifest(tmpdir, ["# nothing here"]))
+
+
+def start_worker(socket_path: str, handler, idle_timeout: float = 0) -> threading.Thread:
+    ready = threading.Event()
+    thread = threading.Thread(
+        target=serve_worker, args=(socket_path, handler, idle_timeout, ready.set), daemon=True
+    )
+    thread.start()
+    assert ready.wait(5)
+    return thread
+
+
+def test_worker_round_trip_relays_logs_results_and_errors():
+    calls = []
+
+    def handler(method, params, log):
+        calls.append((method, params))
+        if params.get("fail"):
+            raise RuntimeError("Error generating image: boom")
+        log("Generating image with resolution 1K...")
+        return params["filename"]
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        socket_path = os.path.join(tmpdir, "w.sock")
+        thread = start_worker(socket_path, handler)
+        assert os.stat(socket_path).st_mode & 0o777 == 0o600
+
+        logs = []
+        assert call_worker(socket_path, "generate", {"filename": "/tmp/x.png"}, logs.append) == "/tmp/x.png"
+        assert logs == ["Generating image with resolution 1K..."]
+        with pytest.raises(RuntimeError, match="boom"):
+            call_worker(socket_path, "generate", {"fail": True})
+        assert call_worker(socket_path, "ping", {})["pid"] == os.getpid()
+
+        assert call_worker(socket_path, "shutdown", {}) == "stopping"
+        thread.join(5)
+        assert not thread.is_alive()
+        assert not os.path.exists(socket_path)
+        with pytest.raises(WorkerUnavailable):
+            call_worker(socket_path, "ping", {})
+    assert [method for method, _ in calls] == ["generate", "generate"]
+
+
+def test_call_worker_gives_up_on_a_silent_worker():
+    release = threading.Event()
+
+    def handler(method, params, log):
+        release.wait(5)
+        return "late"
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        socket_path = os.path.join(tmpdir, "w.sock")
+        thread = start_worker(socket_path, handler)
+        try:
+            with pytest.raises(RuntimeError, match="sent nothing for 0.2s"):
+                call_worker(socket_path, "generate", {}, read_timeout=0.2)
+        finally:
+            release.set()
+            call_worker(socket_path, "shutdown", {})
+            thread.join(5)
+
+
+def test_main_requires_an_api_key_before_using_the_worker(monkeypatch, capsys):
+    calls = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        socket_path = os.path.join(tmpdir, "w.sock")
+        thread = start_worker(socket_path, lambda method, params, log: calls.append(params))
+        monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+        argv = ["generate_image.py", "-p", "x", "-f", os.path.join(tmpdir, "o.png"), "--socket", socket_path]
+        monkeypatch.setattr(sys, "argv", argv)
+        with pytest.raises(SystemExit) as excinfo:
+            generate_image.main()
+        call_worker(socket_path, "shutdown", {})
+        thread.join(5)
+    assert excinfo.value.code == 1
+    assert "No API key provided" in capsys.readouterr().err
+    assert calls == []
+
+
+def test_worker_replaces_stale_socket_and_exits_when_idle():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        socket_path = os.path.join(tmpdir, "w.sock")
+        Path(socket_path).write_text("stale")
+        thread = start_worker(socket_path, lambda method, params, log: None, idle_timeout=0.2)
+        assert call_worker(socket_path, "ping", {})
+        with pytest.raises(RuntimeError, match="already listening"):
+            serve_worker(socket_path, lambda method, params, log: None)
+        thread.join(5)
+        assert not thread.is_alive()
+        assert not os.path.exists(socket_path)
+
+
+def test_prepared_image_cache_is_bounded_by_bytes():
+    def image(size: int) -> PreparedImage:
+        return PreparedImage(b"x" * size, "image/png", 1, 1)
+
+    cache = PreparedImageCache(max_bytes=250)
+    cache.put(("a",), image(100))
+    cache.put(("b",), image(100))
+    assert cache.get(("a",)).data == b"x" * 100
+    cache.put(("c",), image(100))
+    assert cache.get(("b",)) is None
+    assert cache.get(("a",)) and cache.get(("c",))
+    assert cache.size == 200
+    cache.put(("a",), image(50))
+    assert cache.size == 150
+    cache.put(("huge",), image(251))
+    assert cache.get(("huge",)) is None and cache.size == 150
+    with tempfile.NamedTemporaryFile() as handle:
+        key = PreparedImageCache.key(handle.name, 1024)
+        assert PreparedImageCache.key(handle.name, 2048) != key
+        handle.write(b"changed")
+        handle.flush()
+        assert PreparedImageCache.key(handle.name, 1024) != key
+
+
+def test_encoded_cache_round_trip_and_pruning():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        key = encoded_cache_key(b"source", 1, 1024)
+        assert key != encoded_cache_key(b"source", 2, 1024) != encoded_cache_key(b"source", 1, 2048)
+        assert key.startswith(f"v{generate_image.ENCODED_CACHE_VERSION}-")
+        assert read_encoded_cache(tmpdir, key) is None
+
+        image = PreparedImage(b"x" * 100, "image/jpeg", 1024, 768)
+        write_encoded_cache(tmpdir, key, image)
+        assert read_encoded_cache(tmpdir, key) == image
+
+        older = os.path.join(tmpdir, next(name for name in os.listdir(tmpdir)))
+        os.utime(older, (1, 1))
+        other = encoded_cache_key(b"other", 1, 1024)
+        write_encoded_cache(tmpdir, other, PreparedImage(b"y" * 100, "image/png", 10, 10), max_bytes=150)
+        assert read_encoded_cache(tmpdir, key) is None
+        assert read_encoded_cache(tmpdir, other).mime_type == "image/png"
+
+
+def test_prepare_input_image_downscales_once_and_passes_small_inputs_through():
+    PILImage = pytest.importorskip("PIL.Image")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        big = os.path.join(tmpdir, "big.png")
+        PILImage.new("RGB", (3000, 1500), (200, 10, 10)).save(big)
+        cache_dir = os.path.join(tmpdir, "cache")
+
+        prepared, how = prepare_input_image(big, 1024, cache_dir)
+        assert how == "downscaled"
+        assert (prepared.mime_type, prepared.width, prepared.height) == ("image/jpeg", 1024, 512)
+        assert prepared == prepare_input_image(big, 1024, cache_dir)[0]
+        assert prepare_input_image(big, 1024, cache_dir)[1] == "cached"
+        assert prepare_input_image(big, 4096)[1] == "original"
+
+        alpha = os.path.join(tmpdir, "alpha.webp")
+        PILImage.new("RGBA", (2048, 2048)).save(alpha)
+        prepared, how = prepare_input_image(alpha, 1024)
+        assert (how, prepared.mime_type, prepared.width) == ("downscaled", "image/png", 1024)
+
+
+def test_prepare_input_image_applies_exif_orientation():
+    PILImage = pytest.importorskip("PIL.Image")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        photo = os.path.join(tmpdir, "photo.jpg")
+        exif = PILImage.Exif()
+        exif[0x0112] = 6  # Rotated 90 degrees clockwise
+        PILImage.new("RGB", (3000, 2000)).save(photo, exif=exif)
+        prepared, how = prepare_input_image(photo, 1024)
+        assert (how, prepared.width, prepared.height) == ("downscaled", 683, 1024)
+
+
+def jpeg_bytes(width: int, height: int, components: int = 3) -> bytes:
+    app1 = b"Exif\x00\x00" + b"\x00" * 2000  # A large metadata segment before the frame
+    return (
+        b"\xff\xd8"
+        + b"\xff\xe1" + struct.pack(">H", len(app1) + 2) + app1
+        + b"\xff\xff\xc2" + struct.pack(">HBHHB", 8 + 3 * components, 8, height, width, components)
+        + b"\x00" * 3 * components
+        + b"\xff\xda"
+    )
+
+
+@pytest.mark.parametrize(
+    "data, expected",
+    [
+        (b"\x89PNG\r\n\x1a\n\x00\x00\x00\x0dIHDR" + struct.pack(">II", 4000, 3000) + b"\x08\x06\x00\x00\x00", ImageHeader("PNG", 4000, 3000, 8, 6)),
+        (jpeg_bytes(1920, 1080), ImageHeader("JPEG", 1920, 1080, 8, 3)),
+        (jpeg_bytes(1920, 1080, components=4), ImageHeader("JPEG", 1920, 1080, 8, 4)),
+        (b"GIF89a" + struct.pack("<HH", 320, 200) + b"\x00" * 20, ImageHeader("GIF", 320, 200)),
+        (b"RIFF\x00\x00\x00\x00WEBPVP8 \x00\x00\x00\x00\x00\x00\x00\x9d\x01\x2a" + struct.pack("<HH", 1024, 768), ImageHeader("WEBP", 1024, 768)),
+        (b"RIFF\x00\x00\x00\x00WEBPVP8L\x00\x00\x00\x00\x2f" + (2047 | 1535 << 14).to_bytes(4, "little") + b"\x00" * 8, ImageHeader("WEBP", 2048, 1536)),
+        (b"RIFF\x00\x00\x00\x00WEBPVP8X\x00\x00\x00\x00\x00\x00\x00\x00" + (4095).to_bytes(3, "little") + (99).to_bytes(3, "little"), ImageHeader("WEBP", 4096, 100)),
+        (b"RIFF\x00\x00\x00\x00WEBPVP8X\x00\x00\x00\x00\x02\x00\x00\x00" + (99).to_bytes(3, "little") + (99).to_bytes(3, "little"), ImageHeader("WEBP", 100, 100, animated=True)),
+        (b"\xff\xd8\xff\xe0\x00", None),
+        (b"BM not an image we parse", None),
+        (b"", None),
+    ],
+)
+def test_read_image_header(data, expected):
+    assert read_image_header(io.BytesIO(data)) == expected
+
+
+def exif_segment(orientation: int) -> bytes:
+    ifd = struct.pack("<H", 2) + struct.pack("<HHIHH", 0x010F, 2, 4, 0, 0) + struct.pack("<HHIHH", 0x0112, 3, 1, orientation, 0)
+    payload = b"Exif\x00\x00" + b"II*\x00" + struct.pack("<I", 8) + ifd + b"\x00" * 4
+    return b"\xff\xe1" + struct.pack(">H", len(payload) + 2) + payload
+
+
+def test_strip_jpeg_metadata_keeps_decoding_segments_only():
+    icc = b"\xff\xe2" + struct.pack(">H", 16) + b"ICC_PROFILE\x00\x01\x01"
+    comment = b"\xff\xfe" + struct.pack(">H", 7) + b"hello"
+    photo = jpeg_bytes(10, 10)
+    data = photo[:2] + exif_segment(1) + icc + comment + photo[2:] + b"scan data"
+    stripped = strip_jpeg_metadata(data)
+    assert b"Exif" not in stripped and b"hello" not in stripped
+    assert icc in stripped and stripped.endswith(b"\xff\xdascan data")
+    assert read_image_header(io.BytesIO(stripped)) == read_image_header(io.BytesIO(data))
+
+    # Dropping a rotation would upload the photo sideways, so those get re-encoded instead.
+    assert strip_jpeg_metadata(photo[:2] + exif_segment(6) + photo[2:]) is None
+    assert strip_jpeg_metadata(b"\x89PNG\r\n\x1a\n") is None
+
+
+def test_prepare_input_image_strips_exif_from_passthrough_jpegs():
+    PILImage = pytest.importorskip("PIL.Image")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        photo = os.path.join(tmpdir, "photo.jpg")
+        exif = PILImage.Exif()
+        exif[0x010F] = "Camera maker"
+        PILImage.new("RGB", (300, 200)).save(photo, exif=exif)
+        prepared, how = prepare_input_image(photo, 1024)
+        assert how == "original" and b"Camera maker" not in prepared.data
+        with PILImage.open(io.BytesIO(prepared.data)) as img:
+            assert img.size == (300, 200)
+
+
+def test_max_input_dimension_reads_headers_and_reports_bad_files():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        photo = Path(tmpdir) / "photo.jpg"
+        photo.write_bytes(jpeg_bytes(1200, 3100))
+        assert max_input_dimension([]) == 0
+        assert max_input_dimension([str(photo)]) == 3100
+        with pytest.raises(RuntimeError, match="Error loading input image '.*missing.png'"):
+            max_input_dimension([str(photo), os.path.join(tmpdir, "missing.png")])
+
+
+def test_read_image_header_matches_pillow():
+    PILImage = pytest.importorskip("PIL.Image")
+    for image_format, mode in [("PNG", "RGBA"), ("JPEG", "RGB"), ("JPEG", "L"), ("WEBP", "RGB"), ("WEBP", "RGBA"), ("GIF", "P")]:
+        buffer = io.BytesIO()
+        PILImage.new(mode, (321, 123)).save(buffer, image_format, **({"lossless": True} if mode == "RGBA" and image_format == "WEBP" else {}))
+        buffer.seek(0)
+        header = read_image_header(buffer)
+        assert header[:3] == (image_format, 321, 123)
+        assert header.uploadable == (image_format != "GIF")
+
+
+def test_only_8_bit_still_images_in_common_modes_are_uploadable():
+    def uploadable(data):
+        return read_image_header(io.BytesIO(data)).uploadable
+
+    assert all(uploadable(png_header(color_type=color_type)) for color_type in (0, 2, 3, 4, 6))
+    assert not uploadable(png_header(bit_depth=16, color_type=0))  # Pillow's I;16
+    assert not uploadable(png_header(bit_depth=16, color_type=6))
+    assert not uploadable(png_header(bit_depth=1, color_type=0))
+    assert uploadable(png_header(chunks=b"\x00\x00\x00\x01sRGB\x00" + b"\x00" * 4))
+    assert not uploadable(png_header(chunks=b"\x00\x00\x00\x08acTL" + b"\x00" * 12))  # APNG
+    assert uploadable(jpeg_bytes(10, 10)) and uploadable(jpeg_bytes(10, 10, components=1))
+    assert not uploadable(jpeg_bytes(10, 10, components=4))
+
+
+def png_file(width: int, height: int, bit_depth: int, color_type: int) -> bytes:
+    """A complete, decodable PNG of zeroed pixels."""
+    import zlib
+
+    def chunk(kind: bytes, body: bytes) -> bytes:
+        return struct.pack(">I", len(body)) + kind + body + struct.pack(">I", zlib.crc32(kind + body))
+
+    channels = {0: 1, 2: 3, 4: 2, 6: 4}[color_type]
+    row = b"\x00" + b"\x00" * (width * channels * bit_depth // 8)
+    ihdr = struct.pack(">IIBBBBB", width, height, bit_depth, color_type, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", ihdr) + chunk(b"IDAT", zlib.compress(row * height)) + chunk(b"IEND", b"")
+
+
+@pytest.mark.parametrize("color_type", [0, 2, 6], ids=["I;16", "RGB", "RGBA"])
+def test_prepare_input_image_converts_16_bit_png(color_type):
+    pytest.importorskip("PIL.Image")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        deep = Path(tmpdir) / "deep.png"
+        deep.write_bytes(png_file(64, 32, 16, color_type))
+        prepared, how = prepare_input_image(str(deep), 1024)
+        assert how == "converted"
+        header = read_image_header(io.BytesIO(prepared.data))
+        assert header.uploadable and header[1:3] == (64, 32)
+
+
+def png_header(color_type: int = 6, chunks: bytes = b"", bit_depth: int = 8) -> bytes:
+    ihdr = struct.pack(">IIBBBBB", 64, 32, bit_depth, color_type, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + struct.pack(">I", 13) + b"IHDR" + ihdr + b"\x00" * 4 + chunks + b"\x00\x00\x00\x00IDAT"
+
+
+def test_header_has_alpha():
+    assert header_has_alpha(png_header(2), "PNG") is False
+    assert header_has_alpha(png_header(6), "PNG") is True
+    assert header_has_alpha(png_header(3), "PNG") is False
+    assert header_has_alpha(png_header(3, b"\x00\x00\x00\x01tRNS\x00"), "PNG") is True
+    assert header_has_alpha(jpeg_bytes(10, 10), "JPEG") is False
+    vp8x = b"RIFF\x00\x00\x00\x00WEBPVP8X\x00\x00\x00\x00"
+    assert header_has_alpha(vp8x + b"\x10" + b"\x00" * 9, "WEBP") is True
+    assert header_has_alpha(vp8x + b"\x00" * 10, "WEBP") is False
+
+
+def test_output_format_for():
+    assert output_format_for(Path("out.png")) == "PNG"
+    assert output_format_for(Path("out.JPG")) == "JPEG"
+    assert output_format_for(Path("out.webp")) == "WEBP"
+    assert output_format_for(Path("out")) == "PNG"
+    assert output_format_for(Path("out"), "jpeg") == "JPEG"
+    assert output_format_for(Path("out.JPG"), "jpeg") == "JPEG"
+    with pytest.raises(ValueError, match="--format jpeg does not match the extension of 'out.png'"):
+        output_format_for(Path("out.png"), "jpeg")
+
+
+def test_check_output_options_warns_when_alpha_cannot_be_kept():
+    warnings = []
+    assert check_output_options(Path("out.png"), None, True, warnings.append) == "PNG"
+    assert check_output_options(Path("out.jpg"), None, False, warnings.append) == "JPEG"
+    assert warnings == []
+    assert check_output_options(Path("out.jpg"), None, True, warnings.append) == "JPEG"
+    assert len(warnings) == 1 and "'out.jpg' will be flattened" in warnings[0]
+
+
+def test_main_rejects_a_format_that_contradicts_the_filename(monkeypatch, capsys):
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+    monkeypatch.setattr(sys, "argv", ["generate_image.py", "-p", "x", "-f", "out.png", "--format", "jpeg", "--no-worker"])
+    with pytest.raises(SystemExit) as excinfo:
+        generate_image.main()
+    assert excinfo.value.code == 1
+    assert "Error: --format jpeg does not match the extension of 'out.png'" in capsys.readouterr().err
+
+
+def test_save_output_image_writes_matching_bytes_untouched():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        output = Path(tmpdir) / "out.png"
+        data = png_header(2)  # Only the header is read, so these need not be a full image
+        assert save_output_image(data, output, "PNG") is True
+        assert output.read_bytes() == data
+        assert save_output_image(png_header(6), output, "PNG", keep_alpha=True) is True
+        assert save_output_image(jpeg_bytes(10, 10), Path(tmpdir) / "out.jpg", "JPEG") is True
+
+
+def test_save_output_image_converts_only_when_needed():
+    PILImage = pytest.importorskip("PIL.Image")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        buffer = io.BytesIO()
+        PILImage.new("RGBA", (8, 8), (255, 0, 0, 0)).save(buffer, "PNG")
+        rgba = buffer.getvalue()
+        output = Path(tmpdir) / "out.png"
+
+        assert save_output_image(rgba, output, "PNG") is False
+        with PILImage.open(output) as image:
+            assert (image.mode, image.getpixel((0, 0))) == ("RGB", (255, 255, 255))
+
+        assert save_output_image(rgba, output, "PNG", keep_alpha=True) is True
+        assert output.read_bytes() == rgba
+
+        jpeg = Path(tmpdir) / "out.jpg"
+        assert save_output_image(rgba, jpeg, "JPEG", keep_alpha=True) is False
+        with PILImage.open(jpeg) as image:
+            assert (image.format, image.mode) == ("JPEG", "RGB")
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Benchmark gen.py's generation loop against a local mock Images API.
+
+Starts an asyncio server in a child process that answers
+/v1/images/generations with configurable latency, image size and error rate,
+then runs gen.main() against it at several image counts and concurrency levels
+and reports images/s, peak traced memory and request latency percentiles.
+
+    python bench_gen.py --counts 8,32,128 --concurrency 1,4,16
+    python bench_gen.py --counts 64 --latency 0.2 --payload-kb 2048 --error-rate 0.05
+    python bench_gen.py --counts 64 --save-baseline /tmp/gen-baseline.json
+    python bench_gen.py --counts 64 --baseline /tmp/gen-baseline.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from typing import Callable
+
+import gen
+
+
+def serve_mock_api(conn, latency: float, payload_bytes: int, error_rate: float, seed: int) -> None:
+    """Child-process entry point: serve fake image generations until terminated."""
+    import asyncio
+    import base64
+    import random
+
+    rng = random.Random(seed)
+    image = base64.b64encode(rng.randbytes(payload_bytes)).decode("ascii")
+    item = json.dumps({"b64_json": image, "revised_prompt": "mock"}).encode("utf-8")
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                lines = head.decode("latin-1").split("\r\n")
+                headers = {}
+                for line in lines[1:]:
+                    name, _, value = line.partition(":")
+                    if name:
+                        headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length") or 0))
+                if latency:
+                    await asyncio.sleep(latency)
+                extra = b""
+                if rng.random() < error_rate:
+                    status = "429 Too Many Requests"
+                    extra = b"Retry-After: 0\r\n"
+                    payload = b'{"error": {"message": "rate limited"}}'
+                else:
+                    status = "200 OK"
+                    n = int(json.loads(body or b"{}").get("n", 1))
+                    payload = b'{"created": 0, "data": [' + b", ".join([item] * n) + b"]}"
+                writer.write(
+                    f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(payload)}\r\n".encode("ascii")
+                    + extra
+                    + b"\r\n"
+                )
+                writer.write(payload)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def run() -> None:
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        conn.send(server.sockets[0].getsockname()[1])
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(run())
+
+
+class MockImagesApi:
+    """Runs serve_mock_api in a child process so its CPU and memory stay out of the measurements."""
+
+    def __init__(self, latency: float = 0.05, payload_bytes: int = 512 * 1024, error_rate: float = 0.0, seed: int = 0):
+        self.args = (latency, payload_bytes, error_rate, seed)
+        self.process = None
+        self.base_url = ""
+
+    def __enter__(self) -> "MockImagesApi":
+        import multiprocessing
+
+        parent, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=serve_mock_api, args=(child, *self.args), daemon=True)
+        self.process.start()
+        if not parent.poll(10):
+            self.process.terminate()
+            raise RuntimeError("mock Images API did not start")
+        self.base_url = f"http://127.0.0.1:{parent.recv()}/v1"
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.process.terminate()
+        self.process.join()
+
+
+def run_gen(base_url: str, count: int, concurrency: int, distinct: bool) -> tuple[float, list[float]]:
+    """One in-process gen.main() run; returns (seconds, per-request latencies)."""
+    latencies: list[float] = []
+    lock = threading.Lock()
+    request_images = gen.request_images
+    pick_prompts = gen.pick_prompts
+
+    def timed_request(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return request_images(*args, **kwargs)
+        finally:
+            with lock:
+                latencies.append(time.perf_counter() - started)
+
+    saved = (sys.argv, os.environ.get("OPENAI_BASE_URL"), os.environ.get("OPENAI_API_KEY"))
+    with tempfile.TemporaryDirectory(prefix="bench-gen-") as tmp:
+        argv = ["gen.py", "--count", str(count), "--concurrency", str(concurrency), "--out-dir", tmp]
+        argv += ["--no-cache", "--thumb-size", "0"]
+        if not distinct:
+            argv += ["--prompt", "a lobster astronaut, golden hour"]
+        sys.argv = argv
+        os.environ["OPENAI_BASE_URL"] = base_url
+        os.environ["OPENAI_API_KEY"] = "sk-bench"
+        gen.request_images = timed_request
+        gen.pick_prompts = lambda n: [f"benchmark prompt {i}" for i in range(n)]
+        try:
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+                gen.main()
+            seconds = time.perf_counter() - started
+        finally:
+            gen.request_images = request_images
+            gen.pick_prompts = pick_prompts
+            sys.argv = saved[0]
+            for name, value in zip(("OPENAI_BASE_URL", "OPENAI_API_KEY"), saved[1:]):
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+    return seconds, latencies
+
+
+def measure(func: Callable[[], tuple[float, list[float]]], repeat: int) -> dict[str, float]:
+    best = float("inf")
+    latencies: list[float] = []
+    requests = 0
+    for _ in range(repeat):
+        seconds, run_latencies = func()
+        if seconds < best:
+            best, latencies = seconds, run_latencies
+        requests += len(run_latencies)
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "seconds": best,
+        "peakBytes": float(peak),
+        "requests": requests / repeat,
+        "p50Ms": gen.percentile(latencies, 50) * 1000,
+        "p95Ms": gen.percentile(latencies, 95) * 1000,
+        "p99Ms": gen.percentile(latencies, 99) * 1000,
+    }
+
+
+def run_benchmarks(
+    counts: list[int],
+    concurrency: list[int],
+    repeat: int = 1,
+    latency: float = 0.05,
+    payload_bytes: int = 512 * 1024,
+    error_rate: float = 0.0,
+    distinct: bool = False,
+) -> dict[str, dict[str, dict[str, float]]]:
+    """Results keyed by image count, then `c<concurrency>`."""
+    results: dict[str, dict[str, dict[str, float]]] = {}
+    with MockImagesApi(latency, payload_bytes, error_rate) as api:
+        for count in counts:
+            results[str(count)] = {}
+            for workers in concurrency:
+                stats = measure(lambda: run_gen(api.base_url, count, workers, distinct), repeat)
+                stats["imagesPerSecond"] = count / stats["seconds"] if stats["seconds"] else float("inf")
+                results[str(count)][f"c{workers}"] = stats
+                print(
+                    f"{count:>6} images  c={workers:<3}"
+                    f" {stats['seconds'] * 1000:>9.1f} ms"
+                    f"  {stats['imagesPerSecond']:>8.1f} img/s"
+                    f"  p50 {stats['p50Ms']:>7.1f} ms  p95 {stats['p95Ms']:>7.1f} ms"
+                    f"  {stats['peakBytes'] / 1_048_576:>7.1f} MiB peak",
+                    flush=True,
+                )
+    return results
+
+
+def compare(
+    results: dict[str, dict[str, dict[str, float]]],
+    baseline: dict[str, dict[str, dict[str, float]]],
+    tolerance: float,
+) -> list[str]:
+    """Describe every case that got slower (or hungrier) than baseline by more than tolerance."""
+    regressions = []
+    for count, cases in results.items():
+        for name, stats in cases.items():
+            base = baseline.get(count, {}).get(name)
+            if not base:
+                continue
+            for metric in ("seconds", "peakBytes", "p95Ms"):
+                if base.get(metric) and stats[metric] > base[metric] * (1 + tolerance):
+                    ratio = stats[metric] / base[metric]
+                    regressions.append(f"{count} images {name}: {metric} {ratio:.2f}x baseline")
+    return regressions
+
+
+def parse_ints(value: str) -> list[int]:
+    try:
+        numbers = [int(float(part)) for part in value.split(",") if part.strip()]
+    except ValueError as exc:
+        raise argparse.ArgumentTypeError("must be a comma-separated list of integers") from exc
+    if not numbers or any(number < 1 for number in numbers):
+        raise argparse.ArgumentTypeError("values must be >= 1")
+    return numbers
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark gen.py against a local mock Images API.")
+    parser.add_argument("--counts", type=parse_ints, default=[8, 32, 128], help="Comma-separated image counts.")
+    parser.add_argument("--concurrency", type=parse_ints, default=[1, 4, 16], help="Comma-separated --concurrency values.")
+    parser.add_argument("--repeat", type=int, default=1, help="Timing runs per case (best is kept).")
+    parser.add_argument("--latency", type=float, default=0.05, help="Mock server delay per request in seconds.")
+    parser.add_argument("--payload-kb", type=int, default=512, help="Decoded size of each mock image in KiB.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with 429 (0-1).")
+    parser.add_argument("--distinct", action="store_true", help="Use a different prompt per image (no batching).")
+    parser.add_argument("--save-baseline", help="Write results as a JSON baseline to this path.")
+    parser.add_argument("--baseline", help="Compare against a JSON baseline; exit 1 on regressions.")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="Allowed slowdown/memory growth vs baseline before failing (default: 0.25 = 25%%).",
+    )
+    args = parser.parse_args()
+    if args.repeat < 1:
+        parser.error("--repeat must be >= 1")
+    if not 0 <= args.error_rate < 1:
+        parser.error("--error-rate must be in [0, 1)")
+
+    results = run_benchmarks(
+        args.counts,
+        args.concurrency,
+        repeat=args.repeat,
+        latency=args.latency,
+        payload_bytes=args.payload_kb * 1024,
+        error_rate=args.error_rate,
+        distinct=args.distinct,
+    )
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as handle:
+            json.dump(results, handle, indent=2, sort_keys=True)
+        print(f"Saved baseline: {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as handle:
+            baseline = json.load(handle)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("Regressions vs baseline:", file=sys.stderr)
+            for line in regressions:
+                print(f"- {line}", file=sys.stderr)
+            return 1
+        print("No regressions vs baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
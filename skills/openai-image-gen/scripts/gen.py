@@ -1,16 +1,20 @@
 #!/usr/bin/env python3
 import argparse
-import base64
-import datetime as dt
 import json
 import os
-import random
 import re
 import sys
-import urllib.error
-import urllib.request
-from html import escape as html_escape
+import time
+from contextlib import closing, contextmanager, nullcontext
 from pathlib import Path
+from typing import BinaryIO, Callable, Iterator, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# http.client, urllib, tempfile, random, datetime and html are imported on the
+# paths that need them so `--help` and argument errors return without loading
+# the HTTP stack.
 
 
 def slugify(text: str) -> str:
@@ -21,6 +25,8 @@ def slugify(text: str) -> str:
 
 
 def default_out_dir() -> Path:
+    import datetime as dt
+
     now = dt.datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
     preferred = Path.home() / "Projects" / "tmp"
     base = preferred if preferred.is_dir() else Path("./tmp")
@@ -29,6 +35,8 @@ def default_out_dir() -> Path:
 
 
 def pick_prompts(count: int) -> list[str]:
+    import random
+
     subjects = [
         "a lobster astronaut",
         "a brutalist lighthouse",
@@ -75,8 +83,602 @@ def get_model_defaults(model: str) -> tuple[str, str]:
         return ("1024x1024", "high")
 
 
-def request_images(
-    api_key: str,
+DEFAULT_BASE_URL = "https://api.openai.com/v1"
+REQUEST_TIMEOUT = 300
+
+
+def api_base_url() -> str:
+    return (os.environ.get("OPENAI_BASE_URL") or DEFAULT_BASE_URL).rstrip("/")
+
+
+def add_timing(timings: dict[str, float], name: str, value: float) -> None:
+    timings[name] = timings.get(name, 0.0) + value
+
+
+# Stages measured inside one request attempt; a retry starts them from zero.
+ATTEMPT_TIMINGS = ("connect", "ttfb", "download", "decode", "write", "bytes")
+
+
+# List prices in USD per image when this was written; combinations not listed
+# (newer models, "auto" size/quality) get no estimate rather than a guess.
+IMAGE_PRICES_USD = {
+    "gpt-image-1": {
+        "low": {"1024x1024": 0.011, "1024x1536": 0.016, "1536x1024": 0.016},
+        "medium": {"1024x1024": 0.042, "1024x1536": 0.063, "1536x1024": 0.063},
+        "high": {"1024x1024": 0.167, "1024x1536": 0.25, "1536x1024": 0.25},
+    },
+    "dall-e-3": {
+        "standard": {"1024x1024": 0.04, "1024x1792": 0.08, "1792x1024": 0.08},
+        "hd": {"1024x1024": 0.08, "1024x1792": 0.12, "1792x1024": 0.12},
+    },
+    "dall-e-2": {
+        "standard": {"256x256": 0.016, "512x512": 0.018, "1024x1024": 0.02},
+    },
+}
+
+
+def estimate_cost(model: str, size: str, quality: str) -> float | None:
+    """Estimated USD per generated image, or None when the price is unknown."""
+    if model == "dall-e-2":
+        quality = "standard"
+    return IMAGE_PRICES_USD.get(model, {}).get(quality, {}).get(size)
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Linearly interpolated percentile (0.0 when empty); same definition as model_usage.py."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = (len(ordered) - 1) * pct / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+METRIC_STAGES = ("queue", "schedule_wait", "connect", "ttfb", "download", "decode", "write", "request")
+
+
+def summarize_metrics(metrics: list[dict], model: str, size: str, quality: str) -> list[str]:
+    """Human-readable p50/p95 per stage and the estimated cost for this run's images."""
+    fresh = [m for m in metrics if not m.get("cached")]
+    cached = len(metrics) - len(fresh)
+    if not fresh:
+        return [f"Estimated cost: $0 (all {cached} image(s) served from cache)"] if cached else []
+
+    stages = []
+    for stage in METRIC_STAGES:
+        values = [m[f"{stage}_ms"] for m in fresh if f"{stage}_ms" in m]
+        if values:
+            stages.append(f"{stage} {percentile(values, 50):.0f}/{percentile(values, 95):.0f}")
+    received = sum(m.get("bytes", 0) for m in fresh) / 1_048_576
+    lines = [f"Timing p50/p95 ms over {len(fresh)} image(s), {received:.1f} MiB received: " + ", ".join(stages)]
+    price = estimate_cost(model, size, quality)
+    cost = f"${price * len(fresh):.3f} ({len(fresh)} x ${price})" if price is not None else "unknown"
+    lines.append(f"Estimated cost for {model} {size} {quality}: {cost}" + (f"; {cached} cached" if cached else ""))
+    return lines
+
+
+class ConnectFailed(ConnectionError):
+    """The connection (or proxy tunnel) could not be opened, so no request was sent."""
+
+
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+
+def closed_by_peer(conn) -> bool:
+    """Whether an idle keep-alive connection was closed by the server (or has unexpected data)."""
+    import select
+
+    sock = conn.sock
+    if sock is None:
+        return True
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+    except (OSError, ValueError):
+        return True
+    return bool(readable)
+
+
+class HttpPool:
+    """Keep-alive HTTP(S) connections shared by API calls and image downloads.
+
+    Connections are pooled per (scheme, host, port) and at most `max_per_host`
+    are open to one host at a time; extra callers wait for a free slot. Idle
+    connections the server already closed are discarded before reuse. If a
+    reused connection drops while the request is in flight, only idempotent
+    methods are resent; a POST raises so the caller's retry policy decides.
+
+    Proxies come from the environment like urllib's (`HTTPS_PROXY`,
+    `HTTP_PROXY`, `NO_PROXY`): https requests are tunnelled with CONNECT and
+    plain http requests are sent to the proxy with an absolute URL.
+    """
+
+    def __init__(self, max_per_host: int = 4, timeout: float = REQUEST_TIMEOUT) -> None:
+        import threading
+
+        self.max_per_host = max(1, max_per_host)
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._idle: dict[tuple[str, str, int], list] = {}
+        self._slots: dict[tuple[str, str, int], threading.BoundedSemaphore] = {}
+        self._proxies: dict[tuple[str, str, int], tuple[str, int, dict[str, str]] | None] = {}
+        self.connections_opened = 0
+
+    def proxy_for(self, key: tuple[str, str, int]) -> tuple[str, int, dict[str, str]] | None:
+        """(proxy host, proxy port, proxy headers) for a target, or None to connect directly."""
+        with self._lock:
+            if key in self._proxies:
+                return self._proxies[key]
+        from urllib.parse import unquote, urlsplit
+        from urllib.request import getproxies, proxy_bypass
+
+        scheme, host, port = key
+        proxy = getproxies().get(scheme)
+        found = None
+        if proxy and not proxy_bypass(f"{host}:{port}") and not proxy_bypass(host):
+            parts = urlsplit(proxy if "://" in proxy else f"http://{proxy}")
+            headers = {}
+            if parts.username is not None:
+                import base64
+
+                credentials = f"{unquote(parts.username)}:{unquote(parts.password or '')}"
+                headers["Proxy-Authorization"] = "Basic " + base64.b64encode(credentials.encode()).decode("ascii")
+            found = (parts.hostname, parts.port or 80, headers)
+        with self._lock:
+            self._proxies[key] = found
+        return found
+
+    def _slot(self, key: tuple[str, str, int]):
+        import threading
+
+        with self._lock:
+            slot = self._slots.get(key)
+            if slot is None:
+                slot = self._slots[key] = threading.BoundedSemaphore(self.max_per_host)
+            return slot
+
+    def _checkout(self, key: tuple[str, str, int]) -> tuple[object, bool]:
+        while True:
+            with self._lock:
+                idle = self._idle.get(key)
+                conn = idle.pop() if idle else None
+                if conn is None:
+                    self.connections_opened += 1
+                    break
+            if not closed_by_peer(conn):
+                return conn, True
+            conn.close()
+        import http.client
+
+        scheme, host, port = key
+        proxy = self.proxy_for(key)
+        if proxy is None:
+            if scheme == "https":
+                return http.client.HTTPSConnection(host, port, timeout=self.timeout), False
+            return http.client.HTTPConnection(host, port, timeout=self.timeout), False
+        proxy_host, proxy_port, proxy_headers = proxy
+        if scheme == "https":
+            conn = http.client.HTTPSConnection(proxy_host, proxy_port, timeout=self.timeout)
+            conn.set_tunnel(host, port, headers=proxy_headers)
+            return conn, False
+        return http.client.HTTPConnection(proxy_host, proxy_port, timeout=self.timeout), False
+
+    def _checkin(self, key: tuple[str, str, int], conn) -> None:
+        with self._lock:
+            self._idle.setdefault(key, []).append(conn)
+
+    @contextmanager
+    def open(
+        self,
+        method: str,
+        url: str,
+        body: bytes | None = None,
+        headers: dict[str, str] | None = None,
+        timings: dict[str, float] | None = None,
+    ) -> Iterator:
+        """Send a request and yield the `http.client.HTTPResponse`.
+
+        The connection goes back to the pool if the body was fully read and the
+        server allows keep-alive; otherwise it is closed. `timings` receives
+        `connect` and `ttfb` (request sent to response headers) in seconds.
+        """
+        import http.client
+        from urllib.parse import urlsplit
+
+        parts = urlsplit(url)
+        scheme = parts.scheme or "https"
+        if scheme not in ("http", "https") or not parts.hostname:
+            raise RuntimeError(f"Unsupported URL: {url}")
+        key = (scheme, parts.hostname, parts.port or (443 if scheme == "https" else 80))
+        target = parts.path or "/"
+        if parts.query:
+            target = f"{target}?{parts.query}"
+        proxy = self.proxy_for(key) if scheme == "http" else None
+        if proxy is not None:
+            # Plain http through a proxy: absolute-form target, credentials on every request.
+            target = f"http://{parts.netloc.rpartition('@')[2]}{target}"
+            headers = {**(headers or {}), **proxy[2]}
+
+        with self._slot(key):
+            while True:
+                conn, reused = self._checkout(key)
+                try:
+                    started = time.perf_counter()
+                    if conn.sock is None:
+                        try:
+                            conn.connect()
+                        except OSError as e:
+                            raise ConnectFailed(f"Could not connect to {parts.hostname}: {e}") from e
+                    connected = time.perf_counter()
+                    conn.request(method, target, body=body, headers=headers or {})
+                    resp = conn.getresponse()
+                    if timings is not None:
+                        timings["connect"] = connected - started
+                        timings["ttfb"] = time.perf_counter() - connected
+                except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                    conn.close()
+                    # A keep-alive connection can die between the liveness check and the send.
+                    # Only idempotent requests are resent; a POST may already have been
+                    # received (and billed), so the scheduler's retry policy decides.
+                    if reused and method in IDEMPOTENT_METHODS:
+                        continue
+                    raise
+                except BaseException:
+                    conn.close()
+                    raise
+                break
+            try:
+                yield resp
+            except BaseException:
+                conn.close()
+                raise
+            if resp.isclosed() and not resp.will_close:
+                self._checkin(key, conn)
+            else:
+                conn.close()
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+
+def download_image(
+    pool: HttpPool, url: str, filepath: Path, max_redirects: int = 5, timings: dict[str, float] | None = None
+) -> None:
+    from urllib.parse import urljoin
+
+    timings = {} if timings is None else timings
+    try:
+        for _ in range(max_redirects + 1):
+            with pool.open("GET", url) as resp:
+                location = resp.getheader("Location")
+                if resp.status in (301, 302, 303, 307, 308) and location:
+                    resp.read()
+                    url = urljoin(url, location)
+                    continue
+                if resp.status >= 400:
+                    resp.read()
+                    raise RuntimeError(f"Failed to download image from {url}: HTTP {resp.status}")
+                with AtomicFile(filepath) as sink:
+                    while True:
+                        started = time.perf_counter()
+                        chunk = resp.read(STREAM_CHUNK)
+                        read = time.perf_counter()
+                        if not chunk:
+                            break
+                        sink.write(chunk)
+                        add_timing(timings, "download", read - started)
+                        add_timing(timings, "write", time.perf_counter() - read)
+                        add_timing(timings, "bytes", len(chunk))
+                return
+    except OSError as e:
+        raise RuntimeError(f"Failed to download image from {url}: {e}") from e
+    raise RuntimeError(f"Failed to download image from {url}: too many redirects")
+
+
+class AtomicFile:
+    """Binary file written under a temp name next to `path`; commit() renames it into place."""
+
+    def __init__(self, path: Path) -> None:
+        import tempfile
+
+        self.path = path
+        fd, self.tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".part")
+        self.handle = os.fdopen(fd, "wb")
+
+    def write(self, data: bytes) -> None:
+        self.handle.write(data)
+
+    def commit(self) -> None:
+        self.handle.close()
+        os.replace(self.tmp, self.path)
+
+    def discard(self) -> None:
+        self.handle.close()
+        try:
+            os.unlink(self.tmp)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self) -> "AtomicFile":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.commit()
+        else:
+            self.discard()
+
+
+B64_FIELD = re.compile(rb'"b64_json"\s{0,16}:\s{0,16}"')
+B64_STOP = re.compile(rb'["\\]')
+# Longest possible B64_FIELD match is 44 bytes; keep more than that unscanned
+# at a chunk boundary so a split key is still found in the next pass.
+B64_FIELD_CARRY = 64
+STREAM_CHUNK = 1 << 16
+
+
+def save_b64_images(
+    stream: BinaryIO, targets: list[Path], chunk_size: int = STREAM_CHUNK, timings: dict[str, float] | None = None
+) -> dict:
+    """Parse an Images API JSON body from `stream` without buffering the images.
+
+    Each `b64_json` value is decoded in chunks straight into the next path in
+    `targets` (written atomically) and replaced by that path in the returned
+    dict, so memory stays bounded by `chunk_size` rather than the image size.
+    `timings` accumulates `download`, `decode` and `write` seconds and `bytes`.
+    """
+    import binascii
+
+    timings = {} if timings is None else timings
+    clock = time.perf_counter
+
+    def emit(encoded: bytes | bytearray) -> None:
+        started = clock()
+        decoded = binascii.a2b_base64(encoded)
+        decoded_at = clock()
+        sink.write(decoded)
+        add_timing(timings, "decode", decoded_at - started)
+        add_timing(timings, "write", clock() - decoded_at)
+
+    skeleton = bytearray()
+    pending = bytearray()  # base64 characters not yet decoded (< 4 between chunks)
+    carry = b""
+    written = 0
+    sink: AtomicFile | None = None
+    try:
+        while True:
+            started = clock()
+            chunk = stream.read(chunk_size)
+            add_timing(timings, "download", clock() - started)
+            add_timing(timings, "bytes", len(chunk))
+            buf = carry + chunk
+            carry = b""
+            pos = 0
+            while pos < len(buf):
+                if sink is None:
+                    match = B64_FIELD.search(buf, pos)
+                    if match is None:
+                        keep = max(pos, len(buf) - B64_FIELD_CARRY) if chunk else len(buf)
+                        skeleton += buf[pos:keep]
+                        carry = buf[keep:]
+                        break
+                    if written == len(targets):
+                        raise RuntimeError("Unexpected response: more images than requested")
+                    skeleton += buf[pos : match.end() - 1]
+                    sink = AtomicFile(targets[written])
+                    pos = match.end()
+                    continue
+
+                match = B64_STOP.search(buf, pos)
+                end = match.start() if match else len(buf)
+                pending += buf[pos:end]
+                whole = len(pending) - len(pending) % 4
+                if whole:
+                    emit(pending[:whole])
+                    del pending[:whole]
+                if match is None:
+                    break
+                if buf[end] == 0x5C:  # backslash: JSON may escape "/" or wrap lines
+                    if end + 1 == len(buf):
+                        carry = buf[end:]
+                        break
+                    escaped = buf[end + 1]
+                    if escaped == 0x2F:
+                        pending += b"/"
+                    elif escaped not in b"nr":
+                        raise RuntimeError(f"Unexpected escape in b64_json: \\{chr(escaped)}")
+                    pos = end + 2
+                    continue
+
+                if pending:
+                    emit(pending)
+                    pending.clear()
+                started = clock()
+                sink.commit()
+                add_timing(timings, "write", clock() - started)
+                skeleton += json.dumps(str(sink.path)).encode("utf-8")
+                sink = None
+                written += 1
+                pos = end + 1
+            if not chunk:
+                break
+        if sink is not None:
+            raise RuntimeError("Truncated Images API response")
+        return json.loads(skeleton.decode("utf-8"))
+    except ValueError as e:
+        raise RuntimeError(f"Malformed Images API response: {e}") from e
+    finally:
+        if sink is not None:
+            sink.discard()
+
+
+def default_cache_dir() -> Path:
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return Path(base) / "openclaw" / "openai-image-gen"
+
+
+FICLONE = 0x40049409  # Linux ioctl: share extents copy-on-write (btrfs, XFS, bcachefs)
+
+
+def clone_or_copy(src: Path, dst: Path) -> None:
+    """Place a copy of `src` at `dst` atomically, as a copy-on-write clone where supported.
+
+    Never hard-links: outputs get edited in place, and a shared inode would
+    silently change the cached image that later runs hand out.
+    """
+    import shutil
+
+    tmp = dst.with_name(f".{dst.name}.{os.urandom(4).hex()}.tmp")
+    try:
+        try:
+            import fcntl
+
+            with open(src, "rb") as source, open(tmp, "wb") as target:
+                fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+        except (ImportError, OSError):
+            shutil.copyfile(src, tmp)  # Uses sendfile/copy_file_range where available
+        os.replace(tmp, dst)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+class ImageCache:
+    """Content-addressed store of generated images, evicted least-recently-used.
+
+    Each entry is a directory named by the hash of the request args (minus `n`)
+    holding `meta.json` and one file per variant ordinal, so `--count 4` of the
+    same prompt can be served from four earlier results. The mtime of
+    `meta.json` marks the last use of the entry.
+    """
+
+    def __init__(self, root: Path, max_bytes: int) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def key(request_args: dict) -> str:
+        import hashlib
+
+        canonical = {k: v for k, v in request_args.items() if k != "n"}
+        return hashlib.sha256(json.dumps(canonical, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def lookup(self, key: str, ordinal: int, ext: str) -> Path | None:
+        path = self.root / key / f"{ordinal}.{ext}"
+        if not path.is_file():
+            return None
+        try:
+            os.utime(self.root / key / "meta.json")
+        except FileNotFoundError:
+            pass
+        return path
+
+    def store(self, key: str, ordinal: int, source: Path, request_args: dict) -> None:
+        entry = self.root / key
+        entry.mkdir(parents=True, exist_ok=True)
+        clone_or_copy(source, entry / f"{ordinal}{source.suffix}")
+        meta = {"request": {k: v for k, v in request_args.items() if k != "n"}}
+        with AtomicFile(entry / "meta.json") as sink:
+            sink.write(json.dumps(meta, indent=2, sort_keys=True).encode("utf-8"))
+
+    def evict(self) -> int:
+        """Drop least-recently-used entries until the cache fits; returns bytes freed."""
+        import shutil
+
+        entries = []
+        total = 0
+        for entry in self.root.glob("*"):
+            if not entry.is_dir():
+                continue
+            try:
+                used = (entry / "meta.json").stat().st_mtime
+                size = sum(f.stat().st_size for f in entry.iterdir() if f.is_file())
+            except FileNotFoundError:
+                continue
+            entries.append((used, size, entry))
+            total += size
+        freed = 0
+        for _, size, entry in sorted(entries, key=lambda item: item[0]):
+            if total - freed <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            freed += size
+        return freed
+
+
+RUN_FILE = "run.json"
+MANIFEST_FILE = "manifest.jsonl"
+
+
+class Manifest:
+    """Append-only JSON-lines record of finished images, read back by --resume."""
+
+    def __init__(self, path: Path) -> None:
+        import threading
+
+        self.path = path
+        self._lock = threading.Lock()
+
+    def load(self) -> dict[int, dict]:
+        """Finished items by index, skipping torn lines and images no longer on disk."""
+        done: dict[int, dict] = {}
+        try:
+            lines = self.path.read_text(encoding="utf-8").splitlines()
+        except FileNotFoundError:
+            return done
+        for line in lines:
+            try:
+                item = json.loads(line)
+                index = int(item.pop("index"))
+            except (ValueError, KeyError, TypeError, AttributeError):
+                continue
+            if (self.path.parent / item.get("file", "")).is_file():
+                done[index] = item
+        return done
+
+    def append(self, index: int, item: dict) -> None:
+        line = json.dumps({"index": index, **item}) + "\n"
+        with self._lock, self.path.open("a", encoding="utf-8") as handle:
+            handle.write(line)
+
+
+def max_images_per_request(model: str) -> int:
+    """Largest `n` the Images API accepts for model (dall-e-3 only supports 1)."""
+    if model == "dall-e-3":
+        return 1
+    return 10
+
+
+def plan_batches(
+    prompts: list[str], max_n: int, workers: int = 1, skip: set[int] | None = None
+) -> list[tuple[list[int], str]]:
+    """Group identical prompts into (1-based indexes, prompt) requests of at most max_n images.
+
+    Batches are sized so every worker still gets one when there are fewer
+    distinct prompts than workers, instead of one worker taking a full batch.
+    Indexes in `skip` (already generated) are left out.
+    """
+    groups: dict[str, list[int]] = {}
+    for idx, prompt in enumerate(prompts, start=1):
+        if skip and idx in skip:
+            continue
+        groups.setdefault(prompt, []).append(idx)
+    pending = sum(len(indexes) for indexes in groups.values())
+    per_worker = -(-pending // max(1, workers))
+    size = max(1, min(max_n, per_worker))
+    batches = []
+    for prompt, indexes in groups.items():
+        for start in range(0, len(indexes), size):
+            batches.append((indexes[start : start + size], prompt))
+    batches.sort(key=lambda batch: batch[0][0])
+    return batches
+
+
+def build_request_args(
     prompt: str,
     model: str,
     size: str,
@@ -84,13 +686,13 @@ def request_images(
     background: str = "",
     output_format: str = "",
     style: str = "",
+    n: int = 1,
 ) -> dict:
-    url = "https://api.openai.com/v1/images/generations"
     args = {
         "model": model,
         "prompt": prompt,
         "size": size,
-        "n": 1,
+        "n": n,
     }
 
     # Quality parameter - dall-e-2 doesn't accept this parameter
@@ -109,43 +711,388 @@ def request_images(
     if model == "dall-e-3" and style:
         args["style"] = style
 
+    return args
+
+
+def request_images(
+    api_key: str,
+    prompt: str,
+    model: str,
+    size: str,
+    quality: str,
+    background: str = "",
+    output_format: str = "",
+    style: str = "",
+    n: int = 1,
+    pool: HttpPool | None = None,
+    targets: list[Path] | None = None,
+    timings: dict[str, float] | None = None,
+) -> dict:
+    """POST an image generation request and return the parsed response.
+
+    With `targets`, base64 images are streamed to those paths as the body
+    arrives (see save_b64_images) and each `b64_json` holds the written path.
+    `timings` collects connection, transfer and decode times for the request.
+    """
+    url = f"{api_base_url()}/images/generations"
+    args = build_request_args(prompt, model, size, quality, background, output_format, style, n)
     body = json.dumps(args).encode("utf-8")
-    req = urllib.request.Request(
-        url,
-        method="POST",
-        headers={
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json",
-        },
-        data=body,
-    )
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+    }
+    timings = {} if timings is None else timings
+    with closing(HttpPool(max_per_host=1)) if pool is None else nullcontext(pool) as active, active.open(
+        "POST", url, body=body, headers=headers, timings=timings
+    ) as resp:
+        if resp.status >= 400:
+            payload = resp.read().decode("utf-8", errors="replace")
+            raise ApiError(
+                f"OpenAI Images API failed ({resp.status}): {payload}",
+                resp.status,
+                parse_retry_after(resp.headers),
+                error_code(payload),
+            )
+        if targets is not None:
+            return save_b64_images(resp, targets, timings=timings)
+        started = time.perf_counter()
+        payload = resp.read()
+        add_timing(timings, "download", time.perf_counter() - started)
+        add_timing(timings, "bytes", len(payload))
+        return json.loads(payload.decode("utf-8"))
+
+
+class ApiError(RuntimeError):
+    """Images API error response.
+
+    `retry_after` is the server's requested delay and `code` the error body's
+    `code` (or `type`), when present.
+    """
+
+    def __init__(self, message: str, status: int, retry_after: float | None = None, code: str = "") -> None:
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+        self.code = code
+
+
+def error_code(payload: str) -> str:
+    """`error.code` (falling back to `error.type`) from an API error body, or ""."""
     try:
-        with urllib.request.urlopen(req, timeout=300) as resp:
-            return json.loads(resp.read().decode("utf-8"))
-    except urllib.error.HTTPError as e:
-        payload = e.read().decode("utf-8", errors="replace")
-        raise RuntimeError(f"OpenAI Images API failed ({e.code}): {payload}") from e
+        error = json.loads(payload).get("error")
+    except (ValueError, AttributeError):
+        return ""
+    if not isinstance(error, dict):
+        return ""
+    return str(error.get("code") or error.get("type") or "")
+
+
+# Image generation is billed once the server accepts the request, so only
+# answers that say it was turned away unprocessed are safe to retry.
+RETRYABLE_STATUSES = frozenset({429, 503})
+FATAL_ERROR_CODES = frozenset({"insufficient_quota", "billing_hard_limit_reached"})
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether a failed image request can be resent without risking a second charge."""
+    if isinstance(error, ConnectFailed):
+        return True
+    return (
+        isinstance(error, ApiError)
+        and error.status in RETRYABLE_STATUSES
+        and error.retry_after is not None
+        and error.code not in FATAL_ERROR_CODES
+    )
+
+
+RESET_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+
+
+def parse_retry_after(headers) -> float | None:
+    """Seconds to wait according to Retry-After or OpenAI's rate-limit reset headers."""
+    headers = {k.lower(): v for k, v in headers.items()}
+    if headers.get("retry-after-ms"):
+        try:
+            return max(0.0, float(headers["retry-after-ms"]) / 1000)
+        except ValueError:
+            pass
+    if headers.get("retry-after"):
+        value = headers["retry-after"].strip()
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            from email.utils import parsedate_to_datetime
+
+            try:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    reset = headers.get("x-ratelimit-reset-requests") or ""
+    parts = RESET_PART.findall(reset)
+    if parts:
+        scale = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+        return sum(float(amount) * scale[unit] for amount, unit in parts)
+    return None
+
+
+class RequestScheduler:
+    """Paces API calls and retries throttled or failed ones.
+
+    Calls share a token bucket (`rpm` requests per minute, 0 to disable) and an
+    adaptive in-flight limit: a 429 halves the limit and pauses every worker
+    until the server's Retry-After has passed, and each run of `limit`
+    consecutive successes raises it by one again, up to `max_concurrency`.
+    Only failures `is_retryable()` accepts are retried (connect failures, and
+    429/503 with Retry-After); they back off with full jitter.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 1,
+        rpm: float = 0.0,
+        max_retries: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+    ) -> None:
+        import threading
+
+        self.max_concurrency = max(1, max_concurrency)
+        self.limit = self.max_concurrency
+        self.rate = rpm / 60
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retries = 0
+        self.throttled = 0
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._successes = 0
+        self._tokens = float(self.max_concurrency)
+        self._refilled = time.monotonic()
+        self._paused_until = 0.0
+        self._last_cut = 0.0
 
+    def _acquire(self) -> float:
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    self._cond.wait(self._paused_until - now)
+                    continue
+                if self._in_flight >= self.limit:
+                    self._cond.wait()
+                    continue
+                if self.rate:
+                    elapsed = now - self._refilled
+                    self._tokens = min(float(self.max_concurrency), self._tokens + elapsed * self.rate)
+                    self._refilled = now
+                    if self._tokens < 1:
+                        self._cond.wait((1 - self._tokens) / self.rate)
+                        continue
+                    self._tokens -= 1
+                self._in_flight += 1
+                return now
 
-def write_gallery(out_dir: Path, items: list[dict]) -> None:
-    thumbs = "\n".join(
-        [
-            f"""
+    def _release(self, started: float, ok: bool, throttled: bool = False, pause: float = 0.0) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            if ok:
+                self._successes += 1
+                if self._successes >= self.limit and self.limit < self.max_concurrency:
+                    self.limit += 1
+                    self._successes = 0
+            elif throttled:
+                self._successes = 0
+                # Requests already in flight when the limit was cut will often
+                # 429 too; only the first of them should shrink it further.
+                if started >= self._last_cut:
+                    self.limit = max(1, self.limit // 2)
+                    self._last_cut = time.monotonic()
+                self._paused_until = max(self._paused_until, time.monotonic() + pause)
+            self._cond.notify_all()
+
+    def backoff(self, attempt: int, retry_after: float | None = None) -> float:
+        import random
+
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+    def run(self, func: Callable[[], R], timings: dict[str, float] | None = None) -> R:
+        """Call `func` under the limits, retrying; `timings` gets `schedule_wait` and `attempts`.
+
+        Per-attempt stages (ATTEMPT_TIMINGS) are cleared before each try, so they
+        describe the attempt that succeeded rather than a sum over failed ones.
+        """
+        timings = {} if timings is None else timings
+        attempt = 0
+        while True:
+            waited = time.monotonic()
+            started = self._acquire()
+            add_timing(timings, "schedule_wait", started - waited)
+            timings["attempts"] = attempt + 1
+            for name in ATTEMPT_TIMINGS:
+                timings.pop(name, None)
+            try:
+                result = func()
+            except Exception as e:
+                if not is_retryable(e) or attempt == self.max_retries:
+                    self._release(started, ok=False)
+                    raise
+                status = getattr(e, "status", None)
+                delay = self.backoff(attempt, getattr(e, "retry_after", None))
+                throttled = status == 429
+                self._release(started, ok=False, throttled=throttled, pause=delay)
+                with self._cond:
+                    self.retries += 1
+                    self.throttled += throttled
+                reason = f"HTTP {status}" if status else type(e).__name__
+                print(f"  {reason}; retrying in {delay:.1f}s (limit {self.limit})", file=sys.stderr, flush=True)
+                if not throttled:
+                    time.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                self._release(started, ok=False)
+                raise
+            self._release(started, ok=True)
+            return result
+
+
+def run_concurrently(func: Callable[[T], R], jobs: list[T], concurrency: int) -> list[R]:
+    """Run func over jobs on up to `concurrency` threads; results keep job order.
+
+    Each job's side effects (e.g. writing its image) happen as soon as it finishes.
+    The first failure cancels jobs that have not started yet and is re-raised.
+    """
+    if concurrency <= 1 or len(jobs) <= 1:
+        return [func(job) for job in jobs]
+
+    from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+
+    with ThreadPoolExecutor(max_workers=min(concurrency, len(jobs))) as pool:
+        futures = [pool.submit(func, job) for job in jobs]
+        done, _ = wait(futures, return_when=FIRST_EXCEPTION)
+        for future in done:
+            if future.exception() is not None:
+                for pending in futures:
+                    pending.cancel()
+                raise future.exception()
+        return [future.result() for future in futures]
+
+
+THUMB_DIR = "thumbs"
+GALLERY_PAGE_SIZE = 100
+
+
+def make_thumbnail(src: str, dst: str, max_px: int) -> str:
+    """Process-pool worker: write a copy of `src` scaled to fit `max_px` to `dst`."""
+    from PIL import Image
+
+    jpeg = dst.endswith(".jpg")
+    tmp = f"{dst}.part"
+    with Image.open(src) as img:
+        img.draft("RGB", (max_px, max_px))
+        img.thumbnail((max_px, max_px))
+        if jpeg and img.mode not in ("RGB", "L"):
+            # Flatten onto white; a plain convert("RGB") turns transparent pixels black
+            rgba = img.convert("RGBA")
+            img = Image.new("RGB", rgba.size, (255, 255, 255))
+            img.paste(rgba, mask=rgba.getchannel("A"))
+        img.save(tmp, format="JPEG" if jpeg else "WEBP", quality=80)
+    os.replace(tmp, dst)
+    return dst
+
+
+def make_thumbnails(
+    out_dir: Path, items: list[dict], max_px: int = 384, fmt: str = "webp", workers: int | None = None
+) -> dict[str, str]:
+    """Build gallery thumbnails in a process pool; returns thumbnail path by original file.
+
+    Needs Pillow. Without it (or with `max_px` 0) nothing is built and the
+    gallery links the originals. Thumbnails newer than their original are kept.
+    """
+    import importlib.util
+
+    if max_px <= 0 or not items:
+        return {}
+    if importlib.util.find_spec("PIL") is None:
+        print("Pillow not installed; gallery shows full-size images.", file=sys.stderr)
+        return {}
+
+    (out_dir / THUMB_DIR).mkdir(exist_ok=True)
+    ext = "jpg" if fmt == "jpeg" else "webp"
+    thumbs: dict[str, str] = {}
+    jobs = []
+    for it in items:
+        src = out_dir / it["file"]
+        rel = f"{THUMB_DIR}/{Path(it['file']).stem}.{ext}"
+        dst = out_dir / rel
+        try:
+            if dst.stat().st_mtime >= src.stat().st_mtime:
+                thumbs[it["file"]] = rel
+                continue
+        except FileNotFoundError:
+            pass
+        jobs.append((it["file"], rel, str(src), str(dst)))
+    if not jobs:
+        return thumbs
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=min(len(jobs), workers or os.cpu_count() or 1)) as ex:
+        futures = [(file, rel, ex.submit(make_thumbnail, src, dst, max_px)) for file, rel, src, dst in jobs]
+        for file, rel, future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Thumbnail failed for {file}: {e}", file=sys.stderr)
+            else:
+                thumbs[file] = rel
+    return thumbs
+
+
+def gallery_page_name(page: int) -> str:
+    return "index.html" if page == 1 else f"index-{page}.html"
+
+
+def write_gallery(
+    out_dir: Path, items: list[dict], thumbs: dict[str, str] | None = None, page_size: int = GALLERY_PAGE_SIZE
+) -> None:
+    from html import escape as html_escape
+
+    thumbs = thumbs or {}
+    page_size = page_size if page_size > 0 else max(1, len(items))
+    pages = max(1, -(-len(items) // page_size))
+    for page in range(1, pages + 1):
+        figures = "\n".join(
+            [
+                f"""
 <figure>
-  <a href="{html_escape(it["file"], quote=True)}"><img src="{html_escape(it["file"], quote=True)}" loading="lazy" /></a>
+  <a href="{html_escape(it["file"], quote=True)}"><img src="{html_escape(thumbs.get(it["file"], it["file"]), quote=True)}" loading="lazy" decoding="async" /></a>
   <figcaption>{html_escape(it["prompt"])}</figcaption>
 </figure>
 """.strip()
-            for it in items
-        ]
-    )
-    html = f"""<!doctype html>
+                for it in items[(page - 1) * page_size : page * page_size]
+            ]
+        )
+        nav = ""
+        if pages > 1:
+            links = [f'<a href="{gallery_page_name(page - 1)}">&larr; prev</a>'] if page > 1 else []
+            links.append(f"page {page} of {pages} &middot; {len(items)} images")
+            if page < pages:
+                links.append(f'<a href="{gallery_page_name(page + 1)}">next &rarr;</a>')
+            nav = f'<nav>{" &middot; ".join(links)}</nav>'
+        html = f"""<!doctype html>
 <meta charset="utf-8" />
 <title>openai-image-gen</title>
 <style>
   :root {{ color-scheme: dark; }}
   body {{ margin: 24px; font: 14px/1.4 ui-sans-serif, system-ui; background: #0b0f14; color: #e8edf2; }}
   h1 {{ font-size: 18px; margin: 0 0 16px; }}
+  nav {{ margin: 16px 0; color: #b7c2cc; }}
+  nav a {{ color: #9cd1ff; }}
   .grid {{ display: grid; grid-template-columns: repeat(auto-fill, minmax(240px, 1fr)); gap: 16px; }}
   figure {{ margin: 0; padding: 12px; border: 1px solid #1e2a36; border-radius: 14px; background: #0f1620; }}
   img {{ width: 100%; height: auto; border-radius: 10px; display: block; }}
@@ -154,45 +1101,120 @@ def write_gallery(out_dir: Path, items: list[dict]) -> None:
 </style>
 <h1>openai-image-gen</h1>
 <p>Output: <code>{html_escape(out_dir.as_posix())}</code></p>
+{nav}
 <div class="grid">
-{thumbs}
+{figures}
 </div>
+{nav}
 """
-    (out_dir / "index.html").write_text(html, encoding="utf-8")
+        (out_dir / gallery_page_name(page)).write_text(html, encoding="utf-8")
+
+    # A rerun with fewer images or a larger --page-size must not leave old pages behind.
+    for stale in out_dir.glob("index-*.html"):
+        number = stale.stem.removeprefix("index-")
+        if number.isdigit() and int(number) > pages:
+            stale.unlink(missing_ok=True)
 
 
 def main() -> int:
     ap = argparse.ArgumentParser(description="Generate images via OpenAI Images API.")
     ap.add_argument("--prompt", help="Single prompt. If omitted, random prompts are generated.")
-    ap.add_argument("--count", type=int, default=8, help="How many images to generate.")
-    ap.add_argument("--model", default="gpt-image-1", help="Image model id.")
+    ap.add_argument("--count", type=int, help="How many images to generate (default: 8).")
+    ap.add_argument("--model", help="Image model id (default: gpt-image-1).")
     ap.add_argument("--size", default="", help="Image size (e.g. 1024x1024, 1536x1024). Defaults based on model if not specified.")
     ap.add_argument("--quality", default="", help="Image quality (e.g. high, standard). Defaults based on model if not specified.")
     ap.add_argument("--background", default="", help="Background transparency (GPT models only): transparent, opaque, or auto.")
     ap.add_argument("--output-format", default="", help="Output format (GPT models only): png, jpeg, or webp.")
     ap.add_argument("--style", default="", help="Image style (dall-e-3 only): vivid or natural.")
     ap.add_argument("--out-dir", default="", help="Output directory (default: ./tmp/openai-image-gen-<ts>).")
+    ap.add_argument(
+        "--resume",
+        default="",
+        metavar="OUT_DIR",
+        help="Finish an interrupted run in OUT_DIR, reusing its prompts and settings and skipping finished images.",
+    )
+    ap.add_argument("--concurrency", type=int, default=1, help="Number of images to request in parallel (default: 1).")
+    ap.add_argument("--thumb-size", type=int, default=384, help="Gallery thumbnail size in px; 0 links originals (default: 384, needs Pillow).")
+    ap.add_argument("--thumb-format", choices=["webp", "jpeg"], default="webp", help="Gallery thumbnail format (default: webp).")
+    ap.add_argument("--page-size", type=int, default=GALLERY_PAGE_SIZE, help="Images per gallery page; 0 for one page (default: 100).")
+    ap.add_argument("--metrics", action="store_true", help="Print per-image timing/cost metrics to stderr as JSON lines.")
+    ap.add_argument("--max-retries", type=int, default=5, help="Retries per request when it cannot have been billed: failed connects, 429/503 with Retry-After (default: 5).")
+    ap.add_argument("--rpm", type=float, default=0, help="Pace API calls to this many requests per minute (default: no pacing).")
+    ap.add_argument(
+        "--cache",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help="Reuse earlier results for identical requests (default: on).",
+    )
+    ap.add_argument("--cache-dir", default="", help="Cache directory (default: $XDG_CACHE_HOME/openclaw/openai-image-gen).")
+    ap.add_argument("--cache-max-mb", type=float, default=1024, help="Evict least-recently-used cache entries above this size (default: 1024).")
     args = ap.parse_args()
 
+    if args.concurrency < 1:
+        ap.error("--concurrency must be >= 1")
+    if args.cache_max_mb < 0:
+        ap.error("--cache-max-mb must be >= 0")
+    if args.resume and args.out_dir:
+        ap.error("--resume already names the output directory; drop --out-dir")
+    if args.max_retries < 0:
+        ap.error("--max-retries must be >= 0")
+    if args.rpm < 0:
+        ap.error("--rpm must be >= 0")
+
     api_key = (os.environ.get("OPENAI_API_KEY") or "").strip()
     if not api_key:
         print("Missing OPENAI_API_KEY", file=sys.stderr)
         return 2
 
-    # Apply model-specific defaults if not specified
-    default_size, default_quality = get_model_defaults(args.model)
-    size = args.size or default_size
-    quality = args.quality or default_quality
+    if args.resume:
+        out_dir = Path(args.resume).expanduser()
+        try:
+            run = json.loads((out_dir / RUN_FILE).read_text(encoding="utf-8"))
+            prompts = list(run["prompts"])
+            recorded = {name: run[name] for name in ("model", "size", "quality", "background", "output_format", "style")}
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            ap.error(f"--resume: cannot read {out_dir / RUN_FILE}: {e}")
+        # The run's own settings win; anything given again must agree with them.
+        conflicts = [
+            f"--{name.replace('_', '-')} {value!r} (run has {recorded[name]!r})"
+            for name, value in vars(args).items()
+            if name in recorded and value and value != recorded[name]
+        ]
+        if args.count is not None and args.count != len(prompts):
+            conflicts.append(f"--count {args.count} (run has {len(prompts)})")
+        if args.prompt and any(prompt != args.prompt for prompt in prompts):
+            conflicts.append("--prompt (run has different prompts)")
+        if conflicts:
+            ap.error(f"--resume reuses {out_dir / RUN_FILE}; these options conflict with it: {', '.join(conflicts)}")
+        args.model, size, quality = recorded["model"], recorded["size"], recorded["quality"]
+        args.background, args.output_format, args.style = recorded["background"], recorded["output_format"], recorded["style"]
+    else:
+        args.model = args.model or "gpt-image-1"
+        # Apply model-specific defaults if not specified
+        default_size, default_quality = get_model_defaults(args.model)
+        size = args.size or default_size
+        quality = args.quality or default_quality
 
-    count = args.count
-    if args.model == "dall-e-3" and count > 1:
-        print(f"Warning: dall-e-3 only supports generating 1 image at a time. Reducing count from {count} to 1.", file=sys.stderr)
-        count = 1
+        count = 8 if args.count is None else args.count
+        if args.model == "dall-e-3" and count > 1:
+            print(f"Warning: dall-e-3 only supports generating 1 image at a time. Reducing count from {count} to 1.", file=sys.stderr)
+            count = 1
 
-    out_dir = Path(args.out_dir).expanduser() if args.out_dir else default_out_dir()
-    out_dir.mkdir(parents=True, exist_ok=True)
+        out_dir = Path(args.out_dir).expanduser() if args.out_dir else default_out_dir()
+        out_dir.mkdir(parents=True, exist_ok=True)
 
-    prompts = [args.prompt] * count if args.prompt else pick_prompts(count)
+        prompts = [args.prompt] * count if args.prompt else pick_prompts(count)
+        run = {
+            "prompts": prompts,
+            "model": args.model,
+            "size": size,
+            "quality": quality,
+            "background": args.background,
+            "output_format": args.output_format,
+            "style": args.style,
+        }
+        with AtomicFile(out_dir / RUN_FILE) as sink:
+            sink.write(json.dumps(run, indent=2).encode("utf-8"))
 
     # Determine file extension based on output format
     if args.model.startswith("gpt-image") and args.output_format:
@@ -200,39 +1222,144 @@ def main() -> int:
     else:
         file_ext = "png"
 
-    items: list[dict] = []
+    import threading
+
+    total = len(prompts)
+    pool = HttpPool(max_per_host=args.concurrency)
+    scheduler = RequestScheduler(args.concurrency, rpm=args.rpm, max_retries=args.max_retries)
+    cache = None
+    if args.cache:
+        cache_dir = Path(args.cache_dir).expanduser() if args.cache_dir else default_cache_dir()
+        cache = ImageCache(cache_dir, int(args.cache_max_mb * 1024 * 1024))
+    manifest = Manifest(out_dir / MANIFEST_FILE)
+    if not args.resume:
+        manifest.path.unlink(missing_ok=True)
+
+    # The nth copy of a prompt maps to cache variant n, so repeating a run with
+    # --count N reuses N distinct earlier images rather than one image N times.
+    ordinals: dict[int, int] = {}
+    seen: dict[str, int] = {}
     for idx, prompt in enumerate(prompts, start=1):
-        print(f"[{idx}/{len(prompts)}] {prompt}")
-        res = request_images(
-            api_key,
-            prompt,
-            args.model,
-            size,
-            quality,
-            args.background,
-            args.output_format,
-            args.style,
+        ordinals[idx] = seen.get(prompt, 0)
+        seen[prompt] = ordinals[idx] + 1
+
+    price = estimate_cost(args.model, size, quality)
+    metrics_lock = threading.Lock()
+
+    def finish(idx: int, prompt: str, filename: str, metrics: dict) -> tuple[int, dict]:
+        item = {"prompt": prompt, "file": filename, "metrics": metrics}
+        manifest.append(idx, item)
+        if args.metrics:
+            with metrics_lock:
+                print(json.dumps({"index": idx, "file": filename, **metrics}), file=sys.stderr, flush=True)
+        return idx, item
+
+    def render(batch: tuple[list[int], str]) -> list[tuple[int, dict]]:
+        started = time.perf_counter()
+        indexes, prompt = batch
+        filenames = {idx: f"{idx:03d}-{slugify(prompt)[:40]}.{file_ext}" for idx in indexes}
+        label = f"{indexes[0]}-{indexes[-1]}" if len(indexes) > 1 else f"{indexes[0]}"
+        request_args = build_request_args(
+            prompt, args.model, size, quality, args.background, args.output_format, args.style
+        )
+        key = ImageCache.key(request_args) if cache else ""
+
+        results = []
+        missing = []
+        for idx in indexes:
+            cached = cache.lookup(key, ordinals[idx], file_ext) if cache else None
+            if cached:
+                clone_or_copy(cached, out_dir / filenames[idx])
+                metrics = {"cached": True, "image_bytes": cached.stat().st_size, "cost_usd": 0.0}
+                results.append(finish(idx, prompt, filenames[idx], metrics))
+            else:
+                missing.append(idx)
+        if not missing:
+            print(f"[{label}/{total}] {prompt} (cached)", flush=True)
+            return results
+
+        print(f"[{label}/{total}] {prompt}", flush=True)
+        timings: dict[str, float] = {}
+        res = scheduler.run(
+            lambda: request_images(
+                api_key,
+                prompt,
+                args.model,
+                size,
+                quality,
+                args.background,
+                args.output_format,
+                args.style,
+                n=len(missing),
+                pool=pool,
+                targets=[out_dir / filenames[idx] for idx in missing],
+                timings=timings,
+            ),
+            timings,
         )
-        data = res.get("data", [{}])[0]
-        image_b64 = data.get("b64_json")
-        image_url = data.get("url")
-        if not image_b64 and not image_url:
+        data = res.get("data") or []
+        if len(data) < len(missing):
             raise RuntimeError(f"Unexpected response: {json.dumps(res)[:400]}")
 
-        filename = f"{idx:03d}-{slugify(prompt)[:40]}.{file_ext}"
-        filepath = out_dir / filename
-        if image_b64:
-            filepath.write_bytes(base64.b64decode(image_b64))
-        else:
-            try:
-                urllib.request.urlretrieve(image_url, filepath)
-            except urllib.error.URLError as e:
-                raise RuntimeError(f"Failed to download image from {image_url}: {e}") from e
+        for idx, image in zip(missing, data):
+            # b64 images were already streamed to disk by request_images.
+            if image.get("b64_json"):
+                pass
+            elif image.get("url"):
+                download_image(pool, image["url"], out_dir / filenames[idx], timings=timings)
+            else:
+                raise RuntimeError(f"Unexpected response: {json.dumps(res)[:400]}")
+            if cache:
+                cache.store(key, ordinals[idx], out_dir / filenames[idx], request_args)
 
-        items.append({"prompt": prompt, "file": filename})
+        # Request-level timings are shared by every image the request produced.
+        timings["queue"] = started - queued_at
+        timings["request"] = time.perf_counter() - started
+        shared = {
+            "batch": len(missing),
+            "attempts": int(timings.pop("attempts", 1)),
+            "bytes": int(timings.pop("bytes", 0)) // len(missing),
+            **{f"{name}_ms": round(value * 1000, 1) for name, value in timings.items()},
+            "cost_usd": price,
+        }
+        for idx in missing:
+            metrics = {**shared, "image_bytes": (out_dir / filenames[idx]).stat().st_size}
+            results.append(finish(idx, prompt, filenames[idx], metrics))
+        return sorted(results, key=lambda pair: pair[0])
+
+    done = manifest.load() if args.resume else {}
+    if done:
+        print(f"Resuming: {len(done)}/{total} images already done", flush=True)
+    batches = plan_batches(prompts, max_images_per_request(args.model), args.concurrency, skip=set(done))
+    queued_at = time.perf_counter()
+    try:
+        results = run_concurrently(render, batches, args.concurrency)
+    except Exception as e:
+        finished = len(manifest.load())
+        print(f"Error: {e}", file=sys.stderr)
+        print(
+            f"{finished}/{total} images are done; run again with --resume {out_dir.as_posix()} to finish the rest.",
+            file=sys.stderr,
+        )
+        return 1
+    finally:
+        pool.close()
+        if cache:
+            cache.evict()
+        if scheduler.retries:
+            print(
+                f"Retried {scheduler.retries} request(s), {scheduler.throttled} rate-limited; "
+                f"final concurrency {scheduler.limit}/{scheduler.max_concurrency}",
+                file=sys.stderr,
+            )
+    fresh = [pair for batch in results for pair in batch]
+    items = [item for _, item in sorted(fresh + list(done.items()), key=lambda pair: pair[0])]
+    for line in summarize_metrics([item["metrics"] for _, item in fresh], args.model, size, quality):
+        print(line)
 
     (out_dir / "prompts.json").write_text(json.dumps(items, indent=2), encoding="utf-8")
-    write_gallery(out_dir, items)
+    thumbs = make_thumbnails(out_dir, items, args.thumb_size, args.thumb_format)
+    write_gallery(out_dir, items, thumbs, args.page_size)
     print(f"\nWrote: {(out_dir / 'index.html').as_posix()}")
     return 0
 
@@ -0,0 +1,47 @@
+"""Tests for the gen.py benchmark harness."""
+
+import base64
+
+from bench_gen import MockImagesApi, compare, run_benchmarks
+from gen import ApiError, HttpPool, request_images
+
+
+def test_mock_api_serves_requested_image_count(monkeypatch):
+    with MockImagesApi(latency=0, payload_bytes=300) as api:
+        monkeypatch.setenv("OPENAI_BASE_URL", api.base_url)
+        pool = HttpPool()
+        try:
+            res = request_images("sk-test", "p", "gpt-image-1", "1024x1024", "high", n=3, pool=pool)
+        finally:
+            pool.close()
+    assert len(res["data"]) == 3
+    assert len(base64.b64decode(res["data"][0]["b64_json"])) == 300
+
+
+def test_mock_api_injects_rate_limits(monkeypatch):
+    with MockImagesApi(latency=0, payload_bytes=10, error_rate=1.0) as api:
+        monkeypatch.setenv("OPENAI_BASE_URL", api.base_url)
+        try:
+            request_images("sk-test", "p", "gpt-image-1", "1024x1024", "high")
+        except ApiError as exc:
+            assert exc.status == 429
+            assert exc.retry_after == 0
+        else:
+            raise AssertionError("expected ApiError")
+
+
+def test_run_benchmarks_smoke():
+    results = run_benchmarks([4], [1, 2], latency=0, payload_bytes=1024, distinct=True)
+    assert sorted(results["4"]) == ["c1", "c2"]
+    stats = results["4"]["c2"]
+    assert stats["requests"] == 4
+    assert stats["imagesPerSecond"] > 0
+    assert 0 < stats["p50Ms"] <= stats["p95Ms"] <= stats["p99Ms"]
+
+
+def test_compare_flags_regressions():
+    baseline = {"32": {"c4": {"seconds": 1.0, "peakBytes": 100.0, "p95Ms": 50.0}}}
+    results = {"32": {"c4": {"seconds": 1.0, "peakBytes": 100.0, "p95Ms": 80.0}}}
+    assert compare(results, baseline, 0.25) == ["32 images c4: p95Ms 1.60x baseline"]
+    assert compare(results, baseline, 0.7) == []
+
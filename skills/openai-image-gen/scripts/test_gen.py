@@ -1,9 +1,132 @@
-"""Tests for write_gallery HTML escaping (fixes #12538 - stored XSS)."""
+"""Tests for gen.py: gallery HTML escaping (#12538, stored XSS), HTTP pooling, caching, retries, resume and metrics."""
 
+import base64
+import io
+import json
+import os
+import socket
+import subprocess
+import sys
 import tempfile
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 
-from gen import write_gallery
+import gen
+import pytest
+from gen import (
+    ApiError,
+    ConnectFailed,
+    HttpPool,
+    ImageCache,
+    Manifest,
+    RequestScheduler,
+    build_request_args,
+    download_image,
+    estimate_cost,
+    make_thumbnails,
+    max_images_per_request,
+    parse_retry_after,
+    percentile,
+    plan_batches,
+    request_images,
+    run_concurrently,
+    save_b64_images,
+    summarize_metrics,
+    write_gallery,
+)
+
+PNG_BYTES = b"\x89PNG\r\n\x1a\n" + b"\x00" * 32
+
+
+class FakeImagesHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def send_body(self, status, body, content_type="application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with self.server.lock:
+            self.server.requests.append(request)
+            status = self.server.failures.pop(0) if self.server.failures else 200
+        if status != 200:
+            body = self.server.error_body
+            self.send_response(status)
+            if self.server.retry_after is not None:
+                self.send_header("Retry-After", self.server.retry_after)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if request.get("prompt") == "fail":
+            self.send_body(400, b'{"error": "bad prompt"}')
+            return
+        if request.get("prompt") == "big":
+            self.send_body(200, self.server.big_body)
+            return
+        image = {"b64_json": base64.b64encode(PNG_BYTES).decode("ascii")}
+        self.send_body(200, json.dumps({"data": [image] * request.get("n", 1)}).encode())
+
+    def do_GET(self):
+        if self.path.startswith("http://"):  # Absolute-form target: we are being used as a proxy
+            with self.server.lock:
+                self.server.proxied.append((self.path, self.headers.get("Proxy-Authorization")))
+            self.path = "/" + self.path.split("/", 3)[3]
+        if self.path == "/moved.png":
+            self.send_response(302)
+            self.send_header("Location", "/image.png")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        elif self.path == "/image.png":
+            self.send_body(200, PNG_BYTES, "image/png")
+        else:
+            self.send_body(404, b"missing", "text/plain")
+
+
+def run_gen(monkeypatch, *argv):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(sys, "argv", ["gen.py", *argv])
+    assert gen.main() == 0
+
+
+@contextmanager
+def fake_images_api(monkeypatch=None):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeImagesHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.connections = 0
+    server.requests = []
+    server.failures = []
+    server.retry_after = None
+    server.error_body = b'{"error": {"message": "slow down"}}'
+    server.proxied = []
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    if monkeypatch is not None:
+        monkeypatch.setenv("OPENAI_BASE_URL", f"{base}/v1")
+    try:
+        yield server, base
+    finally:
+        server.shutdown()
+        server.server_close()
 
 
 def test_write_gallery_escapes_prompt_xss():
@@ -48,3 +171,608 @@ def test_write_gallery_normal_output():
         assert 'src="001-lobster.png"' in html
         assert "002-nook.png" in html
 
+
+def test_write_gallery_paginates_and_links_thumbnails():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        out = Path(tmpdir)
+        items = [{"prompt": f"p{i}", "file": f"00{i}.png"} for i in range(1, 6)]
+        write_gallery(out, items, thumbs={"003.png": "thumbs/003.webp"}, page_size=2)
+        pages = [(out / name).read_text() for name in ("index.html", "index-2.html", "index-3.html")]
+        assert not (out / "index-4.html").exists()
+        assert "001.png" in pages[0] and "003.png" not in pages[0]
+        assert 'href="index-2.html"' in pages[0] and "prev" not in pages[0]
+        assert 'href="index.html"' in pages[1] and 'href="index-3.html"' in pages[1]
+        assert '<a href="003.png"><img src="thumbs/003.webp"' in pages[1]
+        assert "page 3 of 3" in pages[2] and "next" not in pages[2]
+
+        (out / "index-notes.html").write_text("kept")
+        write_gallery(out, items, page_size=4)
+        assert (out / "index-2.html").exists() and not (out / "index-3.html").exists()
+        assert (out / "index-notes.html").exists()
+
+
+def test_make_thumbnails_downscales_in_process_pool():
+    image_module = pytest.importorskip("PIL.Image")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        out = Path(tmpdir)
+        items = []
+        for i in (1, 2):
+            image_module.new("RGBA", (800, 600), (i * 40, 0, 0, 128)).save(out / f"00{i}.png")
+            items.append({"prompt": "p", "file": f"00{i}.png"})
+        thumbs = make_thumbnails(out, items, max_px=64, fmt="jpeg", workers=2)
+        assert thumbs == {"001.png": "thumbs/001.jpg", "002.png": "thumbs/002.jpg"}
+        with image_module.open(out / "thumbs" / "001.jpg") as thumb:
+            assert thumb.size == (64, 48)
+            red, green, blue = thumb.getpixel((32, 24))
+            assert green > 100 and blue > 100  # Half-transparent red on white, not on black
+        assert make_thumbnails(out, items, max_px=0) == {}
+
+
+def test_import_does_not_load_http_stack():
+    probe = "import sys, gen; print(sorted(m for m in ('urllib.request', 'base64') if m in sys.modules))"
+    result = subprocess.run(
+        [sys.executable, "-c", probe],
+        cwd=Path(gen.__file__).parent,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert result.stdout.strip() == "[]"
+
+
+def test_run_concurrently_keeps_job_order_and_overlaps():
+    active = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def work(job):
+        nonlocal active, peak
+        with lock:
+            active += 1
+            peak = max(peak, active)
+        time.sleep(0.02 * (5 - job))
+        with lock:
+            active -= 1
+        return job * 10
+
+    assert run_concurrently(work, [1, 2, 3, 4], 3) == [10, 20, 30, 40]
+    assert peak == 3
+
+
+def test_run_concurrently_reraises_first_failure():
+    def work(job):
+        if job == 2:
+            raise RuntimeError("boom")
+        return job
+
+    try:
+        run_concurrently(work, [1, 2, 3], 2)
+    except RuntimeError as exc:
+        assert str(exc) == "boom"
+    else:
+        raise AssertionError("expected RuntimeError")
+
+
+def test_plan_batches_groups_identical_prompts():
+    prompts = ["a", "b", "a", "a", "b"]
+    assert plan_batches(prompts, 10) == [([1, 3, 4], "a"), ([2, 5], "b")]
+    assert plan_batches(prompts, 2) == [([1, 3], "a"), ([2, 5], "b"), ([4], "a")]
+    assert plan_batches(["x"] * 5, 1) == [([i], "x") for i in range(1, 6)]
+
+
+def test_plan_batches_spreads_work_across_workers():
+    assert plan_batches(["x"] * 8, 10, workers=4) == [
+        ([1, 2], "x"),
+        ([3, 4], "x"),
+        ([5, 6], "x"),
+        ([7, 8], "x"),
+    ]
+    assert max_images_per_request("dall-e-3") == 1
+    assert max_images_per_request("gpt-image-1") == 10
+
+
+def test_http_pool_reuses_keep_alive_connection(monkeypatch):
+    with fake_images_api(monkeypatch) as (server, base):
+        pool = HttpPool(max_per_host=2)
+        try:
+            for prompt in ("a", "b", "c"):
+                result = request_images("sk-test", prompt, "gpt-image-1", "1024x1024", "high", pool=pool)
+                assert base64.b64decode(result["data"][0]["b64_json"]) == PNG_BYTES
+            with tempfile.TemporaryDirectory() as tmpdir:
+                target = Path(tmpdir) / "out.png"
+                download_image(pool, f"{base}/moved.png", target)
+                assert target.read_bytes() == PNG_BYTES
+        finally:
+            pool.close()
+        assert server.connections == 1
+        assert pool.connections_opened == 1
+        assert [r["prompt"] for r in server.requests] == ["a", "b", "c"]
+
+
+def test_http_pool_caps_connections_per_host(monkeypatch):
+    with fake_images_api(monkeypatch) as (server, _):
+        pool = HttpPool(max_per_host=2)
+        try:
+            run_concurrently(
+                lambda prompt: request_images("sk-test", prompt, "gpt-image-1", "1024x1024", "high", pool=pool),
+                [str(i) for i in range(8)],
+                4,
+            )
+        finally:
+            pool.close()
+        assert len(server.requests) == 8
+        assert server.connections <= 2
+
+
+def test_http_pool_retries_when_idle_connection_was_closed(monkeypatch):
+    with fake_images_api(monkeypatch) as (server, _):
+        pool = HttpPool()
+        try:
+            request_images("sk-test", "a", "gpt-image-1", "1024x1024", "high", pool=pool)
+            for conns in pool._idle.values():
+                for conn in conns:
+                    conn.sock.shutdown(2)
+            request_images("sk-test", "b", "gpt-image-1", "1024x1024", "high", pool=pool)
+        finally:
+            pool.close()
+        assert [r["prompt"] for r in server.requests] == ["a", "b"]
+
+
+@contextmanager
+def hangs_up_on_second_request():
+    """Raw HTTP server that answers the first request on each connection and drops the second unanswered."""
+    listener = socket.create_server(("127.0.0.1", 0))
+    received = []
+
+    def read_request(sock) -> bool:
+        data = b""
+        while b"\r\n\r\n" not in data:
+            chunk = sock.recv(4096)
+            if not chunk:
+                return False
+            data += chunk
+        head, _, body = data.partition(b"\r\n\r\n")
+        length = 0
+        for line in head.split(b"\r\n")[1:]:
+            name, _, value = line.partition(b":")
+            if name.strip().lower() == b"content-length":
+                length = int(value)
+        while len(body) < length:
+            body += sock.recv(4096)
+        received.append(head.split(b" ", 1)[0].decode())
+        return True
+
+    def serve():
+        while True:
+            try:
+                sock, _ = listener.accept()
+            except OSError:
+                return
+            with sock:
+                if read_request(sock):
+                    sock.sendall(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok")
+                    read_request(sock)
+
+    threading.Thread(target=serve, daemon=True).start()
+    try:
+        yield f"http://127.0.0.1:{listener.getsockname()[1]}/", received
+    finally:
+        listener.close()
+
+
+def test_http_pool_does_not_resend_post_on_dropped_connection():
+    with hangs_up_on_second_request() as (url, received):
+        pool = HttpPool()
+        try:
+            with pool.open("POST", url, body=b"{}") as resp:
+                assert resp.read() == b"ok"
+            with pytest.raises(ConnectionError):
+                with pool.open("POST", url, body=b"{}") as resp:
+                    resp.read()
+        finally:
+            pool.close()
+        assert received == ["POST", "POST"]
+        assert pool.connections_opened == 1
+
+
+def test_http_pool_resends_get_on_dropped_connection():
+    with hangs_up_on_second_request() as (url, received):
+        pool = HttpPool()
+        try:
+            for _ in range(2):
+                with pool.open("GET", url) as resp:
+                    assert resp.read() == b"ok"
+        finally:
+            pool.close()
+        assert received == ["GET", "GET", "GET"]
+        assert pool.connections_opened == 2
+
+
+def test_http_pool_sends_plain_http_through_proxy(monkeypatch):
+    with fake_images_api() as (server, base):
+        for name in ("http_proxy", "NO_PROXY", "no_proxy"):
+            monkeypatch.delenv(name, raising=False)
+        monkeypatch.setenv("HTTP_PROXY", base.replace("http://", "http://user:p%40ss@"))
+        pool = HttpPool()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            target = Path(tmpdir) / "image.png"
+            download_image(pool, "http://images.invalid:8080/moved.png", target)
+            assert target.read_bytes() == PNG_BYTES
+        pool.close()
+    auth = "Basic " + base64.b64encode(b"user:p@ss").decode()
+    assert server.proxied == [
+        ("http://images.invalid:8080/moved.png", auth),
+        ("http://images.invalid:8080/image.png", auth),
+    ]
+
+
+def test_http_pool_tunnels_https_and_honors_no_proxy(monkeypatch):
+    for name in ("HTTP_PROXY", "http_proxy", "https_proxy", "no_proxy"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv("HTTPS_PROXY", "proxy.internal:3128")
+    monkeypatch.setenv("NO_PROXY", "localhost,.corp.example")
+    pool = HttpPool()
+    assert pool.proxy_for(("https", "api.openai.com", 443)) == ("proxy.internal", 3128, {})
+    assert pool.proxy_for(("https", "files.corp.example", 443)) is None
+    assert pool.proxy_for(("http", "api.openai.com", 80)) is None
+    conn, reused = pool._checkout(("https", "api.openai.com", 443))
+    assert not reused
+    assert (conn.host, conn.port, conn._tunnel_host, conn._tunnel_port) == ("proxy.internal", 3128, "api.openai.com", 443)
+
+
+def test_request_images_reports_api_errors(monkeypatch):
+    with fake_images_api(monkeypatch) as (_, base):
+        pool = HttpPool()
+        try:
+            try:
+                request_images("sk-test", "fail", "gpt-image-1", "1024x1024", "high", pool=pool)
+            except RuntimeError as exc:
+                assert str(exc).startswith("OpenAI Images API failed (400)")
+            else:
+                raise AssertionError("expected RuntimeError")
+            try:
+                download_image(pool, f"{base}/nope.png", Path(tempfile.gettempdir()) / "never.png")
+            except RuntimeError as exc:
+                assert "HTTP 404" in str(exc)
+            else:
+                raise AssertionError("expected RuntimeError")
+        finally:
+            pool.close()
+
+
+def test_save_b64_images_decodes_across_chunk_boundaries():
+    first = bytes(range(256)) * 40
+    second = os.urandom(999)
+    encoded = base64.b64encode(first).decode("ascii").replace("/", "\\/")
+    encoded = encoded[:100] + "\\n" + encoded[100:]
+    body = (
+        '{"created": 1, "data": [{"b64_json":  "%s", "revised_prompt": "say \\"b64_json\\": \\"x\\""},'
+        ' {"b64_json":"%s"}], "usage": {"total_tokens": 7}}'
+    ) % (encoded, base64.b64encode(second).decode("ascii"))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        targets = [Path(tmpdir) / "001.png", Path(tmpdir) / "002.png"]
+        for chunk_size in (1, 5, 64, 1 << 16):
+            res = save_b64_images(io.BytesIO(body.encode()), targets, chunk_size=chunk_size)
+            assert targets[0].read_bytes() == first
+            assert targets[1].read_bytes() == second
+            assert [item["b64_json"] for item in res["data"]] == [str(t) for t in targets]
+            assert res["data"][0]["revised_prompt"] == 'say "b64_json": "x"'
+            assert res["usage"] == {"total_tokens": 7}
+        assert sorted(os.listdir(tmpdir)) == ["001.png", "002.png"]
+
+
+def test_save_b64_images_leaves_no_partial_file_on_truncated_body():
+    body = b'{"data": [{"b64_json": "' + base64.b64encode(PNG_BYTES)[:20]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        try:
+            save_b64_images(io.BytesIO(body), [Path(tmpdir) / "001.png"], chunk_size=8)
+        except RuntimeError as exc:
+            assert "Truncated" in str(exc)
+        else:
+            raise AssertionError("expected RuntimeError")
+        assert os.listdir(tmpdir) == []
+
+
+def test_request_images_streams_large_image_with_bounded_memory(monkeypatch):
+    image = os.urandom(6 * 1024 * 1024)
+    with fake_images_api(monkeypatch) as (server, _), tempfile.TemporaryDirectory() as tmpdir:
+        server.big_body = json.dumps({"data": [{"b64_json": base64.b64encode(image).decode()}]}).encode()
+        target = Path(tmpdir) / "001-big.png"
+        pool = HttpPool()
+        tracemalloc.start()
+        try:
+            res = request_images("sk-test", "big", "gpt-image-1", "1024x1024", "high", pool=pool, targets=[target])
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+            pool.close()
+        assert res["data"][0]["b64_json"] == str(target)
+        assert target.read_bytes() == image
+        assert peak < 1024 * 1024
+
+
+def test_image_cache_round_trip_and_lru_eviction():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = Path(tmpdir) / "cache"
+        cache = ImageCache(root, max_bytes=2500)
+        keys = []
+        for i, prompt in enumerate(("a", "b", "c")):
+            request_args = build_request_args(prompt, "gpt-image-1", "1024x1024", "high", n=4)
+            key = ImageCache.key(request_args)
+            assert key == ImageCache.key({**request_args, "n": 1})
+            source = Path(tmpdir) / f"{prompt}.png"
+            source.write_bytes(bytes([i]) * 1000)
+            cache.store(key, 0, source, request_args)
+            os.utime(root / key / "meta.json", (1000 + i, 1000 + i))
+            keys.append(key)
+
+        assert cache.lookup(keys[0], 0, "png").read_bytes() == b"\x00" * 1000
+        assert cache.lookup(keys[0], 1, "png") is None
+        meta = json.loads((root / keys[0] / "meta.json").read_text())
+        assert meta["request"]["prompt"] == "a" and "n" not in meta["request"]
+
+        # "a" was just used, so "b" is now the least recently used entry.
+        assert cache.evict() > 0
+        assert cache.lookup(keys[1], 0, "png") is None
+        assert cache.lookup(keys[0], 0, "png") is not None
+        assert cache.lookup(keys[2], 0, "png") is not None
+
+
+def test_main_serves_repeated_requests_from_cache(monkeypatch):
+    with fake_images_api(monkeypatch) as (server, _), tempfile.TemporaryDirectory() as tmpdir:
+        common = ["--prompt", "a red fox", "--cache-dir", f"{tmpdir}/cache"]
+        run_gen(monkeypatch, *common, "--count", "2", "--out-dir", f"{tmpdir}/first")
+        assert len(server.requests) == 1
+
+        run_gen(monkeypatch, *common, "--count", "3", "--out-dir", f"{tmpdir}/second")
+        assert len(server.requests) == 2
+        assert server.requests[-1]["n"] == 1
+        first = Path(tmpdir) / "first" / "001-a-red-fox.png"
+        second = Path(tmpdir) / "second" / "001-a-red-fox.png"
+        assert second.read_bytes() == PNG_BYTES
+        assert second.stat().st_ino != first.stat().st_ino
+        # Editing an output in place must not reach the cached copy.
+        with open(first, "r+b") as handle:
+            handle.write(b"edited")
+        second.write_bytes(b"edited too")
+
+        run_gen(monkeypatch, *common, "--count", "3", "--out-dir", f"{tmpdir}/third")
+        assert len(server.requests) == 2
+        assert (Path(tmpdir) / "third" / "001-a-red-fox.png").read_bytes() == PNG_BYTES
+        items = json.loads((Path(tmpdir) / "third" / "prompts.json").read_text())
+        assert [item["file"] for item in items] == [f"00{i}-a-red-fox.png" for i in (1, 2, 3)]
+
+        run_gen(monkeypatch, *common, "--count", "1", "--no-cache", "--out-dir", f"{tmpdir}/fourth")
+        assert len(server.requests) == 3
+
+
+def test_parse_retry_after_headers():
+    assert parse_retry_after({"Retry-After": "3"}) == 3.0
+    assert parse_retry_after({"retry-after-ms": "250"}) == 0.25
+    assert parse_retry_after({"x-ratelimit-reset-requests": "1m2.5s"}) == 62.5
+    assert parse_retry_after({"x-ratelimit-reset-requests": "20ms"}) == 0.02
+    assert 0 <= parse_retry_after({"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"}) < 1
+    assert parse_retry_after({}) is None
+
+
+def test_scheduler_retries_429_and_halves_concurrency(monkeypatch, capsys):
+    with fake_images_api(monkeypatch) as (server, _):
+        server.failures = [429, 429, 503]
+        server.retry_after = "0.05"
+        pool = HttpPool(max_per_host=4)
+        scheduler = RequestScheduler(4, base_delay=0.01)
+        started = time.monotonic()
+        try:
+            results = run_concurrently(
+                lambda prompt: scheduler.run(
+                    lambda: request_images("sk-test", prompt, "gpt-image-1", "1024x1024", "high", pool=pool)
+                ),
+                [str(i) for i in range(6)],
+                4,
+            )
+        finally:
+            pool.close()
+        assert len(results) == 6
+        assert len(server.requests) == 9
+        assert scheduler.retries == 3 and scheduler.throttled == 2
+        assert time.monotonic() - started >= 0.05
+        # Concurrent 429s cut the limit once; later successes grow it back.
+        err = capsys.readouterr().err
+        assert "HTTP 429; retrying" in err
+        assert "(limit 2)" in err and "(limit 1)" not in err
+        assert scheduler.limit == 4
+
+
+def request_once(pool: HttpPool) -> dict:
+    return request_images("sk-test", "x", "gpt-image-1", "1024x1024", "high", pool=pool)
+
+
+def expect_api_error(scheduler: RequestScheduler, pool: HttpPool) -> ApiError:
+    try:
+        scheduler.run(lambda: request_once(pool))
+    except ApiError as exc:
+        return exc
+    raise AssertionError("expected ApiError")
+
+
+def test_scheduler_never_retries_requests_the_server_may_have_processed(monkeypatch):
+    with fake_images_api(monkeypatch) as (server, _):
+        pool = HttpPool()
+        try:
+            # Client errors, 5xx without Retry-After and 409 could have been billed: one attempt only.
+            for status in (400, 500, 409, 503):
+                server.requests.clear()
+                server.failures = [status, status]
+                assert expect_api_error(RequestScheduler(max_retries=3, base_delay=0.01), pool).status == status
+                assert len(server.requests) == 1
+
+            server.requests.clear()
+            server.retry_after = "0"
+            server.error_body = b'{"error": {"message": "quota", "type": "insufficient_quota", "code": "insufficient_quota"}}'
+            server.failures = [429, 429]
+            assert expect_api_error(RequestScheduler(max_retries=3, base_delay=0.01), pool).code == "insufficient_quota"
+            assert len(server.requests) == 1
+
+            server.requests.clear()
+            server.error_body = b'{"error": {"message": "overloaded"}}'
+            server.failures = [503, 503, 503]
+            assert expect_api_error(RequestScheduler(max_retries=2, base_delay=0.01), pool).status == 503
+            assert len(server.requests) == 3
+        finally:
+            pool.close()
+
+
+def test_scheduler_retries_connect_failures():
+    import socket
+
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    pool = HttpPool()
+    scheduler = RequestScheduler(max_retries=2, base_delay=0.001)
+    calls = []
+
+    def call():
+        calls.append(1)
+        with pool.open("GET", f"http://127.0.0.1:{port}/"):
+            pass
+
+    try:
+        scheduler.run(call)
+    except ConnectFailed:
+        pass
+    else:
+        raise AssertionError("expected ConnectFailed")
+    assert len(calls) == 3 and scheduler.retries == 2
+
+
+def test_scheduler_times_only_the_last_attempt():
+    scheduler = RequestScheduler(max_retries=1, base_delay=0.001)
+    timings: dict[str, float] = {}
+
+    def call():
+        gen.add_timing(timings, "download", 1.0)
+        gen.add_timing(timings, "bytes", 100)
+        if timings["attempts"] == 1:
+            raise ConnectFailed("refused")
+        return "ok"
+
+    assert scheduler.run(call, timings) == "ok"
+    assert timings["attempts"] == 2
+    assert timings["download"] == 1.0 and timings["bytes"] == 100
+    assert "schedule_wait" in timings
+
+
+def test_scheduler_token_bucket_paces_requests():
+    scheduler = RequestScheduler(1, rpm=1200)
+    started = time.monotonic()
+    for _ in range(5):
+        scheduler.run(lambda: None)
+    # One token is available up front, the other four arrive every 50ms.
+    assert time.monotonic() - started >= 0.19
+
+
+def test_plan_batches_skips_finished_indexes():
+    assert plan_batches(["a", "b", "a", "a"], 10, skip={1, 2}) == [([3, 4], "a")]
+    assert plan_batches(["x"] * 6, 10, workers=2, skip={1, 2}) == [([3, 4], "x"), ([5, 6], "x")]
+
+
+def test_manifest_skips_torn_lines_and_missing_files():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        manifest = Manifest(Path(tmpdir) / "manifest.jsonl")
+        assert manifest.load() == {}
+        for idx in (1, 2, 3):
+            (Path(tmpdir) / f"00{idx}.png").write_bytes(PNG_BYTES)
+            manifest.append(idx, {"prompt": "p", "file": f"00{idx}.png"})
+        (Path(tmpdir) / "002.png").unlink()
+        with manifest.path.open("a") as handle:
+            handle.write('{"index": 4, "prompt": "p", "fi')
+        assert manifest.load() == {1: {"prompt": "p", "file": "001.png"}, 3: {"prompt": "p", "file": "003.png"}}
+
+
+def test_main_resume_generates_only_missing_images(monkeypatch, capsys):
+    with fake_images_api(monkeypatch) as (server, _), tempfile.TemporaryDirectory() as tmpdir:
+        server.failures = [200, 200, 400]
+        monkeypatch.setattr(gen, "pick_prompts", lambda count: [f"prompt {i}" for i in range(count)])
+        monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+        monkeypatch.setattr(sys, "argv", ["gen.py", "--count", "4", "--no-cache", "--max-retries", "0", "--out-dir", tmpdir])
+        assert gen.main() == 1
+        err = capsys.readouterr().err
+        assert "Traceback" not in err
+        assert f"2/4 images are done; run again with --resume {Path(tmpdir).as_posix()}" in err
+        out = Path(tmpdir)
+        assert not (out / "prompts.json").exists()
+        assert len(Manifest(out / "manifest.jsonl").load()) == 2
+        first_prompts = [r["prompt"] for r in server.requests[:2]]
+
+        for conflicting in (["--model", "dall-e-2"], ["--count", "3"], ["--prompt", "other"], ["--size", "512x512"]):
+            with pytest.raises(SystemExit):
+                run_gen(monkeypatch, "--resume", tmpdir, "--no-cache", *conflicting)
+            assert "conflict with it: " + conflicting[0] in capsys.readouterr().err
+        assert len(server.requests) == 3
+
+        run_gen(monkeypatch, "--resume", tmpdir, "--no-cache", "--model", "gpt-image-1", "--count", "4")
+        assert len(server.requests) == 5
+        assert server.requests[-1]["model"] == "gpt-image-1"
+        run = json.loads((out / "run.json").read_text())
+        items = json.loads((out / "prompts.json").read_text())
+        assert [item["prompt"] for item in items] == run["prompts"]
+        assert [item["prompt"] for item in items[:2]] == first_prompts
+        assert all((out / item["file"]).read_bytes() == PNG_BYTES for item in items)
+
+
+# Same cases as PERCENTILE_CASES in model-usage/scripts/test_model_usage.py: the two
+# skills define percentile identically, and these pin both copies to the same results.
+PERCENTILE_CASES = [
+    ([], 50, 0.0),
+    ([7.0], 95, 7.0),
+    ([1.0, 2.0, 3.0], 50, 2.0),
+    ([1.0, 2.0, 3.0, 4.0], 50, 2.5),
+    ([100.0, 300.0], 95, 290.0),
+    ([0.0, 1.0, 10.0, 100.0], 0, 0.0),
+    ([0.0, 1.0, 10.0, 100.0], 100, 100.0),
+    ([0.0, 1.0, 10.0, 100.0], 95, 86.5),
+    ([float(i) for i in range(101)], 95, 95.0),
+]
+
+
+@pytest.mark.parametrize("values,pct,expected", PERCENTILE_CASES)
+def test_percentile(values, pct, expected):
+    assert percentile(values, pct) == pytest.approx(expected)
+    assert percentile(list(reversed(values)), pct) == pytest.approx(expected)
+
+
+def test_estimate_cost_and_summary():
+    assert estimate_cost("gpt-image-1", "1536x1024", "medium") == 0.063
+    assert estimate_cost("dall-e-2", "512x512", "hd") == 0.018
+    assert estimate_cost("gpt-image-1", "auto", "auto") is None
+    metrics = [
+        {"request_ms": 100.0, "ttfb_ms": 80.0, "bytes": 1_048_576},
+        {"request_ms": 300.0, "ttfb_ms": 90.0, "bytes": 1_048_576},
+        {"cached": True, "cost_usd": 0.0},
+    ]
+    lines = summarize_metrics(metrics, "dall-e-3", "1024x1024", "hd")
+    assert lines[0] == "Timing p50/p95 ms over 2 image(s), 2.0 MiB received: ttfb 85/90, request 200/290"
+    assert lines[1] == "Estimated cost for dall-e-3 1024x1024 hd: $0.160 (2 x $0.08); 1 cached"
+    assert summarize_metrics(metrics[2:], "gpt-image-1", "1024x1024", "high") == [
+        "Estimated cost: $0 (all 1 image(s) served from cache)"
+    ]
+
+
+def test_main_records_metrics_per_image(monkeypatch, capsys):
+    with fake_images_api(monkeypatch) as _, tempfile.TemporaryDirectory() as tmpdir:
+        run_gen(monkeypatch, "--prompt", "owl", "--count", "2", "--no-cache", "--metrics", "--out-dir", tmpdir)
+        items = json.loads((Path(tmpdir) / "prompts.json").read_text())
+        captured = capsys.readouterr()
+    lines = [json.loads(line) for line in captured.err.splitlines() if line.startswith("{")]
+    assert sorted(line["index"] for line in lines) == [1, 2]
+    for item in items:
+        metrics = item["metrics"]
+        assert metrics["batch"] == 2 and metrics["attempts"] == 1
+        assert metrics["cost_usd"] == 0.167
+        assert metrics["image_bytes"] == len(PNG_BYTES)
+        assert metrics["bytes"] > 0
+        for stage in ("queue", "connect", "ttfb", "download", "decode", "write", "request"):
+            assert metrics[f"{stage}_ms"] >= 0
+        assert metrics["request_ms"] >= metrics["ttfb_ms"]
+    assert "Estimated cost for gpt-image-1 1024x1024 high: $0.334 (2 x $0.167)" in captured.out
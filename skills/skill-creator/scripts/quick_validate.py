@@ -5,17 +5,25 @@ Quick validation script for skills - minimal version
 
 import re
 import sys
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional
-
-try:
-    import yaml
-except ModuleNotFoundError:
-    yaml = None
+from typing import Any, Optional
 
 MAX_SKILL_NAME_LENGTH = 64
 
 
+# PyYAML is resolved on first validation rather than at import: it is the bulk of
+# this script's startup cost and the usage path never needs it.
+@lru_cache(maxsize=None)
+def _load_yaml() -> Any:
+    """The PyYAML module, or None to use the fallback parser."""
+    try:
+        import yaml
+    except ModuleNotFoundError:
+        return None
+    return yaml
+
+
 def _extract_frontmatter(content: str) -> Optional[str]:
     lines = content.splitlines()
     if not lines or lines[0].strip() != "---":
@@ -80,12 +88,13 @@ def validate_skill(skill_path):
     frontmatter_text = _extract_frontmatter(content)
     if frontmatter_text is None:
         return False, "Invalid frontmatter format"
-    if yaml is not None:
+    yaml_module = _load_yaml()
+    if yaml_module is not None:
         try:
-            frontmatter = yaml.safe_load(frontmatter_text)
+            frontmatter = yaml_module.safe_load(frontmatter_text)
             if not isinstance(frontmatter, dict):
                 return False, "Frontmatter must be a YAML dictionary"
-        except yaml.YAMLError as e:
+        except yaml_module.YAMLError as e:
             return False, f"Invalid YAML in frontmatter: {e}"
     else:
         frontmatter = _parse_simple_frontmatter(frontmatter_text)
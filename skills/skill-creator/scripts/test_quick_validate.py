@@ -3,9 +3,12 @@
 Regression tests for quick skill validation.
 """
 
+import subprocess
+import sys
 import tempfile
 from pathlib import Path
 from unittest import TestCase, main
+from unittest.mock import patch
 
 import quick_validate
 
@@ -58,15 +61,22 @@ metadata: |
 """
         (skill_dir / "SKILL.md").write_text(content, encoding="utf-8")
 
-        previous_yaml = quick_validate.yaml
-        quick_validate.yaml = None
-        try:
+        with patch.object(quick_validate, "_load_yaml", return_value=None):
             valid, message = quick_validate.validate_skill(skill_dir)
-        finally:
-            quick_validate.yaml = previous_yaml
 
         self.assertTrue(valid, message)
 
+    def test_import_does_not_load_yaml(self):
+        probe = "import sys, quick_validate; print('yaml' in sys.modules)"
+        result = subprocess.run(
+            [sys.executable, "-c", probe],
+            cwd=Path(quick_validate.__file__).parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        self.assertEqual(result.stdout.strip(), "False")
+
 
 if __name__ == "__main__":
     main()